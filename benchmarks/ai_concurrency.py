@@ -0,0 +1,51 @@
+"""
+AI concurrency benchmark: the same burst of chat messages, sent one at a
+time and then all at once, through the real handlers and a stub Groq server
+with a fixed reply latency. With non-blocking AI calls the concurrent burst
+finishes in about one reply latency per GROQ_MAX_CONCURRENCY batch instead
+of the sum of all of them.
+
+    python -m benchmarks.ai_concurrency --chats 64 --groq-latency 1.0
+"""
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+from benchmarks import run
+
+
+def _run(arguments):
+    # A fresh process per run: the bot reads its settings and stand-in URLs at import time
+    with tempfile.TemporaryDirectory() as workdir:
+        output = os.path.join(workdir, "report.json")
+        subprocess.run([sys.executable, "-m", "benchmarks.run", *arguments, "--json", output],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(output) as f:
+            return json.load(f)
+
+
+def main(argv=None):
+    parser = run.build_parser()
+    parser.description = __doc__
+    parser.add_argument("--chats", type=int, default=32, help="messages in the burst, one per user")
+    parser.set_defaults(mix="text=1", warmup=0, groq_token_delay=0.0, jitter=0.0)
+    args = parser.parse_args(argv)
+
+    common = ["--mix", args.mix, "--warmup", "0", "--users", str(args.chats), "--updates", str(args.chats),
+              "--groq-latency", str(args.groq_latency), "--groq-token-delay", str(args.groq_token_delay),
+              "--jitter", str(args.jitter), "--telegram-latency", str(args.telegram_latency)]
+    serial = _run(common + ["--concurrency", "1"])
+    concurrent = _run(common + ["--concurrency", str(args.chats)])
+
+    print(f"\n{args.chats} chats, {args.groq_latency:g} s per model reply")
+    for name, report in (("one at a time", serial), ("all at once", concurrent)):
+        overall = report["overall"]
+        print(f"{name:<14} {report['elapsed_s']:>7} s  {report['throughput_per_s']:>7} msg/s  "
+              f"p50 {overall['p50_ms']} ms  p99 {overall['p99_ms']} ms")
+    print(f"speed-up: {serial['elapsed_s'] / concurrent['elapsed_s']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Voice transcription benchmark: synthetic Ogg/Opus voice notes sent through
+transcribe_audio to the stub Whisper endpoint, which takes
+--realtime-factor seconds per second of audio and answers one word per
+second ("w<second>"), so the stitched transcript can be checked word by
+word.
+
+    python -m benchmarks.audio_transcription --minutes 1,5,20 --realtime-factor 0.01
+
+"original" is the old handle_audio: the note written to a file in the
+working directory, read back and uploaded whole. "whole" uploads the bytes
+from memory in one request (AUDIO_CHUNK_SECONDS=0). "chunked" splits notes
+longer than AUDIO_CHUNK_SECONDS into overlapping chunks transcribed
+concurrently (at most GROQ_MAX_CONCURRENCY at a time) and stitches them.
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+from benchmarks import media
+from benchmarks.fakes import FakeGroq
+
+
+def _check(text, seconds):
+    """(missing, extra) words compared with the expected w0 ... w<seconds-1>."""
+    expected = {f"w{second}" for second in range(seconds)}
+    words = text.split()
+    return len(expected - set(words)), len(words) - len(expected & set(words))
+
+
+async def _run_all(args, workdir):
+    from bot import ai_service
+
+    async def original(data):
+        path = os.path.join(workdir, "voice_bench.ogg")
+        with open(path, "wb") as f:
+            f.write(data)  # download_to_drive
+        with open(path, "rb") as f:
+            audio = f.read()
+        os.remove(path)
+        return await whole(audio)
+
+    async def whole(data):
+        ai_service.AUDIO_CHUNK_SECONDS = 0
+        return await ai_service.transcribe_audio(data)
+
+    async def chunked(data):
+        ai_service.AUDIO_CHUNK_SECONDS = chunk_seconds
+        return await ai_service.transcribe_audio(data)
+
+    chunk_seconds = ai_service.AUDIO_CHUNK_SECONDS
+    results = []
+    for minutes in args.minutes:
+        seconds = int(minutes * 60)
+        data = media.voice_note(seconds)
+        for name, transcribe in (("original", original), ("whole", whole), ("chunked", chunked)):
+            started = time.perf_counter()
+            text = await transcribe(data)
+            elapsed = time.perf_counter() - started
+            results.append((minutes, len(data), name, elapsed, *_check(text, seconds)))
+    ai_service.AUDIO_CHUNK_SECONDS = chunk_seconds
+    return results, chunk_seconds, ai_service.AUDIO_CHUNK_OVERLAP
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", default="1,5,20", help="voice note lengths")
+    parser.add_argument("--realtime-factor", type=float, default=0.01,
+                        help="stub transcription seconds per second of audio")
+    args = parser.parse_args(argv)
+    args.minutes = [float(m) for m in args.minutes.split(",")]
+
+    with tempfile.TemporaryDirectory() as workdir, FakeGroq(realtime_factor=args.realtime_factor) as groq:
+        os.environ["GROQ_API_KEY"] = "bench"
+        os.environ["GROQ_BASE_URL"] = groq.url
+        results, chunk_seconds, overlap = asyncio.run(_run_all(args, workdir))
+        requests = groq.requests["transcription"]
+
+    print(f"\nrealtime factor {args.realtime_factor:g}, chunks of {chunk_seconds:g} s with {overlap:g} s overlap, "
+          f"{requests} transcription requests")
+    baseline = {}
+    for minutes, size, name, elapsed, missing, extra in results:
+        baseline.setdefault(minutes, elapsed)
+        print(f"{minutes:>5g} min {size / 2**20:>6.1f} MB  {name:<9}{elapsed:>8.2f} s  "
+              f"{baseline[minutes] / elapsed:>5.1f}x   words missing {missing}, extra {extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Cold-start benchmark: a fresh interpreter per run, timed from spawn to
+exit, for each stage of bringing the bot up.
+
+    python -m benchmarks.cold_start --runs 10
+    python -m benchmarks.cold_start --importtime 15
+
+Stages:
+  python        interpreter start-up alone, the floor
+  import main   main.py and everything it imports
+  build         import main, init_db and build_application
+  eager         import main plus the integrations the bot loads lazily
+                (groq client, googleapiclient, google.oauth2, PIL,
+                requests), i.e. what the original imports cost up front
+
+Also lists which of those integrations `import main` loaded, which should
+be none. --importtime prints the slowest modules by cumulative import time
+(python -X importtime) for `import main`.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.run import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ["groq", "googleapiclient.discovery", "google.oauth2.service_account", "PIL.Image", "requests"]
+
+STAGES = {
+    "python": "pass",
+    "import main": "import main",
+    "build": "import main; from bot.db import init_db; init_db(); main.build_application(updater=False)",
+    "eager": "import main; " + "; ".join(f"import {name}" for name in LAZY_MODULES)
+             + "; from bot.ai_service import get_client; get_client()",
+}
+
+
+def _env(workdir):
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_TOKEN": env.get("TELEGRAM_TOKEN", "1:bench"),
+        "GROQ_API_KEY": env.get("GROQ_API_KEY", "bench"),
+        "DB_PATH": os.path.join(workdir, "cold_start.db"),
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    env.pop("DATABASE_URL", None)
+    return env
+
+
+def _spawn(code, env, *flags):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, result
+
+
+def _loaded_after_import(env):
+    code = f"import sys, json, main; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    return json.loads(_spawn(code, env)[1].stdout)
+
+
+def _importtime(env, top):
+    """Slowest modules by cumulative import time (us) for `import main`."""
+    stderr = _spawn("import main", env, "-X", "importtime")[1].stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="processes spawned per stage")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="also print the N slowest imports of main")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = _env(workdir)
+        # One untimed run of each stage, so the OS page cache is warm for all of them
+        for code in STAGES.values():
+            _spawn(code, env)
+        times = {name: [_spawn(code, env)[0] for _ in range(args.runs)] for name, code in STAGES.items()}
+        loaded = _loaded_after_import(env)
+        slowest = _importtime(env, args.importtime) if args.importtime else []
+
+    print(f"\n{args.runs} fresh processes per stage")
+    for name, values in times.items():
+        stats = summarize(values)
+        print(f"{name:<13} p50 {stats['p50_ms']:>7} ms  p95 {stats['p95_ms']:>7} ms  max {stats['max_ms']:>7} ms")
+    print(f"integrations loaded by `import main`: {', '.join(loaded) or 'none'}")
+    if slowest:
+        print("\nslowest imports (cumulative):")
+        for microseconds, name in slowest:
+            print(f"  {microseconds / 1000:>7.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Context budget benchmark: long synthetic conversations, where some users
+paste long texts, sent through conversation_cache and get_gemini_response
+against the stub Groq server. The stub answers slower for longer prompts
+(--prefill-delay seconds per 1000 prompt tokens).
+
+    python -m benchmarks.context_budget --users 20 --turns 60
+
+"naive" is the original context: the last 10 stored messages, whatever
+their size, and no summary. "budgeted" is the current one: the window is
+fitted into HISTORY_TOKEN_BUDGET and older turns are folded into the
+rolling summary. Reports prompt tokens per turn (and how they grow over
+the conversation) and reply latency.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from benchmarks.fakes import FakeGroq
+from benchmarks.run import percentile, summarize
+
+SHORT = [
+    "oi, tudo bem?", "pode me lembrar do que falamos ontem?", "e sobre aquele projeto?",
+    "me dá uma ideia de jantar", "obrigado!", "resume isso em uma frase", "qual o próximo passo?",
+]
+PASTE = "Segue o texto do contrato que recebi hoje, cláusula por cláusula, para você revisar. "
+
+
+def _conversation(rng, args):
+    for _ in range(args.turns):
+        if rng.random() < args.paste_share:
+            yield PASTE * rng.randint(20, 80)
+        else:
+            yield rng.choice(SHORT)
+
+
+def _original_history_messages(history, summary=None, budget=None, memories=None):
+    messages = []
+    for item in history or []:
+        role = item.get("role")
+        content = item.get("content")
+        if role and content:
+            messages.append({"role": role, "content": content})
+    return messages
+
+
+async def _run(mode, args, groq, build_history_messages):
+    from bot import ai_service
+    from bot.conversation_cache import ConversationCache
+
+    ai_service._build_history_messages = build_history_messages
+    if mode == "naive":
+        # No summary ever: compaction needs more overflow than any run produces
+        cache = ConversationCache(window=10, summary_trigger_tokens=10**12)
+    else:
+        cache = ConversationCache()
+
+    prompt_tokens = {}  # turn -> prompt token estimates for that turn, one per user
+    context = []  # (tokens, messages) sent along with each prompt
+    latencies = []
+    requests_before = groq.requests["chat"]
+
+    async def user(user_id):
+        rng = random.Random(user_id)
+        for turn, text in enumerate(_conversation(rng, args)):
+            history = await cache.get_history(user_id)
+            summary = await cache.get_summary(user_id)
+            messages, _ = ai_service._build_messages(text, None, history, summary)
+            tokens = [ai_service.estimate_tokens(m["content"]) for m in messages]
+            prompt_tokens.setdefault(turn, []).append(sum(tokens))
+            # Everything but the new message itself
+            context.append((sum(tokens[:-1]), len(tokens) - 1))
+            started = time.perf_counter()
+            reply = await ai_service.get_gemini_response(text, history=history, summary=summary)
+            latencies.append(time.perf_counter() - started)
+            cache.append(user_id, "user", text)
+            cache.append(user_id, "assistant", reply)
+
+    cache.start()
+    # Each mode gets its own users, so history and summaries start empty
+    offset = 0 if mode == "naive" else args.users
+    await asyncio.gather(*(user(offset + u) for u in range(1, args.users + 1)))
+    await cache.stop()
+    return prompt_tokens, context, latencies, groq.requests["chat"] - requests_before - args.users * args.turns
+
+
+async def _run_all(args, groq, builders):
+    # One event loop for both modes: the Groq client and its slots are bound to it
+    return {mode: await _run(mode, args, groq, build) for mode, build in builders.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=60, help="messages per user")
+    parser.add_argument("--paste-share", type=float, default=0.15, help="share of messages that are long pastes")
+    parser.add_argument("--groq-latency", type=float, default=0.05)
+    parser.add_argument("--prefill-delay", type=float, default=0.1, help="seconds per 1000 prompt tokens")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="raizito-bench-")
+    os.environ["DB_PATH"] = os.path.join(workdir, "context.db")
+    os.environ.pop("DATABASE_URL", None)
+    os.environ["GROQ_API_KEY"] = "bench"
+    os.environ["RESPONSE_CACHE_TTL"] = "0"
+
+    with FakeGroq(reply_words=80, latency=args.groq_latency, prefill_delay=args.prefill_delay) as groq:
+        os.environ["GROQ_BASE_URL"] = groq.url
+        from bot import ai_service
+        from bot.db import init_db
+
+        init_db()
+        builders = {"naive": _original_history_messages, "budgeted": ai_service._build_history_messages}
+        results = asyncio.run(_run_all(args, groq, builders))
+
+    print(f"\n{args.users} users x {args.turns} turns, {args.paste_share:.0%} long pastes, "
+          f"budget {ai_service.HISTORY_TOKEN_BUDGET} tokens")
+    checkpoints = sorted({0, args.turns // 4, args.turns // 2, args.turns - 1})
+    for mode, (prompt_tokens, context, latencies, summaries) in results.items():
+        every = [tokens for turn in prompt_tokens.values() for tokens in turn]
+        context_tokens = [tokens for tokens, _ in context]
+        context_messages = [messages for _, messages in context]
+        stats = summarize(latencies)
+        print(f"{mode:<9} prompt tokens p50 {percentile(every, 50):>6.0f}  p95 {percentile(every, 95):>6.0f}  "
+              f"max {max(every):>6}   latency p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms   "
+              f"summary calls {summaries}")
+        print(f"{'':<9} context tokens p50 {percentile(context_tokens, 50):>5.0f}  max {max(context_tokens):>6}   "
+              f"context messages p50 {percentile(context_messages, 50):.0f}")
+        growth = "  ".join(
+            f"turn {turn + 1}: {sum(prompt_tokens[turn]) / len(prompt_tokens[turn]):.0f}" for turn in checkpoints
+        )
+        print(f"{'':<9} mean prompt tokens by turn  {growth}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Conversation storage micro-benchmark: chat turns per second, where a turn
+stores the user's message and the reply and reads back the history.
+
+    python -m benchmarks.db_throughput --turns 5000 --users 100
+
+"before" replays the original bot/db.py, with one sqlite3.connect, commit
+and close per call, in the default rollback journal mode. "after" runs the
+current bot.db functions through run_db, on a persistent WAL connection,
+with both messages stored in one transaction. "write-behind" is the
+handler path: history comes from conversation_cache and writes are
+flushed in batches.
+"""
+import os
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+
+from benchmarks.run import summarize
+
+REPLY = "Claro! Aqui vai uma resposta de tamanho médio para a pergunta. " * 4
+
+
+def _original_schema(path):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+
+def _original_log(path, user_id, role, content):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO conversations (user_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+        (user_id, role, content, datetime.utcnow().isoformat()),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _original_history(path, user_id, limit=10):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute(
+        """
+        SELECT role, content FROM conversations WHERE user_id = ?
+        ORDER BY datetime(created_at) DESC, id DESC LIMIT ?
+        """,
+        (user_id, limit),
+    )
+    rows = c.fetchall()
+    conn.close()
+    rows.reverse()
+    return [{"role": role, "content": content} for role, content in rows]
+
+
+def _timed_turns(turn, args):
+    rng = random.Random(0)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(args.turns):
+        t = time.perf_counter()
+        turn(rng.randrange(args.users), f"mensagem {i} do usuário")
+        latencies.append(time.perf_counter() - t)
+    return time.perf_counter() - started, latencies
+
+
+async def _timed_turns_async(turn, args):
+    rng = random.Random(0)
+    latencies = []
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        async with slots:
+            t = time.perf_counter()
+            await turn(rng.randrange(args.users), f"mensagem {i} do usuário")
+            latencies.append(time.perf_counter() - t)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.turns)))
+    return time.perf_counter() - started, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=3000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16, help="turns in flight for the async variants")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="raizito-bench-")
+    os.environ["DB_PATH"] = os.path.join(workdir, "after.db")
+    os.environ.pop("DATABASE_URL", None)
+    from bot.db import init_db, run_db, log_conversation_many, get_conversation_history
+    from bot.conversation_cache import ConversationCache
+
+    results = {}
+
+    before_path = os.path.join(workdir, "before.db")
+    _original_schema(before_path)
+
+    def before_turn(user_id, text):
+        _original_log(before_path, user_id, "user", text)
+        _original_log(before_path, user_id, "assistant", REPLY)
+        _original_history(before_path, user_id)
+
+    results["before (connect per call)"] = _timed_turns(before_turn, args)
+
+    init_db()
+
+    async def after_turn(user_id, text):
+        await run_db(log_conversation_many, user_id, [("user", text), ("assistant", REPLY)])
+        await run_db(get_conversation_history, user_id)
+
+    results["after (WAL, run_db)"] = asyncio.run(_timed_turns_async(after_turn, args))
+
+    async def write_behind():
+        cache = ConversationCache()
+
+        async def turn(user_id, text):
+            await cache.get_history(user_id)
+            cache.append(user_id, "user", text)
+            cache.append(user_id, "assistant", REPLY)
+
+        cache.start()
+        elapsed, latencies = await _timed_turns_async(turn, args)
+        flush_started = time.perf_counter()
+        await cache.stop()
+        return elapsed + (time.perf_counter() - flush_started), latencies
+
+    results["write-behind cache"] = asyncio.run(write_behind())
+
+    print(f"\n{args.turns} turns (2 messages stored + history read) over {args.users} users")
+    for name, (elapsed, latencies) in results.items():
+        stats = summarize(latencies)
+        print(f"{name:<28}{args.turns / elapsed:>9.0f} turns/s {2 * args.turns / elapsed:>9.0f} msg/s   "
+              f"p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,601 @@
+"""
+Local stand-ins for every external service the bot calls: the Telegram Bot
+API, Groq (chat + Whisper), the Google APIs (OAuth token, Gmail, Drive,
+Calendar, Docs) and Custom Search.
+
+Each stand-in is a small Starlette app served by uvicorn on 127.0.0.1 with
+configurable latency and fault injection, so benchmarks and tests exercise
+the bot's real HTTP clients. They run on a background thread (tests) or in
+a separate process (benchmarks, see StandInProcess) so they don't compete
+with the bot for the GIL.
+
+Every stand-in also serves:
+    GET  /_stats   request counts per endpoint
+    POST /_fault   {"status": 503, "stall": 0, "rate": 1.0, "path": "/x", "times": 2}, {} clears
+    POST /_latency {"latency": 0.2, "jitter": 0.05}
+"""
+import json
+import time
+import random
+import socket
+import asyncio
+import itertools
+import threading
+import multiprocessing
+from collections import Counter
+from email.parser import BytesParser
+from urllib.parse import parse_qs
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from benchmarks.media import ogg_duration
+
+
+class Fault:
+    """
+    Answer matching requests with an HTTP error and/or after a stall; with
+    `times`, only that many requests are hit.
+    """
+
+    def __init__(self, status=None, stall=0.0, rate=1.0, path=None, times=None):
+        self.status = status
+        self.stall = stall
+        self.rate = rate
+        self.path = path
+        self.remaining = times
+
+    def applies(self, path):
+        if self.remaining == 0:
+            return False
+        if (self.path is None or path.startswith(self.path)) and random.random() < self.rate:
+            if self.remaining is not None:
+                self.remaining -= 1
+            return True
+        return False
+
+
+class StandIn:
+    name = "stand-in"
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fault = None
+        self.requests = Counter()
+        self.port = None
+        self._server = None
+        self._thread = None
+
+    # Subclasses return (path, name, handler, methods); name may be a callable of the request
+    def endpoints(self):
+        raise NotImplementedError
+
+    def inject(self, status=None, stall=0.0, rate=1.0, path=None, times=None):
+        self.fault = Fault(status, stall, rate, path, times)
+
+    def clear(self):
+        self.fault = None
+
+    async def delay(self):
+        seconds = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def _wrap(self, name, handler):
+        async def endpoint(request: Request):
+            self.requests[name(request) if callable(name) else name] += 1
+            fault = self.fault
+            if fault is not None and fault.applies(request.url.path):
+                if fault.stall:
+                    await asyncio.sleep(fault.stall)
+                if fault.status:
+                    return JSONResponse(
+                        {"error": {"code": fault.status, "message": "injected fault"}}, status_code=fault.status
+                    )
+            await self.delay()
+            return await handler(request)
+        return endpoint
+
+    async def _stats(self, request):
+        return JSONResponse({"requests": dict(self.requests)})
+
+    async def _set_fault(self, request):
+        body = await request.json()
+        if body:
+            self.inject(**body)
+        else:
+            self.clear()
+        return JSONResponse({"ok": True})
+
+    async def _set_latency(self, request):
+        body = await request.json()
+        self.latency = body.get("latency", self.latency)
+        self.jitter = body.get("jitter", self.jitter)
+        return JSONResponse({"ok": True})
+
+    def app(self):
+        routes = [
+            Route(path, self._wrap(name, handler), methods=methods)
+            for path, name, handler, methods in self.endpoints()
+        ]
+        routes += [
+            Route("/_stats", self._stats, methods=["GET"]),
+            Route("/_fault", self._set_fault, methods=["POST"]),
+            Route("/_latency", self._set_latency, methods=["POST"]),
+        ]
+        return Starlette(routes=routes)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(
+            self.app(), log_level="warning", lifespan="off", access_log=False, backlog=4096,
+            timeout_keep_alive=30,
+        ))
+        self._thread = threading.Thread(
+            target=self._server.run, kwargs={"sockets": [sock]}, name=f"fake-{self.name}", daemon=True
+        )
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError(f"{self.name} stand-in failed to start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(10)
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+async def _form(request):
+    """Telegram form-urlencoded parameters; nested objects arrive as JSON strings."""
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return await request.json()
+    body = await request.body()
+    return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+
+class FakeTelegram(StandIn):
+    """Bot API at /bot<token>/<method> and file downloads at /file/bot<token>/<path>."""
+
+    name = "telegram"
+
+    def __init__(self, files=None, **kwargs):
+        super().__init__(**kwargs)
+        self.files = dict(files or {})  # file_id -> bytes
+        self._message_ids = itertools.count(1000)
+
+    def add_file(self, file_id, data):
+        self.files[file_id] = data
+
+    def endpoints(self):
+        return [
+            ("/bot{token}/{method}", lambda request: request.path_params["method"], self._bot_api, ["GET", "POST"]),
+            ("/file/bot{token}/{path:path}", "file", self._file, ["GET"]),
+        ]
+
+    def _message(self, params):
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "Raizito", "username": "raizito_bot"},
+            "text": params.get("text", ""),
+        }
+
+    async def _bot_api(self, request):
+        method = request.path_params["method"]
+        params = await _form(request)
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Raizito", "username": "raizito_bot",
+                      "can_join_groups": True, "can_read_all_group_messages": False,
+                      "supports_inline_queries": False}
+        elif method in ("sendMessage", "editMessageText"):
+            result = self._message(params)
+        elif method == "getFile":
+            file_id = params["file_id"]
+            data = self.files.get(file_id)
+            if data is None:
+                return JSONResponse({"ok": False, "error_code": 400, "description": "file not found"}, 400)
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": len(data),
+                      "file_path": f"files/{file_id}"}
+        elif method == "getUpdates":
+            await asyncio.sleep(min(float(params.get("timeout", 0) or 0), 1.0))
+            result = []
+        else:
+            result = True
+        return JSONResponse({"ok": True, "result": result})
+
+    async def _file(self, request):
+        file_id = request.path_params["path"].rsplit("/", 1)[-1]
+        data = self.files.get(file_id)
+        if data is None:
+            return Response(status_code=404)
+        return Response(data, media_type="application/octet-stream")
+
+
+class FakeGroq(StandIn):
+    """
+    OpenAI-compatible chat completions (plain and SSE streaming) and Whisper
+    transcriptions. `latency` is the time to first byte; streamed replies then
+    send one word per `token_delay` seconds. Transcriptions take
+    `realtime_factor` seconds per second of Ogg audio and return one word per
+    second of audio ("w<second>"), so stitched chunk transcripts can be checked.
+    `prefill_delay` adds that many seconds per 1000 prompt tokens, so longer
+    prompts answer slower, like on the real API.
+    """
+
+    name = "groq"
+
+    def __init__(self, reply_words=60, token_delay=0.0, realtime_factor=0.0, prefill_delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.reply_words = reply_words
+        self.token_delay = token_delay
+        self.realtime_factor = realtime_factor
+        self.prefill_delay = prefill_delay
+
+    def endpoints(self):
+        return [
+            ("/openai/v1/chat/completions", "chat", self._chat, ["POST"]),
+            ("/openai/v1/audio/transcriptions", "transcription", self._transcription, ["POST"]),
+        ]
+
+    def _words(self, body):
+        prompt = body["messages"][-1]["content"]
+        if isinstance(prompt, list):
+            prompt = next((part["text"] for part in prompt if part.get("type") == "text"), "")
+        seed = prompt.split()[:5] or ["ok"]
+        return [seed[i % len(seed)] for i in range(self.reply_words)]
+
+    @staticmethod
+    def _prompt_tokens(body):
+        # Same ~4 characters per token estimate as bot.ai_service.estimate_tokens
+        chars = 0
+        for message in body["messages"]:
+            content = message["content"]
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content)
+            chars += len(content)
+        return chars // 4 + 1
+
+    async def _chat(self, request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        self.requests[f"chat.{model}"] += 1
+        words = self._words(body)
+        prompt_tokens = self._prompt_tokens(body)
+        if self.prefill_delay:
+            await asyncio.sleep(prompt_tokens / 1000 * self.prefill_delay)
+        created = int(time.time())
+        if not body.get("stream"):
+            text = " ".join(words)
+            return JSONResponse({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                          "total_tokens": prompt_tokens + len(words)},
+            })
+
+        async def events():
+            for index, word in enumerate(words):
+                if index and self.token_delay:
+                    await asyncio.sleep(self.token_delay)
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": (" " if index else "") + word},
+                                 "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def _transcription(self, request):
+        body = await request.body()
+        # The audio is the "file" part of a multipart/form-data upload
+        form = BytesParser().parsebytes(
+            f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode() + body
+        )
+        audio = next(
+            (part.get_payload(decode=True) for part in form.get_payload()
+             if part.get_param("name", header="content-disposition") == "file"),
+            b"",
+        )
+        start, end = ogg_duration(audio)
+        if self.realtime_factor:
+            await asyncio.sleep((end - start) * self.realtime_factor)
+        text = " ".join(f"w{second}" for second in range(int(start), int(end)))
+        return PlainTextResponse(text or "ok")
+
+
+class FakeGoogle(StandIn):
+    """
+    OAuth token endpoint plus the Gmail, Drive, Calendar and Docs endpoints
+    the bot uses, as seen by googleapiclient with api_endpoint pointed here.
+
+    Drive and Calendar keep a change log, so changes.list page tokens and
+    Calendar sync tokens return only deltas. Gmail batches answer at most
+    `batch_part_limit` parts; the rest get a per-part 429, like Gmail does
+    for oversized batches.
+    """
+
+    name = "google"
+
+    def __init__(self, messages=100, drive_files=0, events=0, batch_part_limit=50, **kwargs):
+        super().__init__(**kwargs)
+        self.messages = [f"m{i:05d}" for i in range(messages)]
+        self.batch_part_limit = batch_part_limit
+        self.drive = {}  # id -> file
+        self.drive_log = []  # file ids, in change order
+        self.calendar = {}  # id -> event
+        self.calendar_log = []
+        self.sync_generation = 0
+        for i in range(drive_files):
+            self.put_file(f"f{i:06d}", f"Relatório {i}.pdf")
+        for i in range(events):
+            self.put_event(f"e{i:06d}", f"Reunião {i}", hours_from_now=1 + i)
+
+    # Data helpers for tests and workloads
+
+    def put_file(self, file_id, name, mime_type="application/pdf", trashed=False):
+        self.drive[file_id] = {"id": file_id, "name": name, "mimeType": mime_type, "trashed": trashed,
+                               "modifiedTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())}
+        self.drive_log.append(file_id)
+
+    def remove_file(self, file_id):
+        self.drive.pop(file_id, None)
+        self.drive_log.append(file_id)
+
+    def put_event(self, event_id, summary, hours_from_now=1.0):
+        start = time.gmtime(time.time() + hours_from_now * 3600)
+        end = time.gmtime(time.time() + (hours_from_now + 1) * 3600)
+        self.calendar[event_id] = {
+            "id": event_id, "status": "confirmed", "summary": summary,
+            "start": {"dateTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", start)},
+            "end": {"dateTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", end)},
+        }
+        self.calendar_log.append(event_id)
+
+    def cancel_event(self, event_id):
+        if event_id in self.calendar:
+            self.calendar[event_id] = {"id": event_id, "status": "cancelled"}
+            self.calendar_log.append(event_id)
+
+    def expire_sync_tokens(self):
+        """Make every Calendar sync token handed out so far answer 410 Gone."""
+        self.sync_generation += 1
+
+    def endpoints(self):
+        return [
+            ("/token", "token", self._token, ["POST"]),
+            ("/gmail/v1/users/me/messages", "gmail.list", self._gmail_list, ["GET"]),
+            ("/gmail/v1/users/me/messages/{id}", "gmail.get", self._gmail_get, ["GET"]),
+            ("/batch/gmail/v1", "gmail.batch", self._gmail_batch, ["POST"]),
+            ("/files", "drive.files", self._drive_files, ["GET"]),
+            ("/changes/startPageToken", "drive.start_token", self._drive_start_token, ["GET"]),
+            ("/changes", "drive.changes", self._drive_changes, ["GET"]),
+            ("/calendars/{calendar}/events", "calendar.events", self._calendar_events, ["GET"]),
+            ("/v1/documents/{id}", "docs.get", self._docs_get, ["GET"]),
+        ]
+
+    async def _token(self, request):
+        return JSONResponse({"access_token": "fake-token", "expires_in": 3600, "token_type": "Bearer"})
+
+    async def _gmail_list(self, request):
+        limit = int(request.query_params.get("maxResults", 100))
+        ids = self.messages[:limit]
+        return JSONResponse({"messages": [{"id": i, "threadId": i} for i in ids], "resultSizeEstimate": len(ids)})
+
+    def _gmail_message(self, message_id):
+        return {
+            "id": message_id, "threadId": message_id,
+            "payload": {"headers": [
+                {"name": "From", "value": "Cliente <cliente@example.com>"},
+                {"name": "Subject", "value": f"Pedido {message_id}"},
+                {"name": "Date", "value": "Mon, 1 Jan 2024 10:00:00 -0300"},
+            ]},
+        }
+
+    async def _gmail_get(self, request):
+        return JSONResponse(self._gmail_message(request.path_params["id"]))
+
+    async def _gmail_batch(self, request):
+        body = await request.body()
+        content_type = request.headers["content-type"]
+        message = BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        boundary = "batch_fake_boundary"
+        out = []
+        for index, part in enumerate(message.get_payload()):
+            self.requests["gmail.batch_part"] += 1
+            content_id = part["Content-ID"].strip("<>")
+            request_line = part.get_payload().split("\n", 1)[0].split()
+            path = request_line[1].split("?", 1)[0]
+            if index >= self.batch_part_limit:
+                self.requests["gmail.batch_part_429"] += 1
+                status, payload = "429 Too Many Requests", {
+                    "error": {"code": 429, "message": "Too many concurrent requests for user",
+                              "errors": [{"reason": "rateLimitExceeded"}]}}
+            else:
+                status, payload = "200 OK", self._gmail_message(path.rsplit("/", 1)[-1])
+            data = json.dumps(payload)
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n{data}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return Response("".join(out), media_type=f"multipart/mixed; boundary={boundary}")
+
+    def _page(self, items, request, size_param, default_size):
+        size = int(request.query_params.get(size_param, default_size))
+        offset = int(request.query_params.get("pageToken") or 0)
+        page = items[offset:offset + size]
+        next_token = str(offset + size) if offset + size < len(items) else None
+        return page, next_token
+
+    async def _drive_files(self, request):
+        files = [f for f in self.drive.values() if not f["trashed"]]
+        page, next_token = self._page(files, request, "pageSize", 100)
+        result = {"files": page}
+        if next_token:
+            result["nextPageToken"] = next_token
+        return JSONResponse(result)
+
+    async def _drive_start_token(self, request):
+        return JSONResponse({"startPageToken": str(len(self.drive_log))})
+
+    async def _drive_changes(self, request):
+        start = int(request.query_params["pageToken"])
+        size = int(request.query_params.get("pageSize", 100))
+        log = self.drive_log[start:start + size]
+        changes = []
+        for file_id in log:
+            item = self.drive.get(file_id)
+            change = {"fileId": file_id, "removed": item is None}
+            if item is not None:
+                change["file"] = item
+            changes.append(change)
+        result = {"changes": changes}
+        if start + size < len(self.drive_log):
+            result["nextPageToken"] = str(start + size)
+        else:
+            result["newStartPageToken"] = str(len(self.drive_log))
+        return JSONResponse(result)
+
+    async def _calendar_events(self, request):
+        sync_token = request.query_params.get("syncToken")
+        if sync_token:
+            generation, position = (int(part) for part in sync_token.split(":"))
+            if generation != self.sync_generation:
+                return JSONResponse({"error": {"code": 410, "message": "Sync token is no longer valid"}}, 410)
+            seen = set()
+            items = []
+            for event_id in self.calendar_log[position:]:
+                if event_id not in seen:
+                    seen.add(event_id)
+                    items.append(self.calendar[event_id])
+        else:
+            items = [e for e in self.calendar.values() if e.get("status") != "cancelled"]
+        page, next_token = self._page(items, request, "maxResults", 250)
+        result = {"items": page}
+        if next_token:
+            result["nextPageToken"] = next_token
+        else:
+            result["nextSyncToken"] = f"{self.sync_generation}:{len(self.calendar_log)}"
+        return JSONResponse(result)
+
+    async def _docs_get(self, request):
+        document_id = request.path_params["id"]
+        paragraphs = [{"paragraph": {"elements": [{"textRun": {"content": f"Parágrafo {i} do documento.\n"}}]}}
+                      for i in range(20)]
+        return JSONResponse({"documentId": document_id, "title": f"Documento {document_id}",
+                             "body": {"content": paragraphs}})
+
+
+class FakeSearch(StandIn):
+    """Custom Search JSON API at /customsearch/v1."""
+
+    name = "search"
+
+    def endpoints(self):
+        return [("/customsearch/v1", "search", self._search, ["GET"])]
+
+    async def _search(self, request):
+        query = request.query_params.get("q", "")
+        count = int(request.query_params.get("num", 3))
+        return JSONResponse({"items": [
+            {"title": f"{query} — resultado {i}", "link": f"https://example.com/{i}",
+             "snippet": f"Trecho {i} sobre {query}."}
+            for i in range(count)
+        ]})
+
+
+STAND_INS = {cls.name: cls for cls in (FakeTelegram, FakeGroq, FakeGoogle, FakeSearch)}
+
+
+def service_account_info(token_uri):
+    """A service account JSON with a freshly generated key, pointed at a fake token endpoint."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    return {
+        "type": "service_account",
+        "project_id": "bench",
+        "private_key_id": "bench-key",
+        "private_key": pem,
+        "client_email": "bench@bench.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": token_uri,
+    }
+
+
+def _serve_process(configs, conn):
+    stand_ins = [STAND_INS[name](**kwargs).start() for name, kwargs in configs]
+    conn.send([s.url for s in stand_ins])
+    try:
+        conn.recv()  # block until the parent asks us to stop
+    except EOFError:
+        pass  # the parent is gone
+    for stand_in in stand_ins:
+        stand_in.stop()
+
+
+class StandInProcess:
+    """
+    Run stand-ins in a child process: {name: kwargs} in, {name: url} out.
+    Use the /_stats, /_fault and /_latency endpoints to inspect or steer them.
+    """
+
+    def __init__(self, configs):
+        self.configs = list(configs.items())
+        self.urls = {}
+        self._conn = None
+        self._process = None
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_serve_process, args=(self.configs, child), daemon=True)
+        self._process.start()
+        urls = self._conn.recv()
+        self.urls = {name: url for (name, _), url in zip(self.configs, urls)}
+        return self.urls
+
+    def stop(self):
+        if self._process is not None:
+            self._conn.send("stop")
+            self._process.join(10)
+            self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
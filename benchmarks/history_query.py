@@ -0,0 +1,112 @@
+"""
+History lookup benchmark: seeds the conversations table with many users'
+messages and times get_conversation_history, the query behind every chat
+message.
+
+    python -m benchmarks.history_query --rows 1000000 --users 10000
+
+Compares the current query, answered from the (user_id, id) index, with the
+original `ORDER BY datetime(created_at) DESC`, with and without the index,
+and prints each query plan.
+"""
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.run import percentile
+
+ORIGINAL_QUERY = """
+    SELECT role, content FROM conversations WHERE user_id = ?
+    ORDER BY datetime(created_at) DESC, id DESC LIMIT ?
+"""
+
+
+def _seed(conn, args):
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    batch = []
+    for i in range(args.rows):
+        created = (start + timedelta(seconds=i)).isoformat()
+        role = "user" if i % 2 == 0 else "assistant"
+        batch.append((1 + rng.randrange(args.users), role, f"mensagem {i} com algum texto de conversa", created))
+        if len(batch) == 10_000:
+            conn.executemany(
+                "INSERT INTO conversations (user_id, role, content, created_at) VALUES (?, ?, ?, ?)", batch
+            )
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO conversations (user_id, role, content, created_at) VALUES (?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.execute("ANALYZE")
+
+
+def _time(lookup, args, queries):
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(queries):
+        user_id = 1 + rng.randrange(args.users)
+        started = time.perf_counter()
+        lookup(user_id)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _plan(conn, sql):
+    return "; ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, (1, 10)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--slow-queries", type=int, default=50, help="lookups timed for the unindexed variant")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="raizito-bench-")
+    os.environ["DB_PATH"] = os.path.join(workdir, "history.db")
+    os.environ.pop("DATABASE_URL", None)
+    from bot.db import init_db, get_connection, get_conversation_history
+
+    init_db()
+    conn = get_connection()
+    started = time.perf_counter()
+    _seed(conn, args)
+    print(f"seeded {args.rows} rows over {args.users} users in {time.perf_counter() - started:.1f} s")
+
+    variants = [
+        ("current (user_id, id) index", lambda u: get_conversation_history(u, args.limit), args.queries,
+         "SELECT role, content FROM conversations WHERE user_id = ? ORDER BY id DESC LIMIT ?"),
+        ("original, with the index", lambda u: conn.execute(ORIGINAL_QUERY, (u, args.limit)).fetchall(),
+         args.queries, ORIGINAL_QUERY),
+    ]
+    results = []
+    for name, lookup, queries, sql in variants:
+        results.append((name, _plan(conn, sql), _time(lookup, args, queries)))
+
+    # The original schema had no index on user_id at all
+    conn.execute("DROP INDEX idx_conversations_user_id")
+    conn.commit()
+    # A new connection for the plan: EXPLAIN on the cached statement still reports the dropped index
+    fresh = sqlite3.connect(os.environ["DB_PATH"])
+    plan = _plan(fresh, ORIGINAL_QUERY)
+    fresh.close()
+    results.append(("original, no index", plan,
+                    _time(lambda u: conn.execute(ORIGINAL_QUERY, (u, args.limit)).fetchall(),
+                          args, args.slow_queries)))
+
+    print(f"\nlast {args.limit} messages of a user, ~{args.rows // args.users} messages per user")
+    for name, plan, latencies in results:
+        # Microseconds: the indexed lookups are well under a millisecond
+        print(f"{name:<30} p50 {percentile(latencies, 50) * 1e6:>9.0f} us  "
+              f"p99 {percentile(latencies, 99) * 1e6:>9.0f} us  ({len(latencies)} lookups)")
+        print(f"{'':<30} plan: {plan}")
+
+
+if __name__ == "__main__":
+    main()
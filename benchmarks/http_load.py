@@ -0,0 +1,111 @@
+"""
+HTTP layer load test: concurrent web searches against the stub Custom
+Search server (in its own process, with --latency per request).
+
+    python -m benchmarks.http_load --requests 2000 --concurrency 100
+
+Variants:
+  original    requests.get called from the event loop, as google_search did
+  per-request a new httpx.AsyncClient (and connection) for every request
+  pooled      bot.http_client.request on the shared keep-alive client
+  search      bot.web_search.google_search end to end (pooled client,
+              resilience policy, metrics)
+
+Reports requests/s, p50/p99 latency and the worst event loop stall seen
+by a ticker task, i.e. how long every other user of the bot would wait.
+"""
+import os
+import time
+import asyncio
+import argparse
+
+import httpx
+
+from benchmarks.fakes import StandInProcess
+from benchmarks.run import summarize
+
+
+async def _ticker(stalls, interval=0.01):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - started - interval)
+
+
+async def _load(call, args):
+    latencies = []
+    stalls = []
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        async with slots:
+            started = time.perf_counter()
+            await call(f"consulta {i}")
+            latencies.append(time.perf_counter() - started)
+
+    ticker = asyncio.create_task(_ticker(stalls))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    # Let the ticker wake up once more, so a stall that lasted until the end is counted
+    await asyncio.sleep(0.05)
+    ticker.cancel()
+    return elapsed, latencies, max(stalls, default=0.0)
+
+
+async def _run_all(args, url):
+    import requests
+    from bot import http_client
+    from bot.web_search import google_search
+
+    params = {"key": "bench", "cx": "bench", "num": 3}
+
+    async def original(query):
+        response = requests.get(url, params={**params, "q": query})
+        response.json()
+
+    async def per_request(query):
+        async with httpx.AsyncClient(timeout=http_client.HTTP_TIMEOUT) as client:
+            (await client.get(url, params={**params, "q": query})).json()
+
+    async def pooled(query):
+        (await http_client.request("GET", url, params={**params, "q": query})).json()
+
+    variants = {"original": original, "per-request": per_request, "pooled": pooled, "search": google_search}
+    results = {}
+    for name, call in variants.items():
+        if name not in args.variants:
+            continue
+        results[name] = await _load(call, args)
+    await http_client.close_http_client()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub server time per request")
+    parser.add_argument("--variants", default="original,per-request,pooled,search")
+    args = parser.parse_args(argv)
+    args.variants = args.variants.split(",")
+
+    with StandInProcess({"search": {"latency": args.latency}}) as stand_ins:
+        url = stand_ins.urls["search"] + "/customsearch/v1"
+        os.environ["GOOGLE_SEARCH_URL"] = url
+        os.environ["GOOGLE_SEARCH_API_KEY"] = "bench"
+        os.environ["GOOGLE_SEARCH_CX"] = "bench"
+        results = asyncio.run(_run_all(args, url))
+
+    from bot.http_client import HTTP_MAX_PER_HOST
+    print(f"\n{args.requests} searches, {args.concurrency} in flight, {args.latency * 1000:g} ms per request "
+          f"(HTTP_MAX_PER_HOST={HTTP_MAX_PER_HOST})")
+    for name, (elapsed, latencies, stall) in results.items():
+        stats = summarize(latencies)
+        print(f"{name:<12}{args.requests / elapsed:>8.0f} req/s   p50 {stats['p50_ms']:>8} ms  "
+              f"p99 {stats['p99_ms']:>8} ms   worst loop stall {stall * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
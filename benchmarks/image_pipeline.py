@@ -0,0 +1,151 @@
+"""
+Image pipeline benchmark: what it costs to turn a Telegram photo into the
+vision model's request, from the downloaded bytes to the base64 data URL.
+
+    python -m benchmarks.image_pipeline --repeat 20
+
+Cases:
+  small photo   one 320x240 JPEG size
+  photo         Telegram's sizes up to 2560x1920 (320, 800, 1280, 2560)
+  large JPEG    a 4000x3000 JPEG with no smaller size (sent as a file)
+  PNG           a 1600x1200 PNG
+
+"original" is the old handle_photo: the largest size downloaded into a
+BytesIO, copied out with .read(), decoded by PIL and re-encoded to JPEG for
+the request. "current" picks the size with choose_photo_size and sends it
+through prepare_image. Reports bytes downloaded, bytes copied along the way
+(buffers plus decoded pixels, which tracemalloc does not see), traced peak
+memory, request payload size and wall time per image.
+"""
+import time
+import asyncio
+import argparse
+import tracemalloc
+from io import BytesIO
+from types import SimpleNamespace
+
+from benchmarks import media
+
+
+def _png(width, height):
+    import PIL.Image
+
+    out = BytesIO()
+    PIL.Image.open(BytesIO(media.jpeg(width, height))).save(out, format="PNG")
+    return out.getvalue()
+
+
+def _photo_sizes(sides):
+    return [SimpleNamespace(width=w, height=h, data=media.jpeg(w, h, seed=w)) for w, h in sides]
+
+
+CASES = {
+    "small photo": lambda: _photo_sizes([(320, 240)]),
+    "photo": lambda: _photo_sizes([(320, 240), (800, 600), (1280, 960), (2560, 1920)]),
+    "large JPEG": lambda: _photo_sizes([(4000, 3000)]),
+    "PNG": lambda: [SimpleNamespace(width=1600, height=1200, data=_png(1600, 1200))],
+}
+
+
+def _data_url_bytes(messages):
+    return len(messages[-1]["content"][1]["image_url"]["url"])
+
+
+def _jpeg_bytes(url):
+    """Size of the JPEG behind a data URL of `url` bytes (base64 without padding, ±2)."""
+    return (url - len("data:image/jpeg;base64,")) * 3 // 4
+
+
+def _decoded_bytes(data, draft=None):
+    """Size of the pixel buffer PIL decodes, with the draft request the pipeline makes."""
+    import PIL.Image
+
+    img = PIL.Image.open(BytesIO(bytes(data)))
+    if draft:
+        img.draft("RGB", (draft, draft))
+    return img.size[0] * img.size[1] * len(img.getbands())
+
+
+def original(sizes):
+    import PIL.Image
+    from bot.ai_service import _build_messages
+
+    data = sizes[-1].data
+    bio = BytesIO()
+    bio.write(data)  # download_to_memory
+    bio.seek(0)
+    image_data = bio.read()
+    img = PIL.Image.open(BytesIO(image_data))
+    messages, _ = _build_messages("Describe this image", [img])
+    return data, messages
+
+
+def original_copies(data, messages):
+    url = _data_url_bytes(messages)
+    # download buffer, .read() copy, decoded pixels, JPEG buffer + getvalue(), base64 bytes, str, data URL
+    return 2 * len(data) + _decoded_bytes(data) + 2 * _jpeg_bytes(url) + 3 * url
+
+
+async def current(sizes):
+    from bot.ai_service import _build_messages
+    from bot.image_pipeline import choose_photo_size, prepare_image
+
+    photo = choose_photo_size(sizes)
+    data = bytearray(photo.data)  # download_as_bytearray
+    prepared = await prepare_image(data, (photo.width, photo.height))
+    messages, _ = _build_messages("Describe this image", [prepared])
+    return data, messages
+
+
+def current_copies(data, messages):
+    from bot.image_pipeline import IMAGE_MAX_SIDE
+
+    url = _data_url_bytes(messages)
+    # download buffer, base64 bytes, str, data URL
+    copied = len(data) + 3 * url
+    if abs(_jpeg_bytes(url) - len(data)) > 2:
+        # Downscaled: draft-mode decoded pixels and the new JPEG
+        copied += _decoded_bytes(data, IMAGE_MAX_SIDE) + _jpeg_bytes(url)
+    return copied
+
+
+async def _measure(run, copies, sizes, repeat):
+    async def once():
+        result = run(sizes)
+        return await result if asyncio.iscoroutine(result) else result
+
+    # Warm up first, so first-use imports don't count towards the traced peak
+    await once()
+    tracemalloc.start()
+    data, messages = await once()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await once()
+    seconds = (time.perf_counter() - started) / repeat
+    return len(data), copies(data, messages), peak, _data_url_bytes(messages), seconds
+
+
+async def _run_all(args):
+    paths = {"original": (original, original_copies), "current": (current, current_copies)}
+    print(f"{'case':<13}{'path':<10}{'downloaded':>12}{'copied':>12}{'peak':>12}{'payload':>12}{'time':>10}")
+    for case, build in CASES.items():
+        sizes = build()
+        for name, (run, copies) in paths.items():
+            downloaded, copied, peak, payload, seconds = await _measure(run, copies, sizes, args.repeat)
+            print(f"{case:<13}{name:<10}{downloaded / 1024:>9.0f} KB{copied / 2**20:>9.1f} MB"
+                  f"{peak / 2**20:>9.1f} MB{payload / 1024:>9.0f} KB{seconds * 1000:>7.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per case")
+    args = parser.parse_args(argv)
+
+    asyncio.run(_run_all(args))
+
+
+if __name__ == "__main__":
+    main()
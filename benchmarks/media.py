@@ -0,0 +1,76 @@
+"""
+Synthetic media for the benchmarks: JPEG photos of realistic size and
+Ogg/Opus voice notes with valid framing (the packets are filler, but page
+structure, granules and checksums are real, which is all the bot parses).
+"""
+import random
+import struct
+from io import BytesIO
+
+from bot.audio_chunks import OPUS_SAMPLE_RATE, _ogg_crc, _parse_pages
+
+_FRAME_SAMPLES = 960  # 20 ms at 48 kHz
+_SERIAL = 0x5241495A
+
+
+def jpeg(width=1280, height=960, quality=90, seed=0):
+    """A noisy gradient JPEG; noise keeps the file size close to a real photo."""
+    import PIL.Image
+
+    rng = random.Random(seed)
+    small = PIL.Image.new("RGB", (64, 48))
+    small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(64 * 48)])
+    img = small.resize((width, height), PIL.Image.BICUBIC)
+    noise = PIL.Image.effect_noise((width, height), 24).convert("RGB")
+    img = PIL.Image.blend(img, noise, 0.25)
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def _page(body_packets, granule, sequence, flags):
+    segments = []
+    for packet in body_packets:
+        size = len(packet)
+        segments += [255] * (size // 255) + [size % 255]
+    header = bytearray(b"OggS" + bytes([0, flags]) + struct.pack("<qIII", granule, _SERIAL, sequence, 0))
+    header += bytes([len(segments)]) + bytes(segments)
+    page = header + b"".join(body_packets)
+    struct.pack_into("<I", page, 22, _ogg_crc(page))
+    return bytes(page)
+
+
+def voice_note(seconds, page_seconds=1.0, packet_bytes=40):
+    """An Ogg/Opus stream `seconds` long, one page per `page_seconds` of audio."""
+    head = b"OpusHead" + bytes([1, 1]) + struct.pack("<HIhB", 0, OPUS_SAMPLE_RATE, 0, 0)
+    tags = b"OpusTags" + struct.pack("<I", 5) + b"bench" + struct.pack("<I", 0)
+    pages = [_page([head], 0, 0, 0x02), _page([tags], 0, 1, 0)]
+
+    frames_per_page = int(page_seconds * OPUS_SAMPLE_RATE / _FRAME_SAMPLES)
+    # TOC byte 0x78: SILK/CELT hybrid, 20 ms, mono, one frame per packet
+    packet = bytes([0x78]) + bytes(packet_bytes - 1)
+    total_frames = int(seconds * OPUS_SAMPLE_RATE / _FRAME_SAMPLES)
+    sequence = 2
+    written = 0
+    while written < total_frames:
+        count = min(frames_per_page, total_frames - written)
+        written += count
+        flags = 0x04 if written == total_frames else 0
+        pages.append(_page([packet] * count, written * _FRAME_SAMPLES, sequence, flags))
+        sequence += 1
+    return b"".join(pages)
+
+
+def ogg_duration(data):
+    """
+    (start, end) in seconds of the audio pages in an Ogg stream. Chunks keep
+    their original granules, so a chunk of a longer note reports where in the
+    note it sits. Returns (0, 0) for anything that isn't Ogg.
+    """
+    pages = _parse_pages(data)
+    granules = [granule for _, granule, _ in (pages or []) if granule > 0]
+    if not granules:
+        return 0.0, 0.0
+    first_page = granules[1] - granules[0] if len(granules) > 1 else granules[0]
+    start = max(granules[0] - first_page, 0)
+    return start / OPUS_SAMPLE_RATE, granules[-1] / OPUS_SAMPLE_RATE
@@ -0,0 +1,147 @@
+"""
+Semantic memory benchmark: fills the conversation log from several writer
+processes at once (the out-of-order commit case that a plain id watermark
+gets wrong), then measures recall of planted messages and query latency.
+
+    python -m benchmarks.memory_recall --messages 1000000 --writers 4
+    DATABASE_URL=postgresql://... python -m benchmarks.memory_recall --writers 8
+
+Without DATABASE_URL it uses a temporary SQLite file. Reports ingest rate,
+rows missing from the index (must be 0), recall@k and p50/p95/p99 recall
+latency.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime
+
+from benchmarks.run import summarize
+
+WORDS = """
+    casa carro trabalho reunião projeto cliente pedido entrega prazo relatório planilha
+    viagem hotel voo passagem férias praia montanha cidade restaurante jantar almoço
+    médico consulta exame remédio academia corrida treino futebol jogo filme série livro
+    música show ingresso aniversário presente festa família amigo escola curso prova
+    banco conta boleto cartão fatura imposto salário orçamento compra mercado feira
+""".split()
+
+# (planted message, later query that should recall it)
+NEEDLES = [
+    ("minha placa de vídeo superaquece quando jogo à noite", "placa de vídeo superaquecendo"),
+    ("o veterinário disse que o gato precisa de ração renal", "ração renal do gato"),
+    ("comprei uma orquídea azul para o jardim de inverno", "orquídea azul jardim"),
+    ("o encanador vem consertar o vazamento da pia na quinta", "vazamento da pia encanador"),
+    ("estou aprendendo violoncelo com uma professora húngara", "aulas de violoncelo"),
+    ("a senha do roteador fica colada embaixo do modem", "senha do roteador"),
+]
+
+
+def _filler(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14)))
+
+
+def _writer(worker, args, needle_plan):
+    # Each writer is a separate process with its own connection, like the bot's worker processes
+    from bot.db import log_conversation_rows
+    from bot.memory import semantic_memory
+
+    rng = random.Random(worker)
+    per_writer = args.messages // args.writers
+    needles = {position: text for position, text in needle_plan.get(worker, [])}
+    written = 0
+    while written < per_writer:
+        now = datetime.utcnow().isoformat()
+        rows = []
+        for _ in range(min(args.flush_rows, per_writer - written)):
+            user_id = 1 + rng.randrange(args.users)
+            text = _filler(rng)
+            if written in needles:
+                user_id, text = needles[written]
+            rows.append((user_id, "user", text, now))
+            written += 1
+        # Writer 0 plays the primary, the only process that moves the backfill watermark
+        log_conversation_rows(rows, semantic_memory.terms_for(rows), watermark=worker == 0)
+
+
+def _missing_from_index():
+    """Rows with at least one feature but no postings."""
+    from bot.db import get_connection
+    from bot.memory import features
+
+    conn = get_connection()
+    indexed = {row[0] for row in conn.execute("SELECT DISTINCT message_id FROM memory_postings")}
+    missing = 0
+    for message_id, content in conn.execute("SELECT id, content FROM conversations"):
+        if message_id not in indexed and features(content):
+            missing += 1
+    return missing
+
+
+async def _measure_recall(args, probes):
+    from bot.memory import semantic_memory
+
+    latencies = []
+    hits = 0
+    for user_id, needle, query in probes:
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            memories = await semantic_memory.recall(user_id, query)
+            latencies.append(time.perf_counter() - started)
+        hits += needle in [m["content"] for m in memories]
+    return hits, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=20, help="few users = long per-user histories")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--flush-rows", type=int, default=50, help="rows per flush transaction")
+    parser.add_argument("--repeat", type=int, default=5, help="queries timed per probe")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="raizito-bench-")
+    if not os.getenv("DATABASE_URL"):
+        os.environ["DB_PATH"] = os.path.join(workdir, "memory.db")
+    from bot.db import init_db
+    init_db()
+
+    # Spread needles over writers and positions, so some land in rows committed out of id order
+    rng = random.Random(0)
+    per_writer = args.messages // args.writers
+    needle_plan, probes = {}, []
+    for index, (needle, query) in enumerate(NEEDLES):
+        user_id = 1 + index % args.users
+        worker = index % args.writers
+        needle_plan.setdefault(worker, []).append((rng.randrange(per_writer), (user_id, needle)))
+        probes.append((user_id, needle, query))
+
+    context = multiprocessing.get_context("spawn")
+    started = time.perf_counter()
+    writers = [context.Process(target=_writer, args=(w, args, needle_plan)) for w in range(args.writers)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+        if writer.exitcode:
+            raise SystemExit(f"writer failed with exit code {writer.exitcode}")
+    ingest = time.perf_counter() - started
+
+    missing = _missing_from_index()
+    hits, latencies = asyncio.run(_measure_recall(args, probes))
+    from bot.memory import semantic_memory
+    stats = summarize(latencies)
+    total = per_writer * args.writers
+    print(f"{total} messages from {args.writers} writers in {ingest:.1f} s ({total / ingest:.0f} rows/s, indexed)")
+    print(f"rows missing from the index: {missing}")
+    print(f"recall@{semantic_memory.k}: {hits}/{len(probes)} planted messages found")
+    print(f"recall latency: p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, p99 {stats['p99_ms']} ms "
+          f"over {stats['count']} queries (~{total // args.users} messages per user)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Reminder scheduling benchmark: seeds the tasks table with pending tasks
+due within the reminder horizon (and more beyond it) and times the
+ReminderEngine on a real JobQueue, which is not started, so nothing fires
+on its own.
+
+    python -m benchmarks.reminders --tasks 100000 --beyond 100000 --changes 500
+
+Reports the first load, an idle reload, an incremental reload with
+--changes rows completed or rescheduled, upsert/remove cost on the full
+heap, firing a burst of overdue reminders, and, for comparison, one
+JobQueue job per task and polling every pending task per tick.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.run import peak_rss_mb
+
+
+def _iso(value):
+    return value.astimezone(timezone.utc).replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+def _seed(conn, args, now):
+    rng = random.Random(0)
+    rows = []
+    # Within the horizon, beyond it, and a burst that is already due
+    for count, start, span in ((args.tasks, 60, 23 * 3600), (args.beyond, 25 * 3600, 30 * 86400),
+                               (args.burst, -600, 300)):
+        for _ in range(count):
+            due = now + timedelta(seconds=start + rng.randrange(span))
+            rows.append((1 + rng.randrange(args.users), "tarefa de benchmark", _iso(due), "2024-01-01T00:00:00"))
+    with conn:
+        conn.executemany("INSERT INTO tasks (user_id, title, due_date, updated_at) VALUES (?, ?, ?, ?)", rows)
+    conn.execute("ANALYZE")
+
+
+async def _timed(coro):
+    started = time.perf_counter()
+    await coro
+    return time.perf_counter() - started
+
+
+class _Bot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text):
+        self.sent += 1
+
+
+async def _run(args):
+    from telegram.ext import ApplicationBuilder
+    from bot.db import get_connection
+    from bot.reminders import ReminderEngine, REMINDER_HORIZON
+
+    now = datetime.now(timezone.utc)
+    conn = get_connection()
+    started = time.perf_counter()
+    _seed(conn, args, now)
+    seeded = time.perf_counter() - started
+    results = [("seed", seeded, f"{args.tasks + args.beyond + args.burst} tasks")]
+
+    app = ApplicationBuilder().token("1:bench").build()
+    job_queue = app.job_queue
+    engine = ReminderEngine()
+    # start() would also schedule the periodic reload; drive _reload by hand instead
+    engine._job_queue = job_queue
+    context = SimpleNamespace(bot=_Bot())
+
+    rss_before = peak_rss_mb()
+    results.append(("first load", await _timed(engine._reload(context)),
+                    f"{engine.stats()['scheduled']} tasks in memory, {len(job_queue.jobs())} job(s), "
+                    f"peak RSS +{peak_rss_mb() - rss_before:.0f} MB"))
+    results.append(("idle reload", await _timed(engine._reload(context)), "no changed rows"))
+
+    # Leave the overdue burst alone until it fires
+    upcoming = sorted(task_id for task_id, (due_date, _, _) in engine._tasks.items() if due_date > _iso(now))
+    changed = random.Random(1).sample(upcoming, args.changes)
+    stamp = _iso(datetime.now(timezone.utc) + timedelta(seconds=1))
+    with conn:
+        conn.executemany(
+            "UPDATE tasks SET is_completed = 1, updated_at = ? WHERE id = ?",
+            [(stamp, task_id) for task_id in changed[::2]],
+        )
+        conn.executemany(
+            "UPDATE tasks SET due_date = ?, updated_at = ? WHERE id = ?",
+            [(_iso(now + timedelta(hours=2)), stamp, task_id) for task_id in changed[1::2]],
+        )
+    engine._last_sync = stamp
+    results.append(("incremental reload", await _timed(engine._reload(context)),
+                    f"{args.changes} changed rows"))
+
+    upcoming = [task_id for task_id in upcoming if task_id in engine._tasks]
+    ops = random.Random(2).sample(upcoming, min(args.ops, len(upcoming)))
+    started = time.perf_counter()
+    for task_id in ops:
+        due_date, user_id, title = engine._tasks[task_id]
+        engine.upsert(task_id, user_id, title, due_date)
+    for task_id in ops:
+        engine.remove(task_id)
+    per_op = (time.perf_counter() - started) / (2 * len(ops))
+    results.append(("upsert + remove", per_op, f"per operation, {len(ops)} of each"))
+
+    results.append(("fire burst", await _timed(engine._fire(context)),
+                    f"{context.bot.sent} reminders sent and marked"))
+
+    # Alternatives the engine avoids
+    horizon = _iso(datetime.now(timezone.utc) + REMINDER_HORIZON)
+    due = conn.execute(
+        "SELECT id, due_date FROM tasks WHERE is_completed = 0 AND due_date <= ? AND reminded_at IS NULL", (horizon,)
+    ).fetchall()
+
+    async def noop(context):
+        pass
+
+    started = time.perf_counter()
+    jobs = [job_queue.run_once(noop, when=datetime.fromisoformat(d).replace(tzinfo=timezone.utc)) for _, d in due]
+    results.append(("one job per task", time.perf_counter() - started, f"{len(jobs)} jobs scheduled"))
+    for job in jobs:
+        job.schedule_removal()
+
+    started = time.perf_counter()
+    pending = conn.execute("SELECT id, user_id, title, due_date FROM tasks WHERE is_completed = 0").fetchall()
+    results.append(("poll all pending", time.perf_counter() - started, f"{len(pending)} rows read per tick"))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=100_000, help="pending tasks due within the horizon")
+    parser.add_argument("--beyond", type=int, default=100_000, help="pending tasks due after the horizon")
+    parser.add_argument("--burst", type=int, default=1000, help="tasks already due when the engine loads")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--changes", type=int, default=500, help="rows changed before the incremental reload")
+    parser.add_argument("--ops", type=int, default=10_000, help="upserts and removes timed on the full heap")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="raizito-bench-")
+    os.environ["DB_PATH"] = os.path.join(workdir, "reminders.db")
+    os.environ.pop("DATABASE_URL", None)
+    from bot.db import init_db
+    init_db()
+
+    for name, seconds, detail in asyncio.run(_run(args)):
+        unit = f"{seconds * 1e6:>9.1f} us" if seconds < 0.001 else f"{seconds * 1000:>9.1f} ms"
+        print(f"{name:<20}{unit}   {detail}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+End-to-end load test: boots the real Application from main.py against local
+stand-ins for Telegram, Groq, Google and Custom Search (benchmarks/fakes.py)
+and feeds it a mixed workload of synthetic updates.
+
+    python -m benchmarks.run --updates 2000 --concurrency 64
+    python -m benchmarks.run --mix text=1 --groq-latency 0.5 --json out.json
+
+Reports throughput, p50/p95/p99 latency per update kind and overall, peak
+RSS and how many calls reached each stand-in. Updates go through
+app.update_queue, like polling and webhook deliveries do, so they wait for
+one of the CONCURRENT_UPDATES slots. Latency runs from queueing the update
+until its handlers returned and the AI job it queued, if any, finished,
+i.e. until every reply for the update was sent.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import resource
+import contextvars
+import tempfile
+from collections import Counter, defaultdict
+
+import httpx
+
+from benchmarks import media
+from benchmarks.fakes import StandInProcess, service_account_info
+
+KINDS = ("text", "photo", "voice", "task", "list", "gmail", "search")
+DEFAULT_MIX = "text=60,photo=10,voice=10,task=8,list=6,gmail=3,search=3"
+
+PROMPTS = [
+    "Qual a capital da Austrália?",
+    "Me explica como funciona o protocolo TCP em detalhes, com exemplos de handshake e controle de congestionamento.",
+    "Escreve um e-mail curto confirmando a reunião de amanhã às 10h.",
+    "oi",
+    "Resuma as vantagens de usar SQLite com WAL em um bot com muitos usuários.",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(max(values, default=0) * 1000, 1),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in KINDS:
+            raise SystemExit(f"unknown update kind: {kind} (choose from {', '.join(KINDS)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def configure_environment(urls, args):
+    """Point the bot at the stand-ins and lift limits that would only measure the rate limiter."""
+    defaults = {
+        "TELEGRAM_TOKEN": "123456:bench",
+        "TELEGRAM_API_URL": urls["telegram"],
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": urls["groq"],
+        "GOOGLE_SERVICE_ACCOUNT_JSON": json.dumps(service_account_info(urls["google"] + "/token")),
+        "GOOGLE_API_ENDPOINT": urls["google"],
+        "GOOGLE_SEARCH_URL": urls["search"] + "/customsearch/v1",
+        "GOOGLE_SEARCH_API_KEY": "bench",
+        "GOOGLE_SEARCH_CX": "bench",
+        "DB_PATH": os.path.join(args.workdir, "bench.db"),
+        "SCHEDULER_RATE_PER_MINUTE": "1000000",
+        "SCHEDULER_BURST": "100000",
+        "SCHEDULER_MAX_QUEUE": "100000",
+        "SCHEDULER_MAX_PER_USER": "1000",
+        "STREAM_EDIT_INTERVAL": "0.2",
+        "GOOGLE_SYNC_INTERVAL": "0",
+        "MAINTENANCE_INTERVAL": "0",
+        "METRICS_PORT": "0",
+    }
+    for name, value in defaults.items():
+        # Anything already set in the environment (e.g. DATABASE_URL tuning) wins
+        os.environ.setdefault(name, value)
+    if args.sqlite:
+        os.environ.pop("DATABASE_URL", None)
+
+
+class Completion:
+    """
+    Tells when an update is fully answered. Handlers return once their AI
+    job is admitted, so the job's future is captured from
+    ai_scheduler.submit within the update's task, and a TypeHandler in a
+    late group (groups run in order for each update) waits for it. Failed
+    jobs are counted in `errors` by exception type.
+    """
+
+    def __init__(self, app, errors):
+        from telegram import Update
+        from telegram.ext import TypeHandler
+        from bot.handlers import ai_scheduler
+
+        self.errors = errors
+        self._job = contextvars.ContextVar("benchmark_job", default=None)
+        self._latest = {}  # user_id -> future of the user's last queued job
+        self._waiters = {}  # update_id -> future set once the update is answered
+        submit = ai_scheduler.submit
+
+        async def tracked_submit(user_id, run, text=None):
+            future = await submit(user_id, run, text=text)
+            if future is None:
+                # Merged into the user's last queued job, which answers for both
+                future = self._latest[user_id]
+            self._latest[user_id] = future
+            self._job.set(future)
+            return future
+
+        ai_scheduler.submit = tracked_submit
+        app.add_handler(TypeHandler(Update, self._handled), group=99)
+
+    def expect(self, update_id):
+        """A future resolved when the update with this id is fully answered."""
+        waiter = self._waiters[update_id] = asyncio.get_running_loop().create_future()
+        return waiter
+
+    async def _handled(self, update, context):
+        waiter = self._waiters.pop(update.update_id, None)
+        job = self._job.get()
+        if waiter is None:
+            return
+        if job is None:
+            waiter.set_result(None)
+            return
+
+        def finished(future):
+            if not future.cancelled() and future.exception() is not None:
+                self.errors[type(future.exception()).__name__] += 1
+            waiter.set_result(None)
+
+        job.add_done_callback(finished)
+
+
+class Workload:
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.mix = parse_mix(args.mix)
+        self.users = args.users
+        self.ids = iter(range(1, 10**9))
+
+    def _message(self, user_id):
+        update_id = next(self.ids)
+        return update_id, {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "language_code": "pt-br"},
+        }
+
+    def _command(self, message, text):
+        command = text.split()[0]
+        message["text"] = text
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+
+    def next(self):
+        kind = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        user_id = 10_000 + self.rng.randrange(self.users)
+        update_id, message = self._message(user_id)
+        if kind == "text":
+            message["text"] = self.rng.choice(PROMPTS)
+        elif kind == "photo":
+            message["photo"] = [
+                {"file_id": "photo-small", "file_unique_id": "ps", "width": 320, "height": 240},
+                {"file_id": "photo-large", "file_unique_id": "pl", "width": 1280, "height": 960},
+            ]
+            message["caption"] = "O que tem nessa foto?"
+        elif kind == "voice":
+            message["voice"] = {"file_id": "voice", "file_unique_id": "v", "duration": 20, "mime_type": "audio/ogg"}
+        elif kind == "task":
+            self._command(message, f"/task Pagar conta {update_id} @ amanhã 18:00")
+        elif kind == "list":
+            self._command(message, "/list")
+        elif kind == "gmail":
+            self._command(message, "/gmail")
+        elif kind == "search":
+            self._command(message, f"/search {self.rng.choice(PROMPTS)}")
+        return kind, {"update_id": update_id, "message": message}
+
+
+async def drive(app, completion, workload, args):
+    from telegram import Update
+
+    latencies = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(kind, data):
+        try:
+            started = time.perf_counter()
+            answered = completion.expect(data["update_id"])
+            await app.update_queue.put(Update.de_json(data, app.bot))
+            await answered
+            latencies[kind].append(time.perf_counter() - started)
+        finally:
+            semaphore.release()
+
+    tasks = []
+    started = time.perf_counter()
+    for _ in range(args.updates):
+        await semaphore.acquire()
+        kind, data = workload.next()
+        tasks.append(asyncio.create_task(one(kind, data)))
+    await asyncio.gather(*tasks)
+    return latencies, time.perf_counter() - started
+
+
+async def main_async(args, urls):
+    import main as bot_main
+    from bot.db import init_db
+
+    errors = Counter()
+
+    async def on_error(update, context):
+        errors[type(context.error).__name__] += 1
+
+    init_db()
+    app = bot_main.build_application(updater=False)
+    app.add_error_handler(on_error)
+    completion = Completion(app, errors)
+    rss_before = peak_rss_mb()
+    async with app:
+        await bot_main.post_init(app)
+        await app.start()
+        if args.warmup:
+            await drive(app, completion, Workload(args),
+                        argparse.Namespace(**{**vars(args), "updates": args.warmup}))
+        latencies, elapsed = await drive(app, completion, Workload(args), args)
+        await app.stop()
+        await bot_main.post_shutdown(app)
+
+    stand_ins = {}
+    async with httpx.AsyncClient() as client:
+        for name, url in urls.items():
+            stand_ins[name] = (await client.get(url + "/_stats")).json()["requests"]
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "updates": len(all_latencies),
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_per_s": round(len(all_latencies) / elapsed, 1),
+        "overall": summarize(all_latencies),
+        "by_kind": {kind: summarize(values) for kind, values in sorted(latencies.items())},
+        "errors": dict(errors),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stand_in_requests": stand_ins,
+    }
+
+
+def print_report(report):
+    print(f"\n{report['updates']} updates in {report['elapsed_s']} s "
+          f"({report['throughput_per_s']} updates/s, concurrency {report['concurrency']})")
+    print(f"{'kind':<10}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = list(report["by_kind"].items()) + [("overall", report["overall"])]
+    for kind, stats in rows:
+        print(f"{kind:<10}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    print(f"peak RSS: {report['peak_rss_mb']} MB (after boot: {report['rss_before_mb']} MB)")
+    if report["errors"]:
+        print(f"handler errors: {report['errors']}")
+    for name, counts in report["stand_in_requests"].items():
+        print(f"{name}: {sum(counts.values())} requests {dict(sorted(counts.items()))}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50, help="updates sent before measuring")
+    parser.add_argument("--concurrency", type=int, default=64, help="updates in flight at once")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"kind=weight list (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--telegram-latency", type=float, default=0.02)
+    parser.add_argument("--groq-latency", type=float, default=0.3, help="time to first byte")
+    parser.add_argument("--groq-token-delay", type=float, default=0.005)
+    parser.add_argument("--whisper-realtime-factor", type=float, default=0.02)
+    parser.add_argument("--google-latency", type=float, default=0.08)
+    parser.add_argument("--search-latency", type=float, default=0.15)
+    parser.add_argument("--jitter", type=float, default=0.5, help="jitter as a fraction of each latency")
+    parser.add_argument("--voice-seconds", type=float, default=20)
+    parser.add_argument("--sqlite", action="store_true", help="ignore DATABASE_URL and use a temp SQLite file")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's INFO logs")
+    return parser
+
+
+def stand_in_configs(args):
+    def timing(latency):
+        return {"latency": latency, "jitter": latency * args.jitter}
+
+    files = {
+        "photo-small": media.jpeg(320, 240),
+        "photo-large": media.jpeg(1280, 960),
+        "voice": media.voice_note(args.voice_seconds),
+    }
+    return {
+        "telegram": {"files": files, **timing(args.telegram_latency)},
+        "groq": {"token_delay": args.groq_token_delay, "realtime_factor": args.whisper_realtime_factor,
+                 **timing(args.groq_latency)},
+        "google": {"messages": 200, "drive_files": 500, "events": 100, **timing(args.google_latency)},
+        "search": timing(args.search_latency),
+    }
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir, StandInProcess(stand_in_configs(args)) as stand_ins:
+        args.workdir = workdir
+        configure_environment(stand_ins.urls, args)
+        report = asyncio.run(main_async(args, stand_ins.urls))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    if "--verbose" not in sys.argv:
+        # main.py configures INFO logging on import; keep the report readable
+        logging.disable(logging.INFO)
+    main()
@@ -0,0 +1,112 @@
+"""
+Webhook load test: serves the real Application through bot.webhook (the
+BOT_MODE=webhook web app) on a local port, with the same stand-ins as
+benchmarks/run.py, and POSTs synthetic Telegram updates at it.
+
+    python -m benchmarks.webhook_load --updates 2000 --connections 40
+    python -m benchmarks.webhook_load --mix text=1 --groq-latency 0
+
+Reports how fast deliveries are acknowledged (what Telegram sees), how fast
+updates are fully processed, and how long a SIGTERM drain takes.
+"""
+import time
+import signal
+import socket
+import asyncio
+import logging
+import tempfile
+from collections import Counter
+
+import httpx
+
+from benchmarks import run
+from benchmarks.fakes import StandInProcess
+
+
+async def main_async(args, urls):
+    import uvicorn
+    import main as bot_main
+    from bot import webhook
+    from bot.db import init_db
+
+    init_db()
+    app = bot_main.build_application(updater=False)
+    errors = Counter()
+    completion = run.Completion(app, errors)
+
+    state = {"draining": False}
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = webhook.DrainingServer(uvicorn.Config(
+        webhook.build_web_app(app, state), log_level="warning", lifespan="off", access_log=False,
+        backlog=4096,
+    ), state, drain_seconds=0)
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}{webhook.WEBHOOK_PATH}"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": webhook.WEBHOOK_SECRET}
+
+    async with app:
+        await bot_main.post_init(app)
+        await app.start()
+        serving = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        workload = run.Workload(args)
+        ack_latencies = []
+        answered = []
+        statuses = {}
+        slots = asyncio.Semaphore(args.connections)
+        limits = httpx.Limits(max_connections=args.connections)
+
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            async def deliver(data):
+                async with slots:
+                    answered.append(completion.expect(data["update_id"]))
+                    started = time.perf_counter()
+                    response = await client.post(url, json=data, headers=headers)
+                    ack_latencies.append(time.perf_counter() - started)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(deliver(workload.next()[1]) for _ in range(args.updates)))
+            acked = time.perf_counter() - started
+            await asyncio.gather(*answered)
+            finished = time.perf_counter() - started
+
+            # Stop the way SIGTERM would and time the drain
+            drain_started = time.perf_counter()
+            server.handle_exit(signal.SIGTERM, None)
+            rejected = (await client.post(url, json=workload.next()[1], headers=headers)).status_code
+            await serving
+            await app.stop()
+            await bot_main.post_shutdown(app)
+            drained = time.perf_counter() - drain_started
+
+    ack = run.summarize(ack_latencies)
+    print(f"\n{args.updates} updates over {args.connections} connections")
+    print(f"acknowledged: {args.updates / acked:.0f} updates/s "
+          f"(p50 {ack['p50_ms']} ms, p95 {ack['p95_ms']} ms, p99 {ack['p99_ms']} ms), statuses {statuses}")
+    print(f"processed:    {args.updates / finished:.0f} updates/s ({finished:.2f} s until the last one was answered)")
+    if errors:
+        print(f"failed AI jobs: {dict(errors)}")
+    print(f"after SIGTERM: delivery answered {rejected}, drained in {drained:.2f} s")
+    print(f"peak RSS: {run.peak_rss_mb():.1f} MB")
+
+
+def main(argv=None):
+    parser = run.build_parser()
+    parser.description = __doc__
+    parser.add_argument("--connections", type=int, default=40,
+                        help="parallel deliveries, like WEBHOOK_MAX_CONNECTIONS")
+    parser.set_defaults(mix="text=70,task=10,list=10,search=10", warmup=0)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir, StandInProcess(run.stand_in_configs(args)) as stand_ins:
+        args.workdir = workdir
+        run.configure_environment(stand_ins.urls, args)
+        asyncio.run(main_async(args, stand_ins.urls))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    logging.disable(logging.INFO)
+    main()
@@ -1,108 +1,432 @@
 import os
 import base64
-from groq import Groq
+import time
+import asyncio
+from contextlib import asynccontextmanager, AsyncExitStack
 from dotenv import load_dotenv
+from bot.response_cache import response_cache, make_key, is_cacheable
+from bot.audio_chunks import split_ogg_opus, stitch_transcripts
+from bot.metrics import instrument, track
+from bot import resilience
+from bot.model_router import model_router, FAST_MODEL, VISION_MODEL, ROUTER_HEDGE_AFTER
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = None
+# Override to point the bot at a local stand-in server (load tests)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
+# Per-call timeout (seconds) and how many Groq calls may be in flight at once
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+# Max estimated tokens of history (summary included) sent with each prompt
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+# Part of the history budget that recalled memories may use
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "400"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "llama-3.1-8b-instant")
+# Long voice notes are transcribed in parallel chunks of this many seconds (0 = off)
+AUDIO_CHUNK_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", "120"))
+AUDIO_CHUNK_OVERLAP = float(os.getenv("AUDIO_CHUNK_OVERLAP", "2"))
 
-if GROQ_API_KEY:
-    client = Groq(api_key=GROQ_API_KEY)
+# The groq SDK (and the httpx/pydantic stack behind it) is imported on first
+# use, so starting the bot doesn't pay for it until a message needs the model
+_client = None
+_fallback_errors = None
 
-def _build_history_messages(history):
+_groq_slots = asyncio.Semaphore(GROQ_MAX_CONCURRENCY)
+
+def get_client():
+    """Return the shared AsyncGroq client, creating it on first use (None without an API key)."""
+    global _client
+    if _client is None and GROQ_API_KEY:
+        from groq import AsyncGroq
+        # Retries, deadlines and circuit breaking come from bot.resilience
+        _client = AsyncGroq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, timeout=GROQ_TIMEOUT, max_retries=0)
+    return _client
+
+def fallback_errors():
+    """Errors after which the next model in the chain is tried."""
+    global _fallback_errors
+    if _fallback_errors is None:
+        from groq import RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+        _fallback_errors = (
+            RateLimitError, APITimeoutError, APIConnectionError, InternalServerError, asyncio.TimeoutError,
+            resilience.CircuitOpenError,
+        )
+    return _fallback_errors
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token for Llama tokenizers)."""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+def _memory_message(memories, budget):
+    """System message quoting recalled past messages, within its own token budget."""
+    lines = []
+    for item in memories or []:
+        line = f"{item['role']}: {item['content']}"
+        cost = estimate_tokens(line)
+        if cost > budget:
+            continue
+        budget -= cost
+        lines.append(line)
+    if not lines:
+        return None
+    return {
+        "role": "system",
+        "content": "Earlier messages from this user that may be relevant:\n" + "\n".join(lines),
+    }
+
+def _build_history_messages(history, summary=None, budget=HISTORY_TOKEN_BUDGET, memories=None):
+    """
+    Fit the newest history messages (and the rolling summary and recalled
+    memories, if any) into the token budget. Older messages are dropped first.
+    """
     messages = []
-    if not history:
-        return messages
+    remaining = budget
 
-    for item in history:
+    if summary:
+        summary_message = {
+            "role": "system",
+            "content": f"Summary of the earlier conversation with this user:\n{summary}",
+        }
+        remaining -= estimate_tokens(summary_message["content"])
+
+    memory_message = _memory_message(memories, min(MEMORY_TOKEN_BUDGET, remaining))
+    if memory_message:
+        remaining -= estimate_tokens(memory_message["content"])
+
+    for item in reversed(history or []):
         role = item.get("role")
         content = item.get("content")
-        if role and content:
-            messages.append({"role": role, "content": content})
+        if not role or not content:
+            continue
+        cost = estimate_tokens(content)
+        if cost > remaining:
+            break
+        remaining -= cost
+        messages.append({"role": role, "content": content})
+
+    messages.reverse()
+    if memory_message:
+        messages.insert(0, memory_message)
+    if summary and remaining >= 0:
+        messages.insert(0, summary_message)
     return messages
 
-def get_gemini_response(prompt, image_parts=None, history=None):
+def _build_messages(prompt, image_parts=None, history=None, summary=None, preference="auto", memories=None):
+    """Return the (messages, models) pair for a chat completion request."""
+    messages = _build_history_messages(history, summary, memories=memories)
+
+    # Handle Image (Multimodal)
+    if image_parts:
+        image_data = image_parts[0]
+
+        if isinstance(image_data, (bytes, bytearray, memoryview)):
+            base64_image = base64.b64encode(image_data).decode('utf-8')
+            image_url = f"data:image/jpeg;base64,{base64_image}"
+        else:
+            from io import BytesIO
+            buffered = BytesIO()
+            image_data.save(buffered, format="JPEG")
+            base64_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
+            image_url = f"data:image/jpeg;base64,{base64_image}"
+
+        messages.append({
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_url
+                    }
+                }
+            ]
+        })
+        models = [VISION_MODEL]
+    else:
+        messages.append({
+            "role": "user",
+            "content": prompt
+        })
+        models = model_router.chain(model_router.classify(prompt, history, preference))
+
+    return messages, models
+
+def _cache_key(prompt, image_parts, model, history, summary):
+    """Response cache key for this request, or None if it must not be cached."""
+    if not is_cacheable(history, summary):
+        return None
+    context = b""
+    if image_parts:
+        image_data = image_parts[0]
+        context = image_data if isinstance(image_data, (bytes, bytearray, memoryview)) else image_data.tobytes()
+    return make_key("chat", prompt, model, context)
+
+def _completion_request(model, messages, stream=False):
+    return resilience.call(
+        "groq",
+        get_client().chat.completions.create,
+        key=model,
+        transient=fallback_errors(),
+        model=model,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=1024,
+        top_p=1,
+        stream=stream,
+        stop=None,
+    )
+
+async def _create_completion(model, messages):
+    """One chat completion call, recorded in the router's per-model stats."""
+    started = time.monotonic()
+    ok = False
+    try:
+        with track("groq_model", model):
+            async with _groq_slots:
+                completion = await _completion_request(model, messages)
+        ok = True
+        return completion
+    finally:
+        model_router.record(model, time.monotonic() - started, ok)
+
+@asynccontextmanager
+async def _open_stream(model, messages):
+    """
+    Streaming counterpart of _create_completion. The Groq slot is held and
+    the call timed until the block exits, i.e. until the stream is consumed.
+    """
+    started = time.monotonic()
+    ok = False
+    try:
+        with track("groq_model", model):
+            async with _groq_slots:
+                yield await _completion_request(model, messages, stream=True)
+        ok = True
+    finally:
+        model_router.record(model, time.monotonic() - started, ok)
+
+class _PrimaryFailed(Exception):
+    """The hedged primary failed before the hedge fired, so the secondary wasn't tried."""
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+async def _hedged_completion(messages, primary, secondary):
+    """
+    Call the primary model; if it hasn't answered after ROUTER_HEDGE_AFTER
+    seconds, also call the secondary and return whichever succeeds first.
+    """
+    first = asyncio.create_task(_create_completion(primary, messages))
+    done, _ = await asyncio.wait({first}, timeout=ROUTER_HEDGE_AFTER)
+    if done:
+        error = first.exception()
+        if isinstance(error, fallback_errors()):
+            raise _PrimaryFailed(error) from error
+        return first.result()
+
+    pending = {first, asyncio.create_task(_create_completion(secondary, messages))}
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return task.result()
+            error = task.exception()
+    raise error
+
+async def _complete_with_fallback(messages, models, hedge=False):
+    """Try each model in turn, moving on after rate-limit, timeout or server errors."""
+    error = None
+    index = 0
+    while index < len(models):
+        hedged = hedge and ROUTER_HEDGE_AFTER > 0 and index + 1 < len(models)
+        try:
+            if hedged:
+                return await _hedged_completion(messages, models[index], models[index + 1])
+            return await _create_completion(models[index], messages)
+        except _PrimaryFailed as e:
+            # Failed fast (e.g. 429 or open circuit): the next model hasn't been tried yet
+            error = e.error
+            index += 1
+        except fallback_errors() as e:
+            error = e
+            index += 2 if hedged else 1
+    raise error
+
+@instrument("groq")
+async def get_gemini_response(prompt, image_parts=None, history=None, summary=None, preference="auto", memories=None):
     """
-    Get response from Groq (Llama 3) with optional conversation history.
+    Get response from Groq (Llama 3) with optional conversation history and
+    rolling summary of older turns. The model is picked by the model router,
+    with fallback to the next model on rate-limit/timeout errors.
     Kept function name 'get_gemini_response' for compatibility, but uses Groq.
     """
-    if not client:
+    if not GROQ_API_KEY:
         return "⚠️ Groq API Key is missing. Please configure it in .env."
 
     try:
-        messages = _build_history_messages(history)
-
-        # Handle Image (Multimodal)
-        if image_parts:
-            image_data = image_parts[0]
-
-            if isinstance(image_data, bytes):
-                base64_image = base64.b64encode(image_data).decode('utf-8')
-                image_url = f"data:image/jpeg;base64,{base64_image}"
-            else:
-                from io import BytesIO
-                buffered = BytesIO()
-                image_data.save(buffered, format="JPEG")
-                base64_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
-                image_url = f"data:image/jpeg;base64,{base64_image}"
-
-            messages.append({
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": image_url
-                        }
-                    }
-                ]
-            })
-            model = "llama-3.2-11b-vision-preview"  # Vision model
-        else:
-            messages.append({
-                "role": "user",
-                "content": prompt
-            })
-            model = "llama-3.3-70b-versatile"  # Updated to latest supported model
-
-        completion = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1024,
-            top_p=1,
-            stream=False,
-            stop=None,
-        )
+        messages, models = _build_messages(prompt, image_parts, history, summary, preference, memories)
+
+        cache_key = _cache_key(prompt, image_parts, models[0], history or memories, summary)
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        started = time.monotonic()
+        # Hedge only on the fast tier, where a stalled request is the outlier
+        completion = await _complete_with_fallback(messages, models, hedge=models[0] == FAST_MODEL)
 
-        return completion.choices[0].message.content
+        response = completion.choices[0].message.content
+        if cache_key:
+            await response_cache.set(cache_key, response, time.monotonic() - started)
+        return response
+    except asyncio.TimeoutError:
+        return f"Error communicating with Groq AI: request timed out after {GROQ_TIMEOUT:g}s"
+    except resilience.CircuitOpenError:
+        return "⚠️ A IA está instável no momento. Tente novamente em instantes."
     except Exception as e:
         return f"Error communicating with Groq AI: {str(e)}"
 
-def analyze_image(image_data, prompt="Describe this image"):
+async def stream_gemini_response(prompt, image_parts=None, history=None, summary=None, preference="auto", memories=None):
+    """
+    Streaming variant of get_gemini_response: yields the reply in text chunks
+    as Groq produces them. Errors are yielded as a final chunk, so callers can
+    treat the concatenated chunks exactly like get_gemini_response's result.
+    Fallback to the next model only happens before the first chunk.
+    """
+    if not GROQ_API_KEY:
+        yield "⚠️ Groq API Key is missing. Please configure it in .env."
+        return
+
+    try:
+        messages, models = _build_messages(prompt, image_parts, history, summary, preference, memories)
+
+        cache_key = _cache_key(prompt, image_parts, models[0], history or memories, summary)
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        started = time.monotonic()
+        response = ""
+        async with AsyncExitStack() as stack:
+            for model in models:
+                try:
+                    stream = await stack.enter_async_context(_open_stream(model, messages))
+                    break
+                except fallback_errors():
+                    if model == models[-1]:
+                        raise
+
+            with track("groq", "stream_gemini_response"):
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=GROQ_TIMEOUT)
+                    except StopAsyncIteration:
+                        break
+                    if not chunk.choices:
+                        continue
+                    text = chunk.choices[0].delta.content
+                    if text:
+                        response += text
+                        yield text
+
+        if cache_key:
+            await response_cache.set(cache_key, response, time.monotonic() - started)
+    except asyncio.TimeoutError:
+        yield f"Error communicating with Groq AI: request timed out after {GROQ_TIMEOUT:g}s"
+    except resilience.CircuitOpenError:
+        yield "⚠️ A IA está instável no momento. Tente novamente em instantes."
+    except Exception as e:
+        yield f"Error communicating with Groq AI: {str(e)}"
+
+@instrument("groq")
+async def summarize_conversation(previous_summary, messages):
+    """
+    Fold older conversation messages into the user's rolling summary.
+    Returns the new summary, or None if it could not be generated.
+    """
+    if not GROQ_API_KEY or not messages:
+        return None
+
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        "Update the summary of this conversation. Keep facts, preferences, open "
+        "questions and tasks the user mentioned. Answer with the summary only, "
+        "at most 200 words, in the language of the conversation.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+
+    try:
+        async with _groq_slots:
+            completion = await resilience.call(
+                "groq",
+                get_client().chat.completions.create,
+                key=SUMMARY_MODEL,
+                transient=fallback_errors(),
+                model=SUMMARY_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.2,
+                max_tokens=400,
+            )
+        return completion.choices[0].message.content.strip() or None
+    except Exception:
+        return None
+
+async def analyze_image(image_data, prompt="Describe this image"):
     """
     Analyze an image using Groq.
     """
     # Pass image_data as a list to match the signature expected by get_gemini_response
-    return get_gemini_response(prompt, [image_data])
+    return await get_gemini_response(prompt, [image_data])
+
+@instrument("groq", "transcribe_chunk")
+async def _transcribe_bytes(audio_data, filename):
+    async with _groq_slots:
+        return await resilience.call(
+            "groq",
+            get_client().audio.transcriptions.create,
+            key="whisper-large-v3",
+            transient=fallback_errors(),
+            file=(filename, audio_data),
+            model="whisper-large-v3",
+            response_format="text",
+        )
 
-def transcribe_audio(audio_file_path):
+@instrument("groq")
+async def transcribe_audio(audio_data, filename="voice.ogg"):
     """
-    Transcribe audio using Groq Whisper.
+    Transcribe audio bytes using Groq Whisper.
+
+    Ogg/Opus audio longer than AUDIO_CHUNK_SECONDS is split into overlapping
+    chunks that are transcribed concurrently and stitched back together.
     """
-    if not client:
+    if not GROQ_API_KEY:
         return "⚠️ Groq API Key is missing."
 
     try:
-        with open(audio_file_path, "rb") as file:
-            transcription = client.audio.transcriptions.create(
-                file=(os.path.basename(audio_file_path), file.read()),
-                model="whisper-large-v3",
-                response_format="text"
+        chunks = [audio_data]
+        if AUDIO_CHUNK_SECONDS > 0:
+            chunks = await asyncio.to_thread(
+                split_ogg_opus, audio_data, AUDIO_CHUNK_SECONDS, AUDIO_CHUNK_OVERLAP
             )
-        return transcription
+
+        if len(chunks) == 1:
+            return await _transcribe_bytes(chunks[0], filename)
+
+        texts = await asyncio.gather(*(_transcribe_bytes(chunk, filename) for chunk in chunks))
+        return stitch_transcripts(texts)
+    except asyncio.TimeoutError:
+        return f"Error transcribing audio: request timed out after {GROQ_TIMEOUT:g}s"
     except Exception as e:
         return f"Error transcribing audio: {str(e)}"
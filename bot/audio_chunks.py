@@ -0,0 +1,158 @@
+"""
+ffmpeg-free splitting of Ogg/Opus audio (Telegram voice notes) into
+overlapping chunks that can be transcribed in parallel, and stitching of the
+resulting transcripts.
+
+Chunks are cut on Ogg page boundaries: each one repeats the stream's header
+pages (OpusHead/OpusTags) followed by a run of audio pages, with page sequence
+numbers and checksums rewritten so every chunk is a valid standalone file.
+"""
+import re
+import struct
+
+OPUS_SAMPLE_RATE = 48000
+_CONTINUED = 0x01
+_BOS = 0x02
+_EOS = 0x04
+
+
+def _crc_table():
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = ((r << 1) ^ 0x04C11DB7) if r & 0x80000000 else (r << 1)
+        table.append(r & 0xFFFFFFFF)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def _ogg_crc(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC_TABLE[((crc >> 24) & 0xFF) ^ byte]
+    return crc
+
+
+def _parse_pages(data):
+    """Return a list of (flags, granule, page bytes), or None if data isn't Ogg."""
+    pages = []
+    offset = 0
+    view = memoryview(data)
+    while offset < len(data):
+        if len(data) - offset < 27 or bytes(view[offset:offset + 4]) != b"OggS":
+            return None
+        n_segments = data[offset + 26]
+        body_len = sum(view[offset + 27:offset + 27 + n_segments])
+        end = offset + 27 + n_segments + body_len
+        if end > len(data):
+            return None
+        flags = data[offset + 5]
+        granule = struct.unpack_from("<q", data, offset + 6)[0]
+        pages.append((flags, granule, view[offset:end]))
+        offset = end
+    return pages
+
+
+def _rewrite_page(page, sequence, flags):
+    """Copy a page with a new sequence number and flags, fixing its CRC."""
+    out = bytearray(page)
+    out[5] = flags
+    struct.pack_into("<I", out, 18, sequence)
+    struct.pack_into("<I", out, 22, 0)
+    struct.pack_into("<I", out, 22, _ogg_crc(out))
+    return out
+
+
+def split_ogg_opus(data, chunk_seconds, overlap_seconds):
+    """
+    Split an Ogg/Opus stream into chunks of about chunk_seconds, each starting
+    overlap_seconds before the previous one ended. Returns [data] unchanged if
+    the stream isn't Ogg/Opus or is short enough to send whole.
+    """
+    pages = _parse_pages(data)
+    if not pages or bytes(pages[0][2][28:36]) != b"OpusHead":
+        return [data]
+
+    header_count = 0
+    while header_count < len(pages) and pages[header_count][1] == 0:
+        header_count += 1
+    headers = pages[:header_count]
+    audio = pages[header_count:]
+
+    # End time of each audio page; -1 granule means no packet ends on it
+    times = []
+    last = 0.0
+    for _, granule, _ in audio:
+        if granule > 0:
+            last = granule / OPUS_SAMPLE_RATE
+        times.append(last)
+
+    if not audio or times[-1] <= chunk_seconds:
+        return [data]
+
+    ranges = []
+    start = 0
+    while start < len(audio):
+        chunk_start_time = times[start - 1] if start else 0.0
+        end = start
+        while end < len(audio) - 1 and times[end] < chunk_start_time + chunk_seconds:
+            end += 1
+        # Don't cut inside a packet: extend until the next page starts a fresh one
+        while end < len(audio) - 1 and audio[end + 1][0] & _CONTINUED:
+            end += 1
+        ranges.append((start, end))
+        if end == len(audio) - 1:
+            break
+
+        next_start = end + 1
+        overlap_from = times[end] - overlap_seconds
+        while next_start - 1 > start and times[next_start - 2] >= overlap_from:
+            next_start -= 1
+        while next_start <= end and audio[next_start][0] & _CONTINUED:
+            next_start += 1
+        start = next_start
+
+    chunks = []
+    for start, end in ranges:
+        out = bytearray()
+        sequence = 0
+        for flags, _, page in headers:
+            out += _rewrite_page(page, sequence, flags)
+            sequence += 1
+        for index in range(start, end + 1):
+            flags = audio[index][0] & ~(_BOS | _EOS)
+            if index == end:
+                flags |= _EOS
+            out += _rewrite_page(audio[index][2], sequence, flags)
+            sequence += 1
+        chunks.append(bytes(out))
+    return chunks
+
+
+_word = re.compile(r"\w+")
+
+
+def _norm(word):
+    return "".join(_word.findall(word.lower()))
+
+
+def stitch_transcripts(texts, max_overlap_words=30):
+    """
+    Join chunk transcripts, dropping words repeated at each boundary because
+    of the audio overlap (longest suffix of one chunk matching the next
+    chunk's prefix).
+    """
+    words = []
+    for text in texts:
+        new_words = text.split()
+        limit = min(max_overlap_words, len(words), len(new_words))
+        overlap = 0
+        for size in range(limit, 0, -1):
+            if [_norm(w) for w in words[-size:]] == [_norm(w) for w in new_words[:size]]:
+                overlap = size
+                break
+        words.extend(new_words[overlap:])
+    return " ".join(words)
@@ -0,0 +1,223 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from bot.db import (
+    run_db,
+    get_conversation_history,
+    log_conversation_rows,
+    get_conversation_summary,
+    save_conversation_summary,
+)
+from bot.ai_service import estimate_tokens, summarize_conversation
+from bot.memory import semantic_memory
+from bot.sharding import is_primary
+
+logger = logging.getLogger(__name__)
+
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "20"))
+CACHE_MAX_USERS = int(os.getenv("CONVERSATION_CACHE_MAX_USERS", "1000"))
+CACHE_TTL = float(os.getenv("CONVERSATION_CACHE_TTL", "1800"))
+FLUSH_INTERVAL = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "2"))
+# Estimated tokens of messages pushed out of the window before they are
+# folded into the user's rolling summary
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "1500"))
+
+
+class ConversationCache:
+    """
+    Keeps the last HISTORY_WINDOW messages per user in memory and writes new
+    messages to SQLite in batches from a background task.
+
+    Windows are evicted least-recently-used once more than max_users are
+    cached, or when untouched for longer than ttl seconds. Pending writes are
+    kept separately, so evicting a window never loses unflushed messages.
+
+    Messages pushed out of a full window are collected and, once they reach
+    summary_trigger_tokens, compacted into the user's rolling summary.
+    """
+
+    def __init__(self, window=HISTORY_WINDOW, max_users=CACHE_MAX_USERS, ttl=CACHE_TTL,
+                 flush_interval=FLUSH_INTERVAL, summary_trigger_tokens=SUMMARY_TRIGGER_TOKENS):
+        self.window = window
+        self.max_users = max_users
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.summary_trigger_tokens = summary_trigger_tokens
+
+        self._windows = OrderedDict()  # user_id -> (deque of messages, last access)
+        self._pending = []  # (user_id, role, content, created_at, enqueued monotonic time)
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._summaries = {}  # user_id -> rolling summary (None if none stored)
+        self._overflow = {}  # user_id -> messages pushed out of the window
+        self._compacting = set()
+        self._compactions = set()  # running _compact tasks, awaited by stop()
+
+        self.hits = 0
+        self.misses = 0
+        self.flushed_rows = 0
+        self.last_flush_lag = 0.0
+
+    async def get_history(self, user_id: int):
+        """Return the user's recent messages in chronological order."""
+        entry = self._windows.get(user_id)
+        now = time.monotonic()
+        if entry is not None and now - entry[1] <= self.ttl:
+            self.hits += 1
+            self._windows[user_id] = (entry[0], now)
+            self._windows.move_to_end(user_id)
+            return list(entry[0])
+
+        self.misses += 1
+        # Hold the flush lock so a batch is never half-way between the
+        # pending list and the database while we read both
+        async with self._flush_lock:
+            history = await run_db(get_conversation_history, user_id, self.window)
+            # Messages still waiting for a flush are newer than anything in the DB
+            history += [
+                {"role": role, "content": content}
+                for uid, role, content, _, _ in self._pending
+                if uid == user_id
+            ]
+        messages = deque(history, maxlen=self.window)
+        self._store(user_id, messages, now)
+        return list(messages)
+
+    async def get_summary(self, user_id: int):
+        """Return the user's rolling summary of older turns, or None."""
+        if user_id not in self._summaries:
+            self._summaries[user_id] = await run_db(get_conversation_summary, user_id)
+        return self._summaries[user_id]
+
+    def append(self, user_id: int, role: str, content: str):
+        """Record a message in the user's window and queue it for persistence."""
+        entry = self._windows.get(user_id)
+        if entry is not None:
+            messages = entry[0]
+            if len(messages) == messages.maxlen:
+                self._overflow.setdefault(user_id, []).append(messages[0])
+            messages.append({"role": role, "content": content})
+            self._maybe_compact(user_id)
+        self._pending.append(
+            (user_id, role, content, datetime.utcnow().isoformat(), time.monotonic())
+        )
+
+    def _maybe_compact(self, user_id):
+        overflow = self._overflow.get(user_id)
+        if not overflow or user_id in self._compacting:
+            return
+        if sum(estimate_tokens(m["content"]) for m in overflow) < self.summary_trigger_tokens:
+            return
+        self._compacting.add(user_id)
+        task = asyncio.create_task(self._compact(user_id))
+        self._compactions.add(task)
+        task.add_done_callback(self._compactions.discard)
+
+    async def _compact(self, user_id):
+        try:
+            batch = self._overflow.pop(user_id, [])
+            previous = await self.get_summary(user_id)
+            summary = await summarize_conversation(previous, batch)
+            if summary is None:
+                # Keep the messages so the next trigger retries them
+                self._overflow.setdefault(user_id, [])[:0] = batch
+                return
+            self._summaries[user_id] = summary
+            await run_db(save_conversation_summary, user_id, summary)
+        except Exception as e:
+            logger.error(f"Conversation compaction failed for {user_id}: {e}")
+        finally:
+            self._compacting.discard(user_id)
+
+    def _store(self, user_id, messages, now):
+        self._windows[user_id] = (messages, now)
+        self._windows.move_to_end(user_id)
+        while len(self._windows) > self.max_users:
+            self._forget(self._windows.popitem(last=False)[0])
+
+    def _forget(self, user_id):
+        self._summaries.pop(user_id, None)
+        if user_id not in self._compacting:
+            self._overflow.pop(user_id, None)
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        while self._windows:
+            user_id, (_, last_access) = next(iter(self._windows.items()))
+            if now - last_access <= self.ttl:
+                break
+            del self._windows[user_id]
+            self._forget(user_id)
+
+    async def flush(self):
+        """Write all pending messages to the database in one transaction."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                rows = [row[:4] for row in batch]
+                await run_db(
+                    log_conversation_rows, rows, semantic_memory.terms_for(rows), watermark=semantic_memory.backfilled
+                )
+            except Exception:
+                # Put the batch back in front so ordering is preserved on retry
+                self._pending = batch + self._pending
+                raise
+            self.flushed_rows += len(batch)
+            self.last_flush_lag = time.monotonic() - batch[0][4]
+
+    async def _flush_loop(self):
+        if is_primary():
+            # Flushes index their own rows; this catches up on rows stored without postings
+            try:
+                await semantic_memory.backfill()
+            except Exception as e:
+                logger.error(f"Semantic memory backfill failed: {e}")
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._evict_expired()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Conversation flush failed: {e}")
+
+    def start(self):
+        """Start the background flush task on the running event loop."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """
+        Stop the background task, let running compactions save their
+        summaries, and flush everything still pending.
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._compactions:
+            await asyncio.gather(*self._compactions, return_exceptions=True)
+        await self.flush()
+
+    def stats(self):
+        pending_lag = time.monotonic() - self._pending[0][4] if self._pending else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_users": len(self._windows),
+            "pending": len(self._pending),
+            "pending_lag": pending_lag,
+            "flushed_rows": self.flushed_rows,
+            "last_flush_lag": self.last_flush_lag,
+        }
+
+
+conversation_cache = ConversationCache()
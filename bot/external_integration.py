@@ -1,6 +1,7 @@
 import os
-import requests
 import logging
+from bot.http_client import request
+from bot.metrics import instrument
 
 logger = logging.getLogger(__name__)
 
@@ -11,12 +12,11 @@ BASE_URL = "https://pro.raizeletrica.com.br"
 
 class ExternalAppClient:
     def __init__(self):
-        self.session = requests.Session()
         self.username = os.getenv("APP_USERNAME")
         self.password = os.getenv("APP_PASSWORD")
         self.token = None
 
-    def login(self):
+    async def login(self):
         """
         Attempt to login to the external app.
         """
@@ -26,7 +26,7 @@ class ExternalAppClient:
         login_url = f"{BASE_URL}/api/auth/login" # Hypothetical endpoint
         try:
             payload = {"email": self.username, "password": self.password}
-            # response = self.session.post(login_url, json=payload)
+            # response = await request("POST", login_url, json=payload)
             # response.raise_for_status()
             # self.token = response.json().get("token")
             
@@ -37,16 +37,17 @@ class ExternalAppClient:
             logger.error(f"Login failed: {e}")
             return False, str(e)
 
-    def get_dashboard_data(self):
+    @instrument("external_app")
+    async def get_dashboard_data(self):
         """
         Fetch some data from the dashboard.
         """
         if not self.token:
-            if not self.login():
+            if not await self.login():
                 return "Not authenticated."
 
         # data_url = f"{BASE_URL}/api/dashboard"
-        # response = self.session.get(data_url, headers={"Authorization": f"Bearer {self.token}"})
+        # response = await request("GET", data_url, headers={"Authorization": f"Bearer {self.token}"})
         # return response.json()
         
         return {"status": "Active", "pending_orders": 5, "alerts": 2}
@@ -1,20 +1,100 @@
 import os
-from datetime import datetime, timezone
+import time
+import asyncio
+import logging
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict
 
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from bot.metrics import instrument
+from bot import resilience
+from bot.db import (
+    run_db,
+    get_sync_token,
+    apply_drive_changes,
+    apply_calendar_changes,
+    search_drive_files,
+    search_calendar_events,
+)
 
 GOOGLE_SERVICE_ACCOUNT_FILE = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE")
 GOOGLE_DELEGATED_USER = os.getenv("GOOGLE_DELEGATED_USER")
+# Override to point all Google API clients at a local stand-in server (load tests);
+# the token endpoint comes from token_uri in the service account JSON
+GOOGLE_API_ENDPOINT = os.getenv("GOOGLE_API_ENDPOINT")
+# Socket timeout (seconds) for each Google API HTTP request
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "20"))
 
 GMAIL_SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
 DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.metadata.readonly"]
 CALENDAR_SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
 DOCS_SCOPES = ["https://www.googleapis.com/auth/documents.readonly"]
 
+GMAIL_MAX_RESULTS = int(os.getenv("GMAIL_MAX_RESULTS", "5"))
+# Calls per Gmail batch request: Gmail accepts 100, but parts beyond ~50 tend to fail with 429
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+# Pause before batch parts that failed with 429/5xx are retried, once, in a new batch
+GMAIL_BATCH_RETRY_DELAY = float(os.getenv("GMAIL_BATCH_RETRY_DELAY", "1"))
+
+# Background mirror of Drive/Calendar (0 disables it and /drive, /calendar go live)
+GOOGLE_SYNC_INTERVAL = float(os.getenv("GOOGLE_SYNC_INTERVAL", "300"))
+# How far back the initial Calendar sync reaches
+CALENDAR_SYNC_PAST_DAYS = int(os.getenv("CALENDAR_SYNC_PAST_DAYS", "30"))
+DRIVE_FILE_FIELDS = "id, name, mimeType, modifiedTime, trashed"
+
+logger = logging.getLogger(__name__)
+
+# Credentials are shared (google-auth refreshes the token when it expires);
+# built services hold an httplib2 connection, which is not thread-safe, so
+# each worker thread keeps its own and reuses it across commands.
+_credentials_cache: Dict[tuple, object] = {}
+_credentials_lock = threading.Lock()
+_local = threading.local()
+_google_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("GOOGLE_MAX_WORKERS", "4")), thread_name_prefix="bot-google"
+)
+
+
+async def _run_in_thread(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_google_executor, lambda: ctx.run(func, *args, **kwargs))
+
+
+async def run_google(func, *args, **kwargs):
+    """
+    Run a blocking Google API function on the Google worker threads, under
+    the "google" resilience policy (deadline, retry, circuit breaker).
+    """
+    return await resilience.call("google", _run_in_thread, func, *args, **kwargs)
+
+
+@contextmanager
+def _timed(api: str, stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        logger.debug(f"google {api} {stage}: {(time.perf_counter() - started) * 1000:.1f}ms")
+
 
 def _get_credentials(scopes: List[str]):
+    key = tuple(scopes)
+    with _credentials_lock:
+        credentials = _credentials_cache.get(key)
+        if credentials is None:
+            credentials = _credentials_cache[key] = _load_credentials(scopes)
+    return credentials
+
+
+def _load_credentials(scopes: List[str]):
+    # google-auth and googleapiclient are imported on first use: they are the
+    # slowest part of importing the bot and most chats never touch Google
+    from google.oauth2 import service_account
+
     json_creds = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
 
     if json_creds:
@@ -39,22 +119,96 @@ def _get_credentials(scopes: List[str]):
     return credentials
 
 
-def list_recent_emails(query: str | None = None, max_results: int = 5) -> str:
+def _get_service(api: str, version: str, scopes: List[str]):
+    """Return this thread's client for the API, building it on first use."""
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = {}
+
+    service = services.get((api, version))
+    if service is None:
+        with _timed(api, "creds"):
+            credentials = _get_credentials(scopes)
+        with _timed(api, "build"):
+            import httplib2
+            import google_auth_httplib2
+            from googleapiclient.discovery import build
+            # A socket timeout frees the worker thread: the caller's deadline can't interrupt it
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+            # Bundled discovery documents: no network fetch or disk cache
+            client_options = {"api_endpoint": GOOGLE_API_ENDPOINT} if GOOGLE_API_ENDPOINT else None
+            service = build(api, version, http=http, client_options=client_options,
+                            cache_discovery=False, static_discovery=True)
+        services[(api, version)] = service
+    return service
+
+
+def _new_batch(service, callback):
+    if GOOGLE_API_ENDPOINT:
+        # new_batch_http_request ignores api_endpoint and would post to gmail.googleapis.com
+        from googleapiclient.http import BatchHttpRequest
+        return BatchHttpRequest(callback=callback, batch_uri=f"{GOOGLE_API_ENDPOINT}/batch/gmail/v1")
+    return service.new_batch_http_request(callback=callback)
+
+
+def _fetch_email_metadata(service, message_ids: List[str]) -> List[Dict]:
+    """
+    Fetch metadata for all messages using batch requests (one round trip per
+    GMAIL_BATCH_SIZE). Parts that fail with a transient error are retried
+    once in a new batch; whatever still fails is logged and skipped.
+    """
+    details: Dict[str, Dict] = {}
+    failed: Dict[str, Exception] = {}
+
+    def _collect(request_id, response, exception):
+        if exception is None:
+            details[request_id] = response
+            failed.pop(request_id, None)
+        else:
+            failed[request_id] = exception
+
+    pending = list(message_ids)
+    for attempt in range(2):
+        for start in range(0, len(pending), GMAIL_BATCH_SIZE):
+            batch = _new_batch(service, _collect)
+            for message_id in pending[start:start + GMAIL_BATCH_SIZE]:
+                batch.add(
+                    service.users().messages().get(userId="me", id=message_id, format="metadata",
+                                                   metadataHeaders=["From", "Subject", "Date"]),
+                    request_id=message_id,
+                )
+            batch.execute()
+        pending = [message_id for message_id, e in failed.items() if resilience.is_transient(e)]
+        if attempt or not pending:
+            break
+        logger.info(f"gmail batch: retrying {len(pending)} of {len(message_ids)} messages")
+        time.sleep(GMAIL_BATCH_RETRY_DELAY)
+
+    if failed:
+        logger.warning(
+            f"gmail batch: {len(failed)} of {len(message_ids)} messages failed to load "
+            f"(e.g. {next(iter(failed.values()))})"
+        )
+    # Keep the list order (newest first); skip messages that failed to load
+    return [details[message_id] for message_id in message_ids if message_id in details]
+
+
+@instrument("google")
+def list_recent_emails(query: str | None = None, max_results: int = GMAIL_MAX_RESULTS) -> str:
     """Fetch the most recent emails from Gmail."""
-    credentials = _get_credentials(GMAIL_SCOPES)
-    service = build("gmail", "v1", credentials=credentials)
+    service = _get_service("gmail", "v1", GMAIL_SCOPES)
 
-    request = service.users().messages().list(userId="me", q=query or "", maxResults=max_results)
-    response = request.execute()
-    messages = response.get("messages", [])
+    with _timed("gmail", "request"):
+        request = service.users().messages().list(userId="me", q=query or "", maxResults=max_results)
+        response = request.execute()
+        messages = response.get("messages", [])
+        details = _fetch_email_metadata(service, [message["id"] for message in messages])
 
     if not messages:
         return "Nenhum e-mail encontrado."
 
     formatted = "*E-mails recentes:*\n"
-    for message in messages:
-        msg_detail = service.users().messages().get(userId="me", id=message["id"], format="metadata",
-                                                   metadataHeaders=["From", "Subject", "Date"]).execute()
+    for msg_detail in details:
         headers = {h["name"]: h["value"] for h in msg_detail.get("payload", {}).get("headers", [])}
         formatted += f"• *Assunto:* {headers.get('Subject', 'Sem assunto')}\n"
         formatted += f"  *De:* {headers.get('From', 'Desconhecido')}\n"
@@ -63,11 +217,12 @@ def list_recent_emails(query: str | None = None, max_results: int = 5) -> str:
     return formatted
 
 
+@instrument("google")
 def list_drive_files(page_size: int = 5) -> str:
-    credentials = _get_credentials(DRIVE_SCOPES)
-    service = build("drive", "v3", credentials=credentials)
+    service = _get_service("drive", "v3", DRIVE_SCOPES)
 
-    results = service.files().list(pageSize=page_size, fields="files(id, name, mimeType, modifiedTime)").execute()
+    with _timed("drive", "request"):
+        results = service.files().list(pageSize=page_size, fields="files(id, name, mimeType, modifiedTime)").execute()
     items = results.get("files", [])
 
     if not items:
@@ -81,22 +236,23 @@ def list_drive_files(page_size: int = 5) -> str:
     return formatted
 
 
+@instrument("google")
 def list_upcoming_events(max_results: int = 5) -> str:
-    credentials = _get_credentials(CALENDAR_SCOPES)
-    service = build("calendar", "v3", credentials=credentials)
+    service = _get_service("calendar", "v3", CALENDAR_SCOPES)
 
     now = datetime.now(timezone.utc).isoformat()
-    events_result = (
-        service.events()
-        .list(
-            calendarId="primary",
-            timeMin=now,
-            maxResults=max_results,
-            singleEvents=True,
-            orderBy="startTime",
+    with _timed("calendar", "request"):
+        events_result = (
+            service.events()
+            .list(
+                calendarId="primary",
+                timeMin=now,
+                maxResults=max_results,
+                singleEvents=True,
+                orderBy="startTime",
+            )
+            .execute()
         )
-        .execute()
-    )
     events = events_result.get("items", [])
 
     if not events:
@@ -111,11 +267,12 @@ def list_upcoming_events(max_results: int = 5) -> str:
     return formatted
 
 
+@instrument("google")
 def get_document_metadata(document_id: str) -> str:
-    credentials = _get_credentials(DOCS_SCOPES)
-    service = build("docs", "v1", credentials=credentials)
+    service = _get_service("docs", "v1", DOCS_SCOPES)
 
-    doc = service.documents().get(documentId=document_id).execute()
+    with _timed("docs", "request"):
+        doc = service.documents().get(documentId=document_id).execute()
     title = doc.get("title", "Sem título")
 
     content_elements: List[Dict] = doc.get("body", {}).get("content", [])
@@ -133,3 +290,214 @@ def get_document_metadata(document_id: str) -> str:
     formatted_preview = preview if preview else "Pré-visualização não disponível."
 
     return f"*Documento:* {title}\n\n{formatted_preview}"
+
+
+def _drive_row(item: Dict):
+    return (item["id"], item.get("name", ""), item.get("mimeType"), item.get("modifiedTime"))
+
+
+@instrument("google")
+def fetch_drive_changes(token: str | None):
+    """
+    Fetch what changed in Drive since the page token. Without a token, list
+    every file and take a fresh start page token. Returns (upserts, removed
+    ids, next token, full); the caller applies them with apply_drive_changes.
+    """
+    service = _get_service("drive", "v3", DRIVE_SCOPES)
+
+    upserts: List[tuple] = []
+    removed: List[str] = []
+    with _timed("drive", "sync"):
+        if token is None:
+            # Take the token first so changes made during the listing aren't lost
+            token = service.changes().getStartPageToken().execute()["startPageToken"]
+            page_token = None
+            while True:
+                result = service.files().list(
+                    pageSize=1000, pageToken=page_token, q="trashed = false",
+                    fields=f"nextPageToken, files({DRIVE_FILE_FIELDS})",
+                ).execute()
+                upserts.extend(_drive_row(item) for item in result.get("files", []))
+                page_token = result.get("nextPageToken")
+                if not page_token:
+                    break
+            return upserts, removed, token, True
+
+        page_token = token
+        while True:
+            result = service.changes().list(
+                pageToken=page_token, pageSize=1000, spaces="drive",
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({DRIVE_FILE_FIELDS}))",
+            ).execute()
+            for change in result.get("changes", []):
+                item = change.get("file")
+                if change.get("removed") or not item or item.get("trashed"):
+                    removed.append(change["fileId"])
+                else:
+                    upserts.append(_drive_row(item))
+            if "newStartPageToken" in result:
+                token = result["newStartPageToken"]
+                break
+            page_token = result["nextPageToken"]
+
+    return upserts, removed, token, False
+
+
+def _event_time_utc(value: Dict) -> str | None:
+    if value.get("dateTime"):
+        parsed = datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+        return parsed.astimezone(timezone.utc).replace(tzinfo=None).isoformat(timespec="seconds")
+    if value.get("date"):
+        return f"{value['date']}T00:00:00"
+    return None
+
+
+@instrument("google")
+def fetch_calendar_changes(token: str | None):
+    """
+    Fetch Calendar changes since the sync token, or every event from
+    CALENDAR_SYNC_PAST_DAYS ago onwards without one or when Google has
+    expired it (HTTP 410). Returns (upserts, removed ids, next token, full).
+    """
+    from googleapiclient.errors import HttpError
+
+    service = _get_service("calendar", "v3", CALENDAR_SCOPES)
+
+    upserts: List[tuple] = []
+    removed: List[str] = []
+    params = {"calendarId": "primary", "singleEvents": True, "maxResults": 2500}
+    if token:
+        params["syncToken"] = token
+    else:
+        since = datetime.now(timezone.utc) - timedelta(days=CALENDAR_SYNC_PAST_DAYS)
+        params["timeMin"] = since.isoformat()
+
+    with _timed("calendar", "sync"):
+        page_token = None
+        while True:
+            try:
+                result = service.events().list(pageToken=page_token, **params).execute()
+            except HttpError as e:
+                if token and e.resp.status == 410:
+                    return fetch_calendar_changes(None)
+                raise
+            for event in result.get("items", []):
+                if event.get("status") == "cancelled":
+                    removed.append(event["id"])
+                    continue
+                start = event.get("start", {})
+                upserts.append((
+                    event["id"],
+                    event.get("summary", "(Sem título)"),
+                    start.get("dateTime") or start.get("date"),
+                    _event_time_utc(start),
+                    _event_time_utc(event.get("end", {})),
+                ))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                token = result.get("nextSyncToken")
+                break
+
+    return upserts, removed, token, "syncToken" not in params
+
+
+async def sync_drive() -> int:
+    """
+    Bring the local Drive mirror up to date. The first run lists every file
+    and records a start page token; later runs only fetch changes.list deltas.
+    Google is called on the Google threads and the mirror is written on the
+    DB thread. Returns the number of files added, updated or removed.
+    """
+    token = await run_db(get_sync_token, "drive")
+    upserts, removed, token, full = await _run_in_thread(fetch_drive_changes, token)
+    await run_db(apply_drive_changes, upserts, removed, token, full=full)
+    return len(upserts) + len(removed)
+
+
+async def sync_calendar() -> int:
+    """
+    Bring the local Calendar mirror up to date using syncToken incremental
+    sync; a full resync replaces the mirror. Returns the number of events
+    added, updated or removed.
+    """
+    token = await run_db(get_sync_token, "calendar")
+    upserts, removed, token, full = await _run_in_thread(fetch_calendar_changes, token)
+    await run_db(apply_calendar_changes, upserts, removed, token, full=full)
+    return len(upserts) + len(removed)
+
+
+async def sync_all():
+    """Run both syncs, logging (not raising) failures so one can't block the other."""
+    for name, sync in (("drive", sync_drive), ("calendar", sync_calendar)):
+        try:
+            changed = await sync()
+            logger.info(f"google {name} sync: {changed} changes")
+        except Exception as e:
+            logger.error(f"google {name} sync failed: {e}")
+
+
+def warm_up():
+    """Load the Google client libraries and credentials before the first command needs them."""
+    for scopes in (GMAIL_SCOPES, DRIVE_SCOPES, CALENDAR_SCOPES, DOCS_SCOPES):
+        _get_credentials(scopes)
+    from googleapiclient.discovery import build  # noqa: F401
+
+
+def google_configured() -> bool:
+    return bool(os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON") or GOOGLE_SERVICE_ACCOUNT_FILE)
+
+
+async def sync_job(context):
+    """JobQueue callback for the periodic Drive/Calendar sync."""
+    # No deadline: a full resync can legitimately take minutes
+    await sync_all()
+
+
+def _drive_from_mirror(query, limit):
+    if get_sync_token("drive") is None:
+        return None
+    items = search_drive_files(query, limit)
+    if not items:
+        return "Nenhum arquivo encontrado no Drive."
+
+    formatted = "*Arquivos no Drive:*\n" if query else "*Arquivos recentes no Drive:*\n"
+    for name, mime_type, modified in items:
+        formatted += f"• {name} ({mime_type}) — Atualizado em {modified or 'Desconhecido'}\n"
+    return formatted
+
+
+async def search_drive(query: str | None = None, limit: int = 10) -> str:
+    """
+    Answer /drive from the local mirror, which keeps working while Google is
+    unreachable; falls back to the live API before the first sync.
+    """
+    result = await run_db(_drive_from_mirror, query, limit)
+    if result is not None:
+        return result
+    if query and GOOGLE_SYNC_INTERVAL > 0:
+        return "⏳ Sincronizando o Drive, tente novamente em instantes."
+    return await run_google(list_drive_files, page_size=limit)
+
+
+def _calendar_from_mirror(query, limit):
+    if get_sync_token("calendar") is None:
+        return None
+    now = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(timespec="seconds")
+    events = search_calendar_events(now, query, limit)
+    if not events:
+        return "Nenhum evento futuro encontrado."
+
+    formatted = "*Próximos eventos:*\n"
+    for summary, start in events:
+        formatted += f"• {summary} — {start}\n"
+    return formatted
+
+
+async def search_calendar(query: str | None = None, limit: int = 10) -> str:
+    """Answer /calendar from the local mirror, falling back to the live API before the first sync."""
+    result = await run_db(_calendar_from_mirror, query, limit)
+    if result is not None:
+        return result
+    if query and GOOGLE_SYNC_INTERVAL > 0:
+        return "⏳ Sincronizando o Calendar, tente novamente em instantes."
+    return await run_google(list_upcoming_events, max_results=limit)
@@ -1,37 +1,171 @@
 import os
-from telegram import Update
+import time
+import asyncio
+import logging
+from datetime import timedelta
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from telegram.ext import ContextTypes
-from bot.ai_service import get_gemini_response, analyze_image, transcribe_audio
-from bot.db import add_task, get_tasks, complete_task, log_conversation, get_conversation_history
-from bot.web_search import google_search
+from telegram.helpers import escape_markdown
+from bot.ai_service import (
+    get_gemini_response,
+    stream_gemini_response,
+    analyze_image,
+    transcribe_audio,
+)
+from bot.db import (
+    run_db,
+    set_model_preference,
+    add_task,
+    get_tasks_page,
+    count_tasks,
+    complete_task,
+)
+from bot.conversation_cache import conversation_cache
+from bot.memory import semantic_memory
+from bot.image_pipeline import choose_photo_size, prepare_image
+from bot.scheduler import ai_scheduler, SchedulerBusy
+from bot.metrics import instrument_handler, AI_TIME_TO_FIRST_TOKEN, AI_TIME_TO_COMPLETE
+from bot.model_router import model_router, TIERS
+from bot.reminders import reminder_engine, parse_due_date, format_due
+from bot.web_search import cached_google_search
+from bot.response_cache import response_cache
 from bot.external_integration import external_client
+from bot import resilience
 from bot.google_services import (
+    run_google,
     list_recent_emails,
-    list_drive_files,
-    list_upcoming_events,
+    search_drive,
+    search_calendar,
     get_document_metadata,
 )
 
+logger = logging.getLogger(__name__)
+
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") == "1"
+# Minimum seconds between edits of a streamed message (Telegram allows ~1/s per chat)
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+async def _deliver(update: Update, text, edit=None):
+    """
+    Send part of a finished reply, by editing the streamed message (`edit`)
+    or as a new message. A RetryAfter is honoured once; an edit that still
+    fails falls back to a new message. Remaining errors are only logged, so
+    the caller still returns the reply and it is kept in the conversation.
+    """
+    attempts = [edit, update.message.reply_text] if edit else [update.message.reply_text]
+    for send in attempts:
+        retried = False
+        while True:
+            try:
+                await send(text)
+                return True
+            except RetryAfter as e:
+                if retried:
+                    logger.warning(f"Reply still rate limited after retrying: {e}")
+                    break
+                retried = True
+                delay = e.retry_after
+                await asyncio.sleep(delay.total_seconds() if isinstance(delay, timedelta) else delay)
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    return True
+                logger.warning(f"Failed to deliver reply: {e}")
+                break
+            except TelegramError as e:
+                logger.warning(f"Failed to deliver reply: {e}")
+                break
+    return False
+
+async def _reply_with_ai(update: Update, prompt, history=None, summary=None, preference="auto", memories=None):
+    """
+    Answer the user with the AI reply and return the full reply text.
+
+    With STREAM_REPLIES on, the first chunk is posted right away and the
+    message is edited as more text arrives, at most once per
+    STREAM_EDIT_INTERVAL; edits in between are coalesced. Time to first
+    visible text and to the complete reply are recorded as histograms.
+    """
+    if not STREAM_REPLIES:
+        started = time.monotonic()
+        response = await get_gemini_response(
+            prompt, history=history, summary=summary, preference=preference, memories=memories
+        )
+        await update.message.reply_text(response)
+        elapsed = time.monotonic() - started
+        AI_TIME_TO_FIRST_TOKEN.labels("full").observe(elapsed)
+        AI_TIME_TO_COMPLETE.labels("full").observe(elapsed)
+        return response
+
+    started = time.monotonic()
+    first_token_at = None
+    reply = None
+    shown = ""
+    last_edit = 0.0
+    response = ""
+
+    async for chunk in stream_gemini_response(
+        prompt, history=history, summary=summary, preference=preference, memories=memories
+    ):
+        response += chunk
+        now = time.monotonic()
+        if reply is None:
+            shown = response[:MessageLimit.MAX_TEXT_LENGTH]
+            reply = await update.message.reply_text(shown)
+            first_token_at = last_edit = time.monotonic()
+        elif now - last_edit >= STREAM_EDIT_INTERVAL and response[:MessageLimit.MAX_TEXT_LENGTH] != shown:
+            shown = response[:MessageLimit.MAX_TEXT_LENGTH]
+            try:
+                await reply.edit_text(shown)
+            except Exception as e:
+                # Intermediate edits are best effort; the final edit below catches up
+                logger.debug(f"Skipped streaming edit: {e}")
+            last_edit = now
+
+    if reply is None:
+        response = response or "..."
+        await _deliver(update, response)
+    else:
+        final = response[:MessageLimit.MAX_TEXT_LENGTH]
+        if final != shown:
+            await _deliver(update, final, edit=reply.edit_text)
+        for i in range(MessageLimit.MAX_TEXT_LENGTH, len(response), MessageLimit.MAX_TEXT_LENGTH):
+            await _deliver(update, response[i:i + MessageLimit.MAX_TEXT_LENGTH])
+
+    finished = time.monotonic()
+    AI_TIME_TO_FIRST_TOKEN.labels("stream").observe((first_token_at or finished) - started)
+    AI_TIME_TO_COMPLETE.labels("stream").observe(finished - started)
+    logger.info(
+        f"AI reply streamed: time_to_first_token={(first_token_at or finished) - started:.3f}s "
+        f"time_to_complete={finished - started:.3f}s chars={len(response)}"
+    )
+    return response
+
+@instrument_handler
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "Hello! I am your AI Assistant. I can help you with tasks, reminders, questions, and more.\n"
         "Try sending me a message or use /help to see what I can do."
     )
 
+@instrument_handler
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     help_text = """
 *Commands:*
 /start - Start the bot
 /help - Show this help
-/task <text> - Add a new task
-/list - List pending tasks
+/task <text> [@ date] - Add a new task, with an optional reminder
+/list [pending|done|overdue] - List tasks, page by page
 /done <id> - Mark a task as completed
 /search <query> - Search the web
 /gmail [query] - List recent emails filtered by query (optional)
-/drive - List recent Drive files
-/calendar - List upcoming events
+/drive [query] - List or search Drive files
+/calendar [query] - List or search upcoming events
 /docs <document_id> - Preview a Google Docs document
 /app_status - Check external app status
+/stats - Show cache and queue statistics
+/model [auto|fast|large] - Choose the AI model tier
 
 *Features:*
 - Conversas com memória: mantenho o contexto das últimas mensagens.
@@ -41,48 +175,64 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     await update.message.reply_text(help_text, parse_mode='Markdown')
 
+async def _schedule(update: Update, run, text=None):
+    """
+    Queue an AI job, replying if the bot is overloaded. Returns once the job
+    is admitted; a scheduler worker runs it and the job sends the reply, so
+    the handler doesn't hold one of the CONCURRENT_UPDATES slots meanwhile.
+    """
+    try:
+        await ai_scheduler.submit(update.effective_user.id, run, text=text)
+    except SchedulerBusy:
+        await update.message.reply_text(
+            "⏳ Muitas solicitações no momento. Tente novamente em instantes."
+        )
+
+@instrument_handler
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_text = update.message.text
     user_id = update.effective_user.id
 
-    history = get_conversation_history(user_id)
-    response = get_gemini_response(user_text, history=history)
+    async def run(user_text):
+        history = await conversation_cache.get_history(user_id)
+        summary = await conversation_cache.get_summary(user_id)
+        preference = await model_router.get_preference(user_id)
+        memories = await semantic_memory.recall(user_id, user_text, exclude=history)
+        response = await _reply_with_ai(
+            update, user_text, history=history, summary=summary, preference=preference, memories=memories
+        )
 
-    log_conversation(user_id, "user", user_text)
-    log_conversation(user_id, "assistant", response)
+        conversation_cache.append(user_id, "user", user_text)
+        conversation_cache.append(user_id, "assistant", response)
 
-    await update.message.reply_text(response)
+    # Messages sent while this one is still queued are merged into it
+    await _schedule(update, run, text=update.message.text)
 
+@instrument_handler
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    photo_file = await update.message.photo[-1].get_file()
-    from io import BytesIO
-    bio = BytesIO()
-    await photo_file.download_to_memory(bio)
-    bio.seek(0)
-    image_data = bio.read()
+    photo = choose_photo_size(update.message.photo)
+    photo_file = await photo.get_file()
+    image_data = await photo_file.download_as_bytearray()
 
     caption = update.message.caption or "Describe this image"
     await update.message.reply_text("👀 Analyzing image...")
 
-    import PIL.Image
-    img = PIL.Image.open(BytesIO(image_data))
+    async def run(_):
+        prepared = await prepare_image(image_data, (photo.width, photo.height))
+        response = await analyze_image(prepared, caption)
+        await update.message.reply_text(response)
 
-    response = analyze_image(img, caption)
-    await update.message.reply_text(response)
+    await _schedule(update, run)
 
+@instrument_handler
 async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status_msg = await update.message.reply_text("🎤 Ouvindo...")
 
     voice = update.message.voice or update.message.audio
-    file_id = voice.file_id
-    new_file = await context.bot.get_file(file_id)
-
-    file_path = f"voice_{file_id}.ogg"
-    await new_file.download_to_drive(file_path)
-
-    try:
-        text = transcribe_audio(file_path)
+    new_file = await context.bot.get_file(voice.file_id)
+    audio_data = await new_file.download_as_bytearray()
+    filename = getattr(voice, "file_name", None) or "voice.ogg"
 
+    async def answer(text):
         if text.startswith("Error"):
             await status_msg.edit_text(f"❌ {text}")
             return
@@ -90,44 +240,134 @@ async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await status_msg.edit_text(f"🗣️ *Você disse:* \"{text}\"\n\n🤔 *Pensando...*", parse_mode='Markdown')
 
         user_id = update.effective_user.id
-        history = get_conversation_history(user_id)
-        response = get_gemini_response(text, history=history)
-
-        log_conversation(user_id, "user", text)
-        log_conversation(user_id, "assistant", response)
-
-        await update.message.reply_text(response)
-
-    except Exception as e:
-        await status_msg.edit_text(f"Error processing audio: {e}")
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-
+        history = await conversation_cache.get_history(user_id)
+        summary = await conversation_cache.get_summary(user_id)
+        preference = await model_router.get_preference(user_id)
+        memories = await semantic_memory.recall(user_id, text, exclude=history)
+        response = await _reply_with_ai(
+            update, text, history=history, summary=summary, preference=preference, memories=memories
+        )
+
+        conversation_cache.append(user_id, "user", text)
+        conversation_cache.append(user_id, "assistant", response)
+
+    async def run(_):
+        try:
+            await answer(await transcribe_audio(bytes(audio_data), filename))
+        except Exception as e:
+            await status_msg.edit_text(f"Error processing audio: {e}")
+
+    await _schedule(update, run)
+
+@instrument_handler
 async def add_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     text = " ".join(context.args)
     if not text:
-        await update.message.reply_text("Usage: /task <task description>")
+        await update.message.reply_text("Usage: /task <task description> [@ due date]")
         return
 
-    task_id = add_task(user_id, text)
-    await update.message.reply_text(f"✅ Task added! (ID: {task_id})")
+    try:
+        title, due_date = parse_due_date(text)
+    except ValueError as e:
+        await update.message.reply_text(
+            f"❌ {e}\nExemplos: /task Reunião @ amanhã 14:30, /task Ligar @ em 2h, /task Natal @ 25/12 10h"
+        )
+        return
 
+    task_id = await run_db(add_task, user_id, title, due_date=due_date)
+    if due_date:
+        reminder_engine.upsert(task_id, user_id, title, due_date)
+        await update.message.reply_text(f"✅ Task added! (ID: {task_id}) ⏰ {format_due(due_date)}")
+    else:
+        await update.message.reply_text(f"✅ Task added! (ID: {task_id})")
+
+TASKS_PAGE_SIZE = int(os.getenv("TASKS_PAGE_SIZE", "10"))
+# Longer titles are cut in /list (the full title stays in the database)
+TASK_TITLE_MAX_CHARS = int(os.getenv("TASK_TITLE_MAX_CHARS", "200"))
+TASK_STATUS_LABELS = {"pending": "Pendentes", "done": "Concluídas", "overdue": "Atrasadas"}
+
+async def _render_tasks_page(user_id, status, after_id=None, before_id=None):
+    """Return (text, keyboard) for one page of the user's tasks."""
+    rows, has_more = await run_db(
+        get_tasks_page, user_id, status, after_id=after_id, before_id=before_id, limit=TASKS_PAGE_SIZE
+    )
+    total = await run_db(count_tasks, user_id, status)
+
+    if not rows:
+        text = "No pending tasks." if status == "pending" else f"Nenhuma tarefa ({TASK_STATUS_LABELS[status].lower()})."
+    else:
+        text = f"*Your Tasks — {TASK_STATUS_LABELS[status]} ({total}):*\n"
+        shown = []
+        for task_id, title, due_date, is_completed in rows:
+            if len(title) > TASK_TITLE_MAX_CHARS:
+                title = title[:TASK_TITLE_MAX_CHARS - 1] + "…"
+            due = f" ⏰ {format_due(due_date)}" if due_date else ""
+            line = f"{task_id}. {escape_markdown(title)}{due}\n"
+            # Stop before the message gets too long; the rest goes to the next page
+            if shown and len(text) + len(line) > MessageLimit.MAX_TEXT_LENGTH:
+                break
+            text += line
+            shown.append((task_id, title, due_date, is_completed))
+        if len(shown) < len(rows):
+            rows = shown
+            if before_id is None:
+                has_more = True
+
+    # Going back, has_more means there are older rows; going forward, newer ones
+    has_prev = has_more if before_id is not None else after_id is not None
+    has_next = has_more if before_id is None else True
+    nav = []
+    if rows and has_prev:
+        nav.append(InlineKeyboardButton("◀️", callback_data=f"tasks:{user_id}:{status}:prev:{rows[0][0]}"))
+    if rows and has_next:
+        nav.append(InlineKeyboardButton("▶️", callback_data=f"tasks:{user_id}:{status}:next:{rows[-1][0]}"))
+    filters = [
+        InlineKeyboardButton(label, callback_data=f"tasks:{user_id}:{key}:first:0")
+        for key, label in TASK_STATUS_LABELS.items()
+        if key != status
+    ]
+    keyboard = InlineKeyboardMarkup([row for row in (nav, filters) if row])
+    return text, keyboard
+
+@instrument_handler
 async def list_tasks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    tasks = get_tasks(user_id)
-
-    if not tasks:
-        await update.message.reply_text("No pending tasks.")
+    status = context.args[0].lower() if context.args else "pending"
+    if status not in TASK_STATUS_LABELS:
+        await update.message.reply_text("Usage: /list [pending|done|overdue]")
         return
 
-    msg = "*Your Tasks:*\n"
-    for t in tasks:
-        msg += f"{t[0]}. {t[1]}\n"
+    text, keyboard = await _render_tasks_page(user_id, status)
+    await update.message.reply_text(text, parse_mode='Markdown', reply_markup=keyboard)
 
-    await update.message.reply_text(msg, parse_mode='Markdown')
+@instrument_handler
+async def list_tasks_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    parts = query.data.split(":")
+    if len(parts) != 5:
+        # Buttons from before the owner was part of the data
+        await query.answer("Esta lista expirou. Use /list novamente.", show_alert=True)
+        return
+    _, owner_id, status, direction, task_id = parts
+    # Anyone in a group can press the buttons; only the owner may page through the list
+    if int(owner_id) != query.from_user.id:
+        await query.answer("Esta lista é de outro usuário. Use /list para ver as suas tarefas.", show_alert=True)
+        return
+    await query.answer()
+    if status not in TASK_STATUS_LABELS:
+        return
+
+    task_id = int(task_id)
+    text, keyboard = await _render_tasks_page(
+        int(owner_id),
+        status,
+        after_id=task_id if direction == "next" else None,
+        before_id=task_id if direction == "prev" else None,
+    )
+    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=keyboard)
 
+@instrument_handler
 async def complete_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if not context.args:
@@ -135,62 +375,120 @@ async def complete_task_command(update: Update, context: ContextTypes.DEFAULT_TY
         return
     try:
         task_id = int(context.args[0])
-        success = complete_task(task_id, user_id)
+        success = await run_db(complete_task, task_id, user_id)
         if success:
+            reminder_engine.remove(task_id)
             await update.message.reply_text(f"✅ Task {task_id} marked as done.")
         else:
             await update.message.reply_text(f"❌ Task {task_id} not found.")
     except ValueError:
         await update.message.reply_text("Invalid Task ID.")
 
+@instrument_handler
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = " ".join(context.args)
     if not query:
         await update.message.reply_text("Usage: /search <query>")
         return
     await update.message.reply_text(f"🔍 Searching for '{query}'...")
-    result = google_search(query)
+    result = await cached_google_search(query)
     await update.message.reply_text(result, parse_mode='Markdown')
 
+@instrument_handler
 async def gmail_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = " ".join(context.args) if context.args else None
     try:
-        result = list_recent_emails(query=query)
+        result = await run_google(list_recent_emails, query=query)
     except Exception as e:
         result = f"Erro ao acessar o Gmail: {e}"
     await update.message.reply_text(result, parse_mode='Markdown')
 
+@instrument_handler
 async def drive_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = " ".join(context.args) if context.args else None
     try:
-        result = list_drive_files()
+        result = await search_drive(query)
     except Exception as e:
         result = f"Erro ao acessar o Drive: {e}"
     await update.message.reply_text(result, parse_mode='Markdown')
 
+@instrument_handler
 async def calendar_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = " ".join(context.args) if context.args else None
     try:
-        result = list_upcoming_events()
+        result = await search_calendar(query)
     except Exception as e:
         result = f"Erro ao acessar o Calendar: {e}"
     await update.message.reply_text(result, parse_mode='Markdown')
 
+@instrument_handler
 async def docs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         await update.message.reply_text("Uso: /docs <document_id>")
         return
     document_id = context.args[0]
     try:
-        result = get_document_metadata(document_id)
+        result = await run_google(get_document_metadata, document_id)
     except Exception as e:
         result = f"Erro ao acessar o Docs: {e}"
     await update.message.reply_text(result, parse_mode='Markdown')
 
+@instrument_handler
 async def app_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Connecting to external app...")
-    data = external_client.get_dashboard_data()
+    data = await external_client.get_dashboard_data()
     if isinstance(data, dict):
         msg = f"*App Status:*\nStatus: {data.get('status')}\nPending Orders: {data.get('pending_orders')}"
     else:
         msg = f"Error: {data}"
 
     await update.message.reply_text(msg, parse_mode='Markdown')
+
+@instrument_handler
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    responses = response_cache.stats()
+    conversations = conversation_cache.stats()
+    scheduler = ai_scheduler.stats()
+    models = model_router.stats()
+    msg = (
+        "*Response cache:*\n"
+        f"Backend: {responses['backend']}\n"
+        f"Hits: {responses['hits']} / Misses: {responses['misses']} "
+        f"({responses['hit_ratio']:.0%})\n"
+        f"Time saved: {responses['saved_seconds']:.1f}s\n\n"
+        "*Conversation cache:*\n"
+        f"Hits: {conversations['hits']} / Misses: {conversations['misses']}\n"
+        f"Cached users: {conversations['cached_users']}\n"
+        f"Pending writes: {conversations['pending']} (lag {conversations['pending_lag']:.1f}s)\n\n"
+        "*AI scheduler:*\n"
+        f"Queue depth: {scheduler['queue_depth']} / In flight: {scheduler['in_flight']}\n"
+        f"Rejected: {scheduler['rejected']} / Coalesced: {scheduler['coalesced']}\n"
+        "Wait times: " + ", ".join(f"{k}: {v}" for k, v in scheduler['wait_histogram'].items() if v)
+    )
+    if models:
+        msg += "\n\n*Models:*\n" + "\n".join(
+            f"{model}: {m['calls']} calls, {m['avg_latency']:.2f}s avg, {m['error_rate']:.0%} errors"
+            for model, m in models.items()
+        )
+    circuits = resilience.stats()
+    if circuits:
+        msg += "\n\n*Circuits:*\n" + "\n".join(
+            f"{name}: {c['state'].replace('_', '-')} ({c['failures']} failures)"
+            for name, c in circuits.items()
+        )
+    await update.message.reply_text(msg, parse_mode='Markdown')
+
+@instrument_handler
+async def model_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if not context.args:
+        current = await model_router.get_preference(user_id)
+        await update.message.reply_text(f"Modelo atual: {current}\nUso: /model <auto|fast|large>")
+        return
+    tier = context.args[0].lower()
+    if tier not in TIERS:
+        await update.message.reply_text("Uso: /model <auto|fast|large>")
+        return
+    await run_db(set_model_preference, user_id, tier)
+    model_router.remember_preference(user_id, tier)
+    await update.message.reply_text(f"✅ Modelo definido: {tier}")
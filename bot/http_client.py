@@ -0,0 +1,86 @@
+import os
+import random
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "20"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_client = None
+_host_slots = {}
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_http_client():
+    """Return the shared keep-alive AsyncClient, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _host_slot(url):
+    host = urlsplit(str(url)).netloc
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots[host] = asyncio.Semaphore(HTTP_MAX_PER_HOST)
+    return slot
+
+
+def _backoff(attempt):
+    # Full jitter: spread retries from many coroutines instead of syncing them up
+    return random.uniform(0, HTTP_BACKOFF * (2 ** attempt))
+
+
+async def request(method, url, retries=HTTP_RETRIES, **kwargs):
+    """
+    Send a request through the shared client, at most HTTP_MAX_PER_HOST at a
+    time per host. Connection errors, timeouts and 429/5xx responses are
+    retried with jittered exponential backoff; the last response or error is
+    returned/raised as-is.
+    """
+    client = get_http_client()
+    for attempt in range(retries + 1):
+        try:
+            async with _host_slot(url):
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if attempt == retries:
+                raise
+            logger.warning(f"{method} {url} failed ({e!r}), retrying")
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            logger.warning(f"{method} {url} returned {response.status_code}, retrying")
+        await asyncio.sleep(_backoff(attempt))
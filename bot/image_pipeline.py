@@ -0,0 +1,57 @@
+import os
+import asyncio
+from io import BytesIO
+
+# Longest side sent to the vision model; larger photos are downscaled
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1280"))
+# Groq rejects base64 images over 4 MB, i.e. ~3 MB of raw bytes
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(3 * 1024 * 1024)))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+
+def choose_photo_size(photo_sizes):
+    """
+    Pick the smallest Telegram PhotoSize whose longest side still covers
+    IMAGE_MAX_SIDE, falling back to the largest one available.
+    """
+    sizes = sorted(photo_sizes, key=lambda p: max(p.width, p.height))
+    for size in sizes:
+        if max(size.width, size.height) >= IMAGE_MAX_SIDE:
+            return size
+    return sizes[-1]
+
+
+def needs_processing(data, size=None):
+    """True if the image can't be sent to the model as-is."""
+    if bytes(data[:3]) != JPEG_MAGIC or len(data) > IMAGE_MAX_BYTES:
+        return True
+    return size is not None and max(size) > IMAGE_MAX_SIDE
+
+
+def downscale_jpeg(data):
+    """Decode (in JPEG draft mode when possible), shrink and re-encode as JPEG."""
+    import PIL.Image
+
+    img = PIL.Image.open(BytesIO(data))
+    # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full resolution
+    img.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+    img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=IMAGE_JPEG_QUALITY)
+    return out.getbuffer()
+
+
+async def prepare_image(data, size=None):
+    """
+    Return JPEG bytes ready for the vision model. Telegram photos that are
+    already small enough JPEGs are passed through untouched; anything else is
+    downscaled in a worker thread.
+    """
+    if not needs_processing(data, size):
+        return data
+    return await asyncio.to_thread(downscale_jpeg, data)
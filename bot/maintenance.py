@@ -0,0 +1,91 @@
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+
+from bot.db import (
+    run_db,
+    get_users_with_history_before,
+    archive_conversations,
+    purge_archive,
+    purge_cached_responses,
+    vacuum_database,
+    get_storage_stats,
+)
+from bot.metrics import DB_TABLE_BYTES, DB_RECLAIMED_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Seconds between maintenance runs (0 = off)
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "21600"))
+# Conversation rows older than this many days move to the compressed archive
+CONVERSATION_HOT_DAYS = int(os.getenv("CONVERSATION_HOT_DAYS", "90"))
+# Archived days older than this are deleted (0 = keep the archive forever)
+CONVERSATION_ARCHIVE_DAYS = int(os.getenv("CONVERSATION_ARCHIVE_DAYS", "0"))
+# Rows moved per DB call, so chat queries can run between batches
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "2000"))
+# Free pages released per run by SQLite incremental vacuum
+VACUUM_MAX_PAGES = int(os.getenv("VACUUM_MAX_PAGES", "10000"))
+
+
+def _day_cutoff(days):
+    return (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+
+
+async def run_maintenance():
+    """
+    Archive cold conversation history user by user, expire old archives and
+    cached responses, reclaim free space and return a report dict. Every
+    step is its own DB call, so the hot path is never blocked for long.
+    """
+    started = time.monotonic()
+    report = {"archived_rows": 0, "raw_bytes": 0, "packed_bytes": 0, "purged_days": 0}
+
+    before = _day_cutoff(CONVERSATION_HOT_DAYS)
+    for user_id in await run_db(get_users_with_history_before, before):
+        while True:
+            rows, raw, packed = await run_db(archive_conversations, user_id, before, ARCHIVE_BATCH)
+            report["archived_rows"] += rows
+            report["raw_bytes"] += raw
+            report["packed_bytes"] += packed
+            if rows < ARCHIVE_BATCH:
+                break
+
+    if CONVERSATION_ARCHIVE_DAYS > 0:
+        report["purged_days"] = await run_db(purge_archive, _day_cutoff(CONVERSATION_ARCHIVE_DAYS))
+    report["purged_cache"] = await run_db(purge_cached_responses, time.time())
+
+    reclaimed = await run_db(vacuum_database, VACUUM_MAX_PAGES)
+    report["incremental_vacuum"] = reclaimed is not None
+    report["reclaimed_bytes"] = reclaimed or 0
+    report["database_bytes"], report["tables"] = await run_db(get_storage_stats)
+    report["seconds"] = time.monotonic() - started
+    return report
+
+
+async def maintenance_job(context):
+    """JobQueue callback: run maintenance and publish the report to logs and metrics."""
+    try:
+        report = await run_maintenance()
+    except Exception as e:
+        logger.error(f"Database maintenance failed: {e}")
+        return
+
+    DB_RECLAIMED_BYTES.inc(report["reclaimed_bytes"])
+    if not report["incremental_vacuum"]:
+        logger.warning(
+            "Incremental vacuum is off for this SQLite file, so free pages are not released; "
+            "enable it once with a full VACUUM while the bot is stopped (see DEPLOY.md)"
+        )
+    for table, size in report["tables"].items():
+        DB_TABLE_BYTES.labels(table).set(size)
+
+    largest = sorted(report["tables"].items(), key=lambda item: item[1], reverse=True)[:5]
+    logger.info(
+        f"Database maintenance: archived {report['archived_rows']} rows "
+        f"({report['raw_bytes']} -> {report['packed_bytes']} bytes), "
+        f"purged {report['purged_days']} archived days and {report['purged_cache']} cache entries, "
+        f"reclaimed {report['reclaimed_bytes']} bytes; database is {report['database_bytes']} bytes "
+        f"(largest: {', '.join(f'{name}={size}' for name, size in largest)}) "
+        f"in {report['seconds']:.1f}s"
+    )
@@ -0,0 +1,181 @@
+import os
+import re
+import math
+import heapq
+import zlib
+import logging
+import unicodedata
+from collections import defaultdict
+
+from bot.db import (
+    run_db,
+    get_unindexed_conversations,
+    save_memory_postings,
+    find_memory_postings,
+    get_conversation_messages,
+)
+
+logger = logging.getLogger(__name__)
+
+# Past messages recalled per prompt (0 disables semantic memory)
+MEMORY_RECALL_K = int(os.getenv("MEMORY_RECALL_K", "4"))
+# Newest postings read per query term; bounds query cost for very long histories
+MEMORY_CANDIDATES_PER_TERM = int(os.getenv("MEMORY_CANDIDATES_PER_TERM", "1000"))
+# Minimum cosine similarity for a message to be recalled
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.15"))
+MEMORY_INDEX_BATCH = int(os.getenv("MEMORY_INDEX_BATCH", "500"))
+
+# Features kept per message / query, and word prefix length used as a cheap stemmer
+MAX_FEATURES = 64
+STEM_LENGTH = 6
+
+_word = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+    que com para por uma uns umas dos das nos nas não nao sim mais mas como qual quando onde
+    isso isto esse essa este esta ele ela eles elas você voce vocês meu minha seu sua tem ter
+    foi ser são sao está esta estou pode sobre entre até ate também tambem muito ainda
+    the and for with that this what when where which you your are was were have has can
+    will would about from there their they them then than not but how why who
+""".split())
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def features(text):
+    """
+    Hashed n-gram features of a message: stemmed words plus adjacent word
+    pairs, hashed into 31-bit ints. Together they form a sparse binary vector.
+    """
+    words = [
+        w[:STEM_LENGTH] for w in _word.findall(_normalize(text or ""))
+        if len(w) > 2 and w not in STOPWORDS and not w.isdigit()
+    ]
+    grams = []
+    seen = set()
+    for gram in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        if gram not in seen:
+            seen.add(gram)
+            grams.append(gram)
+            if len(grams) == MAX_FEATURES:
+                break
+    return {zlib.crc32(gram.encode()) & 0x7FFFFFFF for gram in grams}
+
+
+class SemanticMemory:
+    """
+    Per-user retrieval over the whole conversation log.
+
+    Messages are indexed in SQLite as postings (user_id, term, message_id) of
+    their hashed n-gram features, written in the same transaction as the
+    messages themselves (see conversation_cache.flush); rows stored before
+    that, or while memory was off, are picked up by backfill() at startup.
+    Recall scores candidates by IDF-weighted cosine similarity to the prompt.
+    Nothing is held in memory between queries, and each query reads at most
+    MEMORY_CANDIDATES_PER_TERM postings per term, so memory use stays flat
+    however many messages are stored. Messages archived by the maintenance
+    job (bot/maintenance.py) leave the index with them.
+    """
+
+    def __init__(self, k=MEMORY_RECALL_K, min_score=MEMORY_MIN_SCORE,
+                 per_term=MEMORY_CANDIDATES_PER_TERM, batch_size=MEMORY_INDEX_BATCH):
+        self.k = k
+        self.min_score = min_score
+        self.per_term = per_term
+        self.batch_size = batch_size
+        self.indexed = 0
+        # Set once backfill() has caught up; from then on flushes advance the watermark
+        self.backfilled = False
+
+    @property
+    def enabled(self):
+        return self.k > 0
+
+    def terms_for(self, rows):
+        """Features of each (user_id, role, content, ...) row, for log_conversation_rows; None when off."""
+        if not self.enabled:
+            return None
+        return [features(row[2]) for row in rows]
+
+    def _index_batch(self):
+        rows = get_unindexed_conversations(self.batch_size)
+        if not rows:
+            return 0
+        postings = [
+            (user_id, term, message_id)
+            for message_id, user_id, content in rows
+            for term in features(content)
+        ]
+        save_memory_postings(postings, rows[-1][0])
+        return len(rows)
+
+    async def backfill(self):
+        """
+        Index rows past the backfill watermark, one batch per DB round trip.
+        The watermark may skip rows whose ids committed out of order, but
+        those were written with their postings; re-indexing a row is a no-op.
+        Once caught up, this process's flushes keep the watermark current so
+        the next startup doesn't rescan them.
+        """
+        if not self.enabled:
+            return
+        while True:
+            count = await run_db(self._index_batch)
+            self.indexed += count
+            if count < self.batch_size:
+                self.backfilled = True
+                return
+
+    def _search(self, user_id, query, limit):
+        terms = features(query)
+        if not terms:
+            return []
+        by_term = defaultdict(list)
+        for term, message_id in find_memory_postings(user_id, terms, self.per_term):
+            by_term[term].append(message_id)
+        if not by_term:
+            return []
+
+        # Rare terms count more; a term whose postings hit the cap is treated as common
+        weight = {term: 1.0 / math.log2(2 + len(ids)) for term, ids in by_term.items()}
+        dots = defaultdict(float)
+        for term, ids in by_term.items():
+            w2 = weight[term] ** 2
+            for message_id in ids:
+                dots[message_id] += w2
+
+        top = heapq.nlargest(limit * 4, dots.items(), key=lambda item: item[1])
+        candidates = get_conversation_messages(user_id, [message_id for message_id, _ in top])
+
+        # Cosine similarity; document norms assume their other terms weigh like the heaviest query term
+        query_norm = math.sqrt(sum(weight.get(t, 1.0) ** 2 for t in terms))
+        scale = query_norm * max(weight.values())
+        scored = []
+        for message_id, role, content in candidates:
+            score = dots[message_id] / (scale * (math.sqrt(len(features(content))) or 1.0))
+            if score >= self.min_score:
+                scored.append((score, message_id, role, content))
+        scored.sort(reverse=True)
+        return scored[:limit]
+
+    async def recall(self, user_id: int, query: str, exclude=None):
+        """
+        Return up to k past messages relevant to the query, oldest first, as
+        history-style dicts. Messages already in `exclude` (the recent
+        window) are skipped.
+        """
+        if not self.enabled or not query:
+            return []
+        try:
+            results = await run_db(self._search, user_id, query, self.k + len(exclude or []))
+        except Exception as e:
+            logger.error(f"Memory recall failed for {user_id}: {e}")
+            return []
+        recent = {m.get("content") for m in exclude or []}
+        chosen = [r for r in results if r[3] not in recent][:self.k]
+        return [{"role": role, "content": content} for _, _, role, content in sorted(chosen, key=lambda r: r[1])]
+
+
+semantic_memory = SemanticMemory()
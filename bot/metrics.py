@@ -0,0 +1,173 @@
+import os
+import time
+import inspect
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Log a per-update trace with the duration of every instrumented call in it
+TRACE_SPANS = os.getenv("TRACE_SPANS", "0") == "1"
+# Port for the standalone /metrics server in polling mode (webhook mode
+# serves /metrics on the webhook port instead)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+LATENCY = Histogram(
+    "raizito_call_duration_seconds",
+    "Duration of handlers and external calls",
+    ["component", "operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+ERRORS = Counter(
+    "raizito_call_errors_total",
+    "Calls that raised or returned an error message",
+    ["component", "operation"],
+)
+IN_FLIGHT = Gauge(
+    "raizito_calls_in_flight",
+    "Calls currently running",
+    ["component", "operation"],
+)
+PAYLOAD_BYTES = Histogram(
+    "raizito_payload_bytes",
+    "Size of text/bytes results returned by calls",
+    ["component", "operation"],
+    buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+
+# Perceived latency of AI replies: first visible text vs. full answer
+AI_REPLY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+AI_TIME_TO_FIRST_TOKEN = Histogram(
+    "raizito_ai_time_to_first_token_seconds",
+    "Time from starting an AI reply until its first text reaches the user",
+    ["mode"],
+    buckets=AI_REPLY_BUCKETS,
+)
+AI_TIME_TO_COMPLETE = Histogram(
+    "raizito_ai_time_to_complete_seconds",
+    "Time from starting an AI reply until the full text reaches the user",
+    ["mode"],
+    buckets=AI_REPLY_BUCKETS,
+)
+
+DB_TABLE_BYTES = Gauge(
+    "raizito_db_table_bytes",
+    "Size of each database table/index at the last maintenance run",
+    ["table"],
+)
+DB_RECLAIMED_BYTES = Counter(
+    "raizito_db_reclaimed_bytes_total",
+    "Bytes given back by database maintenance",
+)
+
+RESILIENCE_EVENTS = Counter(
+    "raizito_resilience_events_total",
+    "Outbound call outcomes: success, failure, timeout, retry, short_circuit, hedge, hedge_win",
+    ["service", "event"],
+)
+CIRCUIT_STATE = Gauge(
+    "raizito_circuit_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["circuit"],
+)
+
+_trace = contextvars.ContextVar("raizito_trace", default=None)
+
+
+def _is_error_result(result):
+    # Service functions report failures as user-facing strings instead of raising
+    return isinstance(result, str) and result.startswith(("Error", "⚠️"))
+
+
+def _observe_result(component, operation, result):
+    if isinstance(result, (str, bytes, bytearray, memoryview)):
+        size = len(result.encode("utf-8")) if isinstance(result, str) else len(result)
+        PAYLOAD_BYTES.labels(component, operation).observe(size)
+    if _is_error_result(result):
+        ERRORS.labels(component, operation).inc()
+
+
+@contextmanager
+def track(component, operation):
+    """Record latency, errors and in-flight count for the enclosed block."""
+    in_flight = IN_FLIGHT.labels(component, operation)
+    in_flight.inc()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(component, operation).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        in_flight.dec()
+        LATENCY.labels(component, operation).observe(elapsed)
+        spans = _trace.get()
+        if spans is not None:
+            spans.append((f"{component}.{operation}", elapsed))
+
+
+@contextmanager
+def trace(name):
+    """Collect spans for one update and log them when TRACE_SPANS is on."""
+    if not TRACE_SPANS or _trace.get() is not None:
+        yield
+        return
+    spans = []
+    token = _trace.set(spans)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _trace.reset(token)
+        total = (time.perf_counter() - started) * 1000
+        detail = " ".join(f"{span}={elapsed * 1000:.1f}ms" for span, elapsed in spans)
+        logger.info(f"trace {name} total={total:.1f}ms {detail}")
+
+
+def instrument(component, operation=None):
+    """Decorator applying track() to a sync or async function."""
+
+    def decorator(func):
+        op = operation or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with track(component, op):
+                    result = await func(*args, **kwargs)
+                _observe_result(component, op, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(component, op):
+                result = func(*args, **kwargs)
+            _observe_result(component, op, result)
+            return result
+        return wrapper
+
+    return decorator
+
+
+def instrument_handler(func):
+    """instrument() for Telegram handlers, also opening a trace per update."""
+    tracked = instrument("handler")(func)
+
+    @functools.wraps(func)
+    async def wrapper(update, context):
+        with trace(func.__name__):
+            return await tracked(update, context)
+    return wrapper
+
+
+def start_metrics_server(offset=0):
+    """Expose /metrics on METRICS_PORT (+ offset, one port per worker process), if configured."""
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT + offset)
+        logger.info(f"Metrics available on :{METRICS_PORT + offset}/metrics")
@@ -0,0 +1,101 @@
+import os
+import re
+import time
+from collections import OrderedDict
+
+from bot.db import run_db, get_model_preference
+
+FAST_MODEL = os.getenv("FAST_MODEL", "llama-3.1-8b-instant")
+LARGE_MODEL = os.getenv("LARGE_MODEL", "llama-3.3-70b-versatile")
+VISION_MODEL = os.getenv("VISION_MODEL", "llama-3.2-11b-vision-preview")
+
+# Prompts up to this many characters without prior history go to the fast model
+ROUTER_SHORT_CHARS = int(os.getenv("ROUTER_SHORT_CHARS", "80"))
+# Start a duplicate request on the fallback model if the fast model hasn't
+# answered after this many seconds (0 = no hedging)
+ROUTER_HEDGE_AFTER = float(os.getenv("ROUTER_HEDGE_AFTER", "3"))
+
+# Cached per-user tier preferences; evicted like conversation windows
+PREFERENCE_CACHE_MAX_USERS = int(os.getenv("PREFERENCE_CACHE_MAX_USERS", "1000"))
+PREFERENCE_CACHE_TTL = float(os.getenv("PREFERENCE_CACHE_TTL", "1800"))
+
+TIERS = ("auto", "fast", "large")
+
+_greeting = re.compile(
+    r"^\s*(oi|olá|ola|bom dia|boa tarde|boa noite|obrigad[oa]|valeu|ok|hi|hello|hey|thanks|thank you)\b[\s!.?]*$",
+    re.IGNORECASE,
+)
+_complex = re.compile(
+    r"\b(explique|explica|explain|analise|analyze|compare|por que|porque|why|como fazer|how to|"
+    r"código|code|escreva|write|resuma|summarize|traduza|translate|passo a passo|step by step)\b",
+    re.IGNORECASE,
+)
+
+
+class ModelRouter:
+    """
+    Picks the model chain for a chat request and keeps per-model latency and
+    error stats. The first model in a chain is the preferred one; the rest are
+    fallbacks tried on rate-limit, timeout or server errors.
+
+    Users' tier preferences are cached least-recently-used, at most max_users
+    of them and each for at most ttl seconds since last use; the database
+    stays the source of truth.
+    """
+
+    def __init__(self, max_users=PREFERENCE_CACHE_MAX_USERS, ttl=PREFERENCE_CACHE_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._preferences = OrderedDict()  # user_id -> (tier, last access)
+        self._stats = {}  # model -> [calls, errors, total latency]
+
+    async def get_preference(self, user_id):
+        entry = self._preferences.get(user_id)
+        if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+            tier = entry[0]
+        else:
+            tier = await run_db(get_model_preference, user_id) or "auto"
+        self.remember_preference(user_id, tier)
+        return tier
+
+    def remember_preference(self, user_id, tier):
+        self._preferences[user_id] = (tier, time.monotonic())
+        self._preferences.move_to_end(user_id)
+        while len(self._preferences) > self.max_users:
+            self._preferences.popitem(last=False)
+
+    def classify(self, prompt, history=None, preference="auto"):
+        """Return "fast" or "large" for a text request."""
+        if preference in ("fast", "large"):
+            return preference
+        text = prompt or ""
+        if _greeting.match(text):
+            return "fast"
+        if _complex.search(text):
+            return "large"
+        if len(text) <= ROUTER_SHORT_CHARS and not history:
+            return "fast"
+        return "large"
+
+    def chain(self, tier):
+        return [FAST_MODEL, LARGE_MODEL] if tier == "fast" else [LARGE_MODEL, FAST_MODEL]
+
+    def record(self, model, latency, ok):
+        stats = self._stats.setdefault(model, [0, 0, 0.0])
+        stats[0] += 1
+        stats[2] += latency
+        if not ok:
+            stats[1] += 1
+
+    def stats(self):
+        return {
+            model: {
+                "calls": calls,
+                "error_rate": errors / calls if calls else 0.0,
+                "avg_latency": total / calls if calls else 0.0,
+            }
+            for model, (calls, errors, total) in self._stats.items()
+        }
+
+
+model_router = ModelRouter()
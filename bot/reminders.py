@@ -0,0 +1,231 @@
+import os
+import re
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from bot.db import run_db, get_due_tasks, get_changed_tasks, mark_tasks_reminded
+from bot.sharding import owns_user
+
+logger = logging.getLogger(__name__)
+
+# Timezone used to read dates typed by users
+BOT_TIMEZONE = ZoneInfo(os.getenv("BOT_TIMEZONE", "America/Sao_Paulo"))
+# Only tasks due within this window are kept in memory
+REMINDER_HORIZON = timedelta(hours=float(os.getenv("REMINDER_HORIZON_HOURS", "24")))
+# How often changed rows are re-read and the horizon extended
+REMINDER_RELOAD_INTERVAL = float(os.getenv("REMINDER_RELOAD_INTERVAL", "60"))
+
+# Only a standalone "@" starts the date, so e-mail addresses and @mentions stay in the title
+_separator = re.compile(r"(?:^|\s)@\s")
+_relative = re.compile(r"^(?:em|in|\+)\s*(\d+)\s*(m|min|h|d)$", re.IGNORECASE)
+_time = r"(\d{1,2})(?::|h)(\d{2})?"
+
+
+def _utc_iso(value):
+    return value.astimezone(timezone.utc).replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+def _from_utc_iso(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def format_due(due_date):
+    """Show a stored UTC due date in the bot's timezone."""
+    return _from_utc_iso(due_date).astimezone(BOT_TIMEZONE).strftime("%d/%m/%Y %H:%M")
+
+
+def parse_due_date(text, now=None):
+    """
+    Split "/task" text into (title, due_date) where due_date is a UTC ISO
+    string or None. The date follows a standalone " @ ":
+
+        Comprar pão @ em 30m | @ em 2h | @ +1d
+        Reunião @ 14:30 | @ amanhã 9h | @ 25/12 14:30 | @ 2025-12-25 14:30
+
+    Raises ValueError (with a message for the user) if the title is empty or
+    the date can't be read.
+    """
+    separators = list(_separator.finditer(text))
+    if not separators:
+        return text.strip(), None
+
+    last = separators[-1]
+    title, when = text[:last.start()].strip(), text[last.end():].strip().lower()
+    if not title:
+        raise ValueError("Informe o título da tarefa antes do @.")
+    now = (now or datetime.now(timezone.utc)).astimezone(BOT_TIMEZONE)
+
+    match = _relative.match(when)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)[0]
+        delta = {"m": timedelta(minutes=amount), "h": timedelta(hours=amount), "d": timedelta(days=amount)}[unit]
+        return title, _utc_iso(now + delta)
+
+    day = now.date()
+    rest = when
+    if when.startswith(("amanhã", "amanha", "tomorrow")):
+        day += timedelta(days=1)
+        rest = when.split(None, 1)[1] if " " in when else ""
+    elif when.startswith(("hoje", "today")):
+        rest = when.split(None, 1)[1] if " " in when else ""
+    else:
+        date_match = re.match(r"^(\d{4})-(\d{2})-(\d{2})\s*|^(\d{1,2})/(\d{1,2})(?:/(\d{4}))?\s*", when)
+        if date_match:
+            try:
+                if date_match.group(1):
+                    day = datetime(int(date_match.group(1)), int(date_match.group(2)), int(date_match.group(3))).date()
+                else:
+                    year = int(date_match.group(6) or now.year)
+                    day = datetime(year, int(date_match.group(5)), int(date_match.group(4))).date()
+            except ValueError:
+                raise ValueError(f"Data inválida: {when}") from None
+            rest = when[date_match.end():]
+
+    hour, minute = 9, 0  # dates without a time remind in the morning
+    if rest:
+        time_match = re.fullmatch(_time, rest.strip())
+        if not time_match:
+            raise ValueError(f"Data inválida: {when}")
+        hour, minute = int(time_match.group(1)), int(time_match.group(2) or 0)
+    elif day == now.date():
+        raise ValueError(f"Data inválida: {when}")
+
+    try:
+        due = datetime(day.year, day.month, day.day, hour, minute, tzinfo=BOT_TIMEZONE)
+    except ValueError:
+        raise ValueError(f"Data inválida: {when}") from None
+    if due <= now and when == rest:
+        # A bare time that already passed today means tomorrow
+        due += timedelta(days=1)
+    if due <= now:
+        raise ValueError("A data informada já passou.")
+    return title, _utc_iso(due)
+
+
+class ReminderEngine:
+    """
+    Fires task reminders through the Application's JobQueue.
+
+    Only pending tasks due within REMINDER_HORIZON live in memory, in a heap
+    ordered by due time, and a single JobQueue job is kept scheduled for the
+    earliest one. Every REMINDER_RELOAD_INTERVAL seconds the engine reads
+    only the rows changed since the last pass (updated_at index) and extends
+    the horizon with one range scan on the (is_completed, due_date) index.
+    Tasks created or completed through this process are applied immediately.
+    With several worker processes, each one only tracks the tasks of the
+    chats it owns, so every reminder is sent once.
+    """
+
+    def __init__(self):
+        self._heap = []  # (due_date, task_id); stale entries are skipped lazily
+        self._tasks = {}  # task_id -> (due_date, user_id, title)
+        self._loaded_until = None
+        self._last_sync = None
+        self._job_queue = None
+        self._next_job = None
+        self._next_due = None
+
+    def start(self, job_queue):
+        self._job_queue = job_queue
+        job_queue.run_repeating(self._reload, interval=REMINDER_RELOAD_INTERVAL, first=0,
+                                name="reminders-reload")
+
+    def upsert(self, task_id, user_id, title, due_date):
+        """Track a pending task if it's due within the loaded horizon."""
+        if not owns_user(user_id):
+            return
+        if due_date is None or self._loaded_until is None or due_date > self._loaded_until:
+            self.remove(task_id)
+            return
+        self._tasks[task_id] = (due_date, user_id, title)
+        heapq.heappush(self._heap, (due_date, task_id))
+        self._reschedule()
+
+    def remove(self, task_id):
+        if self._tasks.pop(task_id, None) is not None:
+            self._reschedule()
+
+    async def _reload(self, context):
+        now = datetime.now(timezone.utc)
+        until = _utc_iso(now + REMINDER_HORIZON)
+        sync_started = now.replace(tzinfo=None).isoformat()
+
+        if self._last_sync is not None:
+            for task_id, user_id, title, due_date, is_completed, reminded_at, _ in await run_db(
+                get_changed_tasks, self._last_sync
+            ):
+                if is_completed or reminded_at:
+                    self.remove(task_id)
+                else:
+                    self.upsert(task_id, user_id, title, due_date)
+
+        for task_id, user_id, title, due_date in await run_db(get_due_tasks, until, self._loaded_until):
+            if not owns_user(user_id):
+                continue
+            self._tasks[task_id] = (due_date, user_id, title)
+            heapq.heappush(self._heap, (due_date, task_id))
+
+        self._loaded_until = until
+        self._last_sync = sync_started
+        self._compact()
+        self._reschedule()
+
+    def _compact(self):
+        # Drop stale heap entries once they outnumber live ones
+        if len(self._heap) > 2 * len(self._tasks) + 64:
+            self._heap = [(due, task_id) for task_id, (due, _, _) in self._tasks.items()]
+            heapq.heapify(self._heap)
+
+    def _peek(self):
+        while self._heap:
+            due_date, task_id = self._heap[0]
+            task = self._tasks.get(task_id)
+            if task is not None and task[0] == due_date:
+                return due_date
+            heapq.heappop(self._heap)
+        return None
+
+    def _reschedule(self):
+        if self._job_queue is None:
+            return
+        due_date = self._peek()
+        if due_date == self._next_due and self._next_job is not None:
+            return
+        if self._next_job is not None:
+            self._next_job.schedule_removal()
+            self._next_job = None
+        self._next_due = due_date
+        if due_date is not None:
+            when = max(_from_utc_iso(due_date), datetime.now(timezone.utc))
+            self._next_job = self._job_queue.run_once(self._fire, when=when, name="reminders-next")
+
+    async def _fire(self, context):
+        self._next_job = None
+        self._next_due = None
+        now = _utc_iso(datetime.now(timezone.utc))
+        fired = []
+        while True:
+            due_date = self._peek()
+            if due_date is None or due_date > now:
+                break
+            _, task_id = heapq.heappop(self._heap)
+            _, user_id, title = self._tasks.pop(task_id)
+            try:
+                await context.bot.send_message(
+                    chat_id=user_id, text=f"⏰ Lembrete: {title} (ID: {task_id})\nUse /done {task_id} para concluir."
+                )
+            except Exception as e:
+                logger.error(f"Failed to send reminder for task {task_id}: {e}")
+            fired.append(task_id)
+
+        if fired:
+            await run_db(mark_tasks_reminded, fired)
+        self._reschedule()
+
+    def stats(self):
+        return {"scheduled": len(self._tasks), "heap": len(self._heap), "loaded_until": self._loaded_until}
+
+
+reminder_engine = ReminderEngine()
@@ -0,0 +1,241 @@
+"""
+Shared policy for outbound calls: a deadline per attempt, bounded retries
+with jittered backoff, a circuit breaker per dependency and optional hedged
+duplicate requests.
+
+Every knob can be set per service through the environment, e.g.
+RESILIENCE_GOOGLE_TIMEOUT=20 or RESILIENCE_SEARCH_HEDGE_AFTER=1.5.
+Outcomes are counted in raizito_resilience_events_total and breaker
+states are exported as raizito_circuit_state.
+"""
+import os
+import math
+import time
+import random
+import asyncio
+import logging
+
+from bot.metrics import RESILIENCE_EVENTS, CIRCUIT_STATE
+from bot.http_client import HTTP_TIMEOUT, HTTP_RETRIES, HTTP_BACKOFF
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Worst case of one bot.http_client request: every attempt times out, plus the longest backoffs
+HTTP_REQUEST_DEADLINE = HTTP_TIMEOUT * (HTTP_RETRIES + 1) + HTTP_BACKOFF * (2 ** HTTP_RETRIES - 1)
+
+# service -> (timeout s, retries, backoff s, failures to open, seconds open, hedge after s)
+DEFAULT_POLICIES = {
+    # Groq falls back to the next model instead of retrying the same one
+    "groq": (float(os.getenv("GROQ_TIMEOUT", "60")), 0, 0.5, 5, 30, 0),
+    "google": (30, 1, 0.5, 5, 60, 0),
+    # HTTP services are already retried by bot.http_client; the deadline must leave room for those retries
+    "search": (HTTP_REQUEST_DEADLINE, 0, 0.5, 5, 60, 0),
+}
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, circuit, retry_in):
+        super().__init__(f"{circuit} is temporarily unavailable, retrying in {math.ceil(retry_in)}s")
+        self.circuit = circuit
+        self.retry_in = retry_in
+
+
+class Policy:
+    def __init__(self, service):
+        timeout, retries, backoff, failures, reset, hedge_after = DEFAULT_POLICIES.get(
+            service, (30, 0, 0.5, 5, 60, 0)
+        )
+        prefix = f"RESILIENCE_{service.upper()}_"
+        self.timeout = float(os.getenv(prefix + "TIMEOUT", timeout))
+        self.retries = int(os.getenv(prefix + "RETRIES", retries))
+        self.backoff = float(os.getenv(prefix + "BACKOFF", backoff))
+        self.failures = int(os.getenv(prefix + "BREAKER_FAILURES", failures))
+        self.reset = float(os.getenv(prefix + "BREAKER_RESET", reset))
+        self.hedge_after = float(os.getenv(prefix + "HEDGE_AFTER", hedge_after))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive transient failures and rejects calls
+    for `reset` seconds; then lets a single probe through (half-open) and
+    closes again if it succeeds.
+    """
+
+    def __init__(self, name, failures, reset):
+        self.name = name
+        self.threshold = failures
+        self.reset = reset
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        CIRCUIT_STATE.labels(name).set(0)
+
+    def _set(self, state):
+        if state != self.state:
+            logger.warning(f"Circuit {self.name}: {self.state} -> {state}")
+            self.state = state
+            CIRCUIT_STATE.labels(self.name).set(CIRCUIT_STATES[state])
+
+    def before_call(self):
+        if self.state == "open":
+            retry_in = self.opened_at + self.reset - time.monotonic()
+            if retry_in > 0:
+                raise CircuitOpenError(self.name, retry_in)
+            self._set("half_open")
+        if self.state == "half_open":
+            if self._probing:
+                raise CircuitOpenError(self.name, self.reset)
+            self._probing = True
+
+    def release(self):
+        """Give back a half-open probe slot without judging the dependency (cancelled call)."""
+        self._probing = False
+
+    def success(self):
+        self.failures = 0
+        self._probing = False
+        self._set("closed")
+
+    def failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self._set("open")
+
+
+_policies = {}
+_breakers = {}
+
+
+def get_policy(service):
+    policy = _policies.get(service)
+    if policy is None:
+        policy = _policies[service] = Policy(service)
+    return policy
+
+
+def get_breaker(service, key=None):
+    name = f"{service}:{key}" if key else service
+    breaker = _breakers.get(name)
+    if breaker is None:
+        policy = get_policy(service)
+        breaker = _breakers[name] = CircuitBreaker(name, policy.failures, policy.reset)
+    return breaker
+
+
+def _status_of(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)  # googleapiclient
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)  # httpx
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(error, transient=()):
+    """Timeouts, connection errors, 429/5xx responses and the caller's own transient types."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if transient and isinstance(error, transient):
+        return True
+    return _status_of(error) in RETRY_STATUSES
+
+
+async def _with_deadline(service, policy, func, args, kwargs):
+    try:
+        return await asyncio.wait_for(func(*args, **kwargs), timeout=policy.timeout)
+    except asyncio.TimeoutError:
+        RESILIENCE_EVENTS.labels(service, "timeout").inc()
+        raise
+
+
+async def _hedged(service, policy, func, args, kwargs):
+    """Start a duplicate request if the first hasn't answered after hedge_after; first success wins."""
+    first = asyncio.create_task(_with_deadline(service, policy, func, args, kwargs))
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=policy.hedge_after)
+        if done:
+            return first.result()
+
+        RESILIENCE_EVENTS.labels(service, "hedge").inc()
+        second = asyncio.create_task(_with_deadline(service, policy, func, args, kwargs))
+        tasks.add(second)
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        RESILIENCE_EVENTS.labels(service, "hedge_win").inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call(service, func, *args, key=None, transient=(), **kwargs):
+    """
+    Await func(*args, **kwargs) under the service's policy. `key` selects a
+    separate breaker within the service (e.g. one per model); `transient`
+    adds exception types that count as dependency failures. Other errors
+    are raised as-is and don't trip the breaker. Raises CircuitOpenError
+    without calling func while the breaker is open.
+    """
+    policy = get_policy(service)
+    breaker = get_breaker(service, key)
+    attempt = 0
+    while True:
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            RESILIENCE_EVENTS.labels(service, "short_circuit").inc()
+            raise
+
+        try:
+            if policy.hedge_after > 0:
+                result = await _hedged(service, policy, func, args, kwargs)
+            else:
+                result = await _with_deadline(service, policy, func, args, kwargs)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not is_transient(e, transient):
+                # The dependency answered; the request itself was wrong
+                breaker.success()
+                raise
+            breaker.failure()
+            RESILIENCE_EVENTS.labels(service, "failure").inc()
+            if attempt >= policy.retries or breaker.state == "open":
+                raise
+            attempt += 1
+            RESILIENCE_EVENTS.labels(service, "retry").inc()
+            await asyncio.sleep(random.uniform(0, policy.backoff * (2 ** (attempt - 1))))
+            continue
+
+        breaker.success()
+        RESILIENCE_EVENTS.labels(service, "success").inc()
+        return result
+
+
+def stats():
+    """Breaker state and consecutive failures per circuit, for /stats."""
+    return {
+        name: {"state": breaker.state, "failures": breaker.failures}
+        for name, breaker in sorted(_breakers.items())
+    }
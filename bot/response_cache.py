@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+
+from bot.db import run_db, get_cached_response, set_cached_response, purge_cached_responses
+
+logger = logging.getLogger(__name__)
+
+# memory (default), sqlite (survives restarts) or off
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_prompt(text):
+    """Case- and whitespace-insensitive form of a prompt, used in cache keys."""
+    return _whitespace.sub(" ", (text or "").strip().lower())
+
+
+def make_key(kind, prompt, model="", context=b""):
+    """
+    Build a cache key from the normalized prompt, the model and a hash of any
+    other input the answer depends on (e.g. image bytes).
+    """
+    digest = hashlib.sha256()
+    for part in (kind, model, normalize_prompt(prompt)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    if not isinstance(context, (bytes, bytearray, memoryview)):
+        context = str(context).encode("utf-8")
+    digest.update(context)
+    return f"{kind}:{digest.hexdigest()}"
+
+
+def is_cacheable(history=None, summary=None):
+    """
+    Cacheability rules for AI replies:
+    - replies to a user with conversation history or a rolling summary depend
+      on that private context, so they are never cached;
+    - error replies are never stored (see ResponseCache.set).
+    """
+    return not history and not summary
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, latency, expires_at)
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0], entry[1]
+
+    async def set(self, key, value, latency, ttl):
+        self._entries[key] = (value, latency, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SqliteBackend:
+    """Stores entries in the bot database's response_cache table."""
+
+    PURGE_EVERY = 100
+
+    def __init__(self):
+        self._sets = 0
+
+    async def get(self, key):
+        return await run_db(get_cached_response, key, time.time())
+
+    async def set(self, key, value, latency, ttl):
+        now = time.time()
+        await run_db(set_cached_response, key, value, latency, now + ttl)
+        self._sets += 1
+        if self._sets % self.PURGE_EVERY == 0:
+            await run_db(purge_cached_responses, now)
+
+
+class ResponseCache:
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    async def get(self, key):
+        if self.backend is None:
+            return None
+        try:
+            entry = await self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Response cache read failed: {e}")
+            return None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_seconds += entry[1]
+        return entry[0]
+
+    async def set(self, key, value, latency, ttl=RESPONSE_CACHE_TTL):
+        if self.backend is None or not value:
+            return
+        # Never cache failures or configuration warnings
+        if value.startswith(("Error", "⚠️")):
+            return
+        try:
+            await self.backend.set(key, value, latency, ttl)
+        except Exception as e:
+            logger.error(f"Response cache write failed: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else "off",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
+
+
+def _make_backend():
+    if RESPONSE_CACHE_BACKEND == "off":
+        return None
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        return SqliteBackend()
+    return MemoryBackend()
+
+
+response_cache = ResponseCache(_make_backend())
@@ -0,0 +1,192 @@
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Worker tasks running AI jobs (each user has at most one job in flight)
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "8"))
+# Global token bucket aligned with the Groq plan's request rate
+SCHEDULER_RATE_PER_MINUTE = float(os.getenv("SCHEDULER_RATE_PER_MINUTE", "30"))
+SCHEDULER_BURST = int(os.getenv("SCHEDULER_BURST", "10"))
+# Backpressure: beyond these queue depths new jobs are rejected
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "200"))
+SCHEDULER_MAX_PER_USER = int(os.getenv("SCHEDULER_MAX_PER_USER", "3"))
+
+WAIT_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60)
+
+
+class SchedulerBusy(Exception):
+    """Raised when a job is rejected because the queues are full."""
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second, burst):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _consume_exception(future):
+    # The worker already logged the failure; don't warn again when nobody awaits the future
+    if not future.cancelled():
+        future.exception()
+
+
+class _Job:
+    __slots__ = ("run", "text", "future", "enqueued_at", "context")
+
+    def __init__(self, run, text, future):
+        self.run = run
+        self.text = text
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        # Run the job in the submitter's context so its trace spans follow it
+        self.context = contextvars.copy_context()
+
+
+class AIScheduler:
+    """
+    Sits between the handlers and the AI service.
+
+    - one in-flight job per user; text messages sent while an earlier one is
+      still queued are coalesced into it
+    - users with queued work are served round-robin, so one busy user can't
+      starve the others
+    - every job takes a token from a global bucket before it runs
+    - once the global or per-user queue is full, submit raises SchedulerBusy
+
+    Callers only wait for admission: jobs are expected to deliver their own
+    results (the handlers' jobs send the reply), so a Telegram update slot
+    is never held while a job waits for its turn.
+    """
+
+    def __init__(self, workers=SCHEDULER_WORKERS, rate_per_minute=SCHEDULER_RATE_PER_MINUTE,
+                 burst=SCHEDULER_BURST, max_queue=SCHEDULER_MAX_QUEUE, max_per_user=SCHEDULER_MAX_PER_USER):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.bucket = TokenBucket(rate_per_minute / 60, burst)
+
+        self._queues = {}  # user_id -> queued jobs, only while the user has work
+        self._ready = deque()  # users with queued work and nothing in flight
+        self._in_flight = set()
+        self._wakeup = asyncio.Condition()
+        self._tasks = []
+
+        self.depth = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS) + 1)
+
+    async def submit(self, user_id, run, text=None):
+        """
+        Queue run(text) for the user and return a future for its result
+        without waiting for the job to run. Failed jobs are logged here, so
+        the future may be ignored.
+
+        Returns None without queueing anything when text was merged into the
+        user's already-queued job; that job answers for both.
+        """
+        queue = self._queues.get(user_id)
+        if text is not None and queue and queue[-1].text is not None:
+            queue[-1].text += "\n" + text
+            self.coalesced += 1
+            return None
+
+        if self.depth >= self.max_queue or (queue is not None and len(queue) >= self.max_per_user):
+            self.rejected += 1
+            raise SchedulerBusy()
+
+        # Created only when a job is actually enqueued; the worker deletes it once drained
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+        job = _Job(run, text, asyncio.get_running_loop().create_future())
+        job.future.add_done_callback(_consume_exception)
+        queue.append(job)
+        self.depth += 1
+        async with self._wakeup:
+            if user_id not in self._in_flight and user_id not in self._ready:
+                self._ready.append(user_id)
+                self._wakeup.notify()
+        return job.future
+
+    def _record_wait(self, seconds):
+        for index, bound in enumerate(WAIT_BUCKETS):
+            if seconds <= bound:
+                self.wait_histogram[index] += 1
+                return
+        self.wait_histogram[-1] += 1
+
+    async def _worker(self):
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: self._ready)
+                user_id = self._ready.popleft()
+                self._in_flight.add(user_id)
+
+            queue = self._queues[user_id]
+            job = queue.popleft()
+            self.depth -= 1
+            try:
+                await self.bucket.acquire()
+                self._record_wait(time.monotonic() - job.enqueued_at)
+                if not job.future.cancelled():
+                    try:
+                        result = await asyncio.create_task(job.run(job.text), context=job.context)
+                    except Exception as e:
+                        logger.error(f"AI job for user {user_id} failed: {e}")
+                        if not job.future.cancelled():
+                            job.future.set_exception(e)
+                    else:
+                        if not job.future.cancelled():
+                            job.future.set_result(result)
+            finally:
+                async with self._wakeup:
+                    self._in_flight.discard(user_id)
+                    if queue:
+                        # Back of the line: other waiting users go first
+                        self._ready.append(user_id)
+                        self._wakeup.notify()
+                    else:
+                        del self._queues[user_id]
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        labels = [f"<={bound}s" for bound in WAIT_BUCKETS] + [f">{WAIT_BUCKETS[-1]}s"]
+        return {
+            "queue_depth": self.depth,
+            "in_flight": len(self._in_flight),
+            "waiting_users": len(self._ready),
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "wait_histogram": dict(zip(labels, self.wait_histogram)),
+        }
+
+
+ai_scheduler = AIScheduler()
@@ -0,0 +1,127 @@
+"""
+Update sharding across worker processes.
+
+With WORKER_PROCESSES > 1 the main process only receives updates (polling
+or webhook) and forwards each one to worker number user_id % N over a
+multiprocessing queue (the chat id when an update has no user). Every
+worker runs the full bot with its own event loop, so CPU-heavy work (image
+resizing, audio splitting) uses all cores, while all updates of a user
+still reach the same worker in order.
+
+State that must be shared lives in the database (see DATABASE_URL). The
+in-process state (conversation cache, model preferences, AI scheduler
+queues, pending reminders) is keyed by user id, and a user always lands
+on the same worker, so each user's entries live in exactly one process.
+That holds for private chats; in a group, messages from different users
+go to different workers. Jobs that must run once per deployment check
+is_primary(), and reminders are sent by the worker that owns the user.
+"""
+import os
+import signal
+import asyncio
+import logging
+import multiprocessing
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+logger = logging.getLogger(__name__)
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+
+# Set in each worker process by _worker_main; a lone process owns every chat
+SHARD_INDEX = 0
+SHARD_COUNT = 1
+
+
+def shard_for(key: int, count: int) -> int:
+    return key % count
+
+
+def owns_user(user_id: int) -> bool:
+    """Whether this process is responsible for the user (reminders, replies)."""
+    return shard_for(user_id, SHARD_COUNT) == SHARD_INDEX
+
+
+def is_primary() -> bool:
+    """Whether this process runs the once-per-deployment jobs (e.g. Google sync)."""
+    return SHARD_INDEX == 0
+
+
+def _update_key(update: Update) -> int:
+    # In-process state is keyed by user id, so shard on the user
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return update.update_id
+
+
+async def _serve(app, queue):
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+    try:
+        while True:
+            data = await asyncio.to_thread(queue.get)
+            if data is None:
+                break
+            await app.update_queue.put(Update.de_json(data, app.bot))
+    finally:
+        await app.stop()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+        await app.shutdown()
+
+
+def _worker_main(build_app, shard, count, queue):
+    global SHARD_INDEX, SHARD_COUNT
+    # Ctrl+C reaches the whole process group; workers stop when the
+    # dispatcher sends the sentinel, after it has stopped receiving
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    SHARD_INDEX, SHARD_COUNT = shard, count
+    from bot.metrics import start_metrics_server
+    start_metrics_server(offset=1 + shard)
+    asyncio.run(_serve(build_app(updater=False), queue))
+
+
+class WorkerPool:
+    """Worker processes plus the dispatcher handler that feeds them."""
+
+    def __init__(self, build_app, count=WORKER_PROCESSES):
+        self.build_app = build_app
+        self.count = count
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = []
+        self._processes = []
+
+    def start(self):
+        for shard in range(self.count):
+            queue = self._context.Queue()
+            process = self._context.Process(
+                target=_worker_main, args=(self.build_app, shard, self.count, queue),
+                name=f"bot-worker-{shard}", daemon=False,
+            )
+            process.start()
+            self._queues.append(queue)
+            self._processes.append(process)
+        logger.info(f"Started {self.count} worker processes")
+
+    async def _forward(self, update: Update, context):
+        shard = shard_for(_update_key(update), self.count)
+        self._queues[shard].put(update.to_dict())
+
+    def attach(self, app):
+        """Make the dispatcher app forward every update instead of handling it."""
+        app.add_handler(TypeHandler(Update, self._forward))
+
+    def stop(self, timeout=30):
+        """Let each worker drain what it was sent, then wait for it to exit."""
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in {timeout}s, terminating")
+                process.terminate()
@@ -0,0 +1,124 @@
+"""
+Cold-start helpers.
+
+STARTUP_PROFILE=1 times every module imported while the bot starts and the
+init phases in main.py, and logs the slowest ones before polling begins.
+WARMUP lists integrations (groq, google, pil, external) that are loaded in
+the background once the bot is running, so the first user doesn't wait on
+them; anything not listed stays lazy until first use.
+"""
+import os
+import sys
+import time
+import asyncio
+import builtins
+import importlib
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+STARTUP_PROFILE_TOP = int(os.getenv("STARTUP_PROFILE_TOP", "15"))
+WARMUP = [name.strip() for name in os.getenv("WARMUP", "").split(",") if name.strip()]
+
+_started = time.perf_counter()
+_import_times = {}
+_phase_times = []
+_original_import = None
+
+
+def enable_import_profile():
+    """Time each first import of a module (nested imports included) from now on."""
+    global _original_import
+    if _original_import is not None:
+        return
+    _original_import = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return _original_import(name, globals, locals, fromlist, level)
+        start = time.perf_counter()
+        try:
+            return _original_import(name, globals, locals, fromlist, level)
+        finally:
+            _import_times.setdefault(name, time.perf_counter() - start)
+
+    builtins.__import__ = timed_import
+
+
+@contextmanager
+def phase(name):
+    """Record how long an init phase of main() takes."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phase_times.append((name, time.perf_counter() - start))
+
+
+def report():
+    """Log the startup profile and restore the normal import function."""
+    global _original_import
+    if _original_import is not None:
+        builtins.__import__ = _original_import
+        _original_import = None
+    if not STARTUP_PROFILE:
+        return
+
+    lines = [f"Startup profile: {(time.perf_counter() - _started) * 1000:.0f} ms until ready"]
+    slowest = sorted(_import_times.items(), key=lambda item: item[1], reverse=True)
+    for name, seconds in slowest[:STARTUP_PROFILE_TOP]:
+        lines.append(f"  import {name}: {seconds * 1000:.1f} ms")
+    for name, seconds in _phase_times:
+        lines.append(f"  init {name}: {seconds * 1000:.1f} ms")
+    logger.info("\n".join(lines))
+
+
+async def _warm_groq():
+    from bot.ai_service import get_client
+    await asyncio.to_thread(get_client)
+
+
+async def _warm_google():
+    from bot.google_services import google_configured, run_google, warm_up
+    if google_configured():
+        await run_google(warm_up)
+
+
+async def _warm_pil():
+    await asyncio.to_thread(importlib.import_module, "PIL.Image")
+
+
+async def _warm_external():
+    from bot.external_integration import external_client
+    await external_client.login()
+
+
+WARMERS = {
+    "groq": _warm_groq,
+    "google": _warm_google,
+    "pil": _warm_pil,
+    "external": _warm_external,
+}
+
+
+async def warm_up(names=None):
+    """Initialize the given integrations one after another, logging failures."""
+    for name in names if names is not None else WARMUP:
+        warmer = WARMERS.get(name)
+        if warmer is None:
+            logger.warning(f"Unknown WARMUP entry: {name}")
+            continue
+        start = time.perf_counter()
+        try:
+            await warmer()
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
+        else:
+            logger.info(f"Warmed up {name} in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+async def warm_up_job(context):
+    """JobQueue callback so warm-up starts once polling/webhook is running."""
+    await warm_up()
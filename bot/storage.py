@@ -0,0 +1,189 @@
+"""
+Storage backends behind bot/db.py.
+
+db.py writes its queries once, in SQL both engines accept (qmark
+placeholders, ON CONFLICT upserts, RETURNING), and gets its connections
+from the configured backend:
+
+- SQLiteBackend: a local file, fine for a single host (several worker
+  processes can share it thanks to WAL).
+- PostgresBackend: a shared server for deployments spread over several
+  hosts. Needs the optional `psycopg[binary]` package.
+
+Each backend keeps its own migration list and records the applied version
+its own way.
+"""
+import os
+import re
+import sqlite3
+from urllib.parse import urlsplit
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    # A single writer thread avoids SQLITE_BUSY between our own connections
+    workers = 1
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, cached_statements=128)
+        # Only takes effect while the file is still empty (see vacuum)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-8000")  # ~8 MB page cache
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def is_usable(self, conn):
+        return True
+
+    def database_size(self, conn):
+        return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+    def table_sizes(self, conn):
+        """Bytes per table and index, or {} if SQLite was built without dbstat."""
+        try:
+            return dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+        except sqlite3.OperationalError:
+            return {}
+
+    def vacuum(self, conn, max_pages):
+        """
+        Give at most max_pages free pages back to the filesystem and return
+        True, or return False if the file doesn't use incremental
+        auto-vacuum. New files get it on creation; older ones need a one-off
+        full VACUUM, which locks the database for its whole run and is
+        therefore left to the operator (see DEPLOY.md).
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return False
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        return True
+
+    def migrate(self, conn, migrations):
+        """Apply pending migrations; PRAGMA user_version records how many ran."""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in enumerate(migrations[version:], start=version + 1):
+            # executescript commits first; bump user_version in the same script
+            conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+
+
+_qmark = re.compile(r"'[^']*'|\?|%")
+
+
+def _to_pyformat(sql):
+    """Rewrite qmark placeholders as %s and escape every literal % (psycopg scans string literals too)."""
+    def replace(match):
+        token = match.group()
+        if token == "?":
+            return "%s"
+        return token.replace("%", "%%")
+    return _qmark.sub(replace, sql)
+
+
+class _PostgresConnection:
+    """
+    Thin adapter giving a psycopg connection the sqlite3 calling convention
+    used throughout db.py: execute/executemany with qmark placeholders, and
+    `with conn:` as a transaction (commit on success, rollback on error).
+    Outside a `with` block every statement autocommits.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._transactions = []
+        self._sql = {}
+
+    def _translate(self, sql):
+        translated = self._sql.get(sql)
+        if translated is None:
+            translated = self._sql[sql] = _to_pyformat(sql)
+        return translated
+
+    def execute(self, sql, params=()):
+        return self._conn.execute(self._translate(sql), params)
+
+    def executemany(self, sql, rows):
+        cursor = self._conn.cursor()
+        cursor.executemany(self._translate(sql), rows)
+        return cursor
+
+    def executescript(self, script):
+        # No parameters: psycopg sends the script as one multi-statement query
+        self._conn.execute(script)
+
+    def __enter__(self):
+        transaction = self._conn.transaction()
+        transaction.__enter__()
+        self._transactions.append(transaction)
+        return self
+
+    def __exit__(self, *exc):
+        return self._transactions.pop().__exit__(*exc)
+
+    @property
+    def closed(self):
+        return self._conn.closed or self._conn.broken
+
+    def close(self):
+        self._conn.close()
+
+
+class PostgresBackend:
+    name = "postgres"
+
+    def __init__(self, url, workers=DB_POOL_SIZE):
+        self.url = url
+        # One connection per DB worker thread: the executor is the pool
+        self.workers = workers
+
+    def connect(self):
+        import psycopg
+        return _PostgresConnection(psycopg.connect(self.url, autocommit=True))
+
+    def is_usable(self, conn):
+        return not conn.closed
+
+    def database_size(self, conn):
+        return conn.execute("SELECT pg_database_size(current_database())").fetchone()[0]
+
+    def table_sizes(self, conn):
+        return dict(conn.execute(
+            "SELECT relname, pg_total_relation_size(relid) FROM pg_stat_user_tables"
+        ).fetchall())
+
+    def vacuum(self, conn, max_pages):
+        # Space is reused rather than returned; autovacuum usually gets there first
+        for table in ("conversations", "memory_postings"):
+            conn.execute(f"VACUUM (ANALYZE) {table}")
+        return True
+
+    def migrate(self, conn, migrations):
+        """
+        Apply pending migrations; the schema_version table records how many
+        ran. An advisory lock keeps processes starting together from racing.
+        """
+        with conn:
+            conn.execute("SELECT pg_advisory_xact_lock(hashtext('bot_schema_migrations'))")
+            conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+            row = conn.execute("SELECT version FROM schema_version").fetchone()
+            version = row[0] if row else 0
+            for script in migrations[version:]:
+                conn.executescript(script)
+            if row is None:
+                conn.execute("INSERT INTO schema_version (version) VALUES (?)", (len(migrations),))
+            else:
+                conn.execute("UPDATE schema_version SET version = ?", (len(migrations),))
+
+
+def create_backend(database_url=None, db_path="bot_data.db"):
+    """Use PostgreSQL when DATABASE_URL is a postgres:// URL, otherwise the SQLite file."""
+    if database_url and urlsplit(database_url).scheme in ("postgres", "postgresql"):
+        return PostgresBackend(database_url)
+    return SQLiteBackend(db_path)
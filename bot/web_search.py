@@ -1,7 +1,15 @@
 import os
-import requests
+import time
+import httpx
+from bot import resilience
+from bot.http_client import request
+from bot.response_cache import response_cache, make_key, SEARCH_CACHE_TTL
+from bot.metrics import instrument
 
-def google_search(query):
+SEARCH_URL = os.getenv("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
+
+@instrument("web_search")
+async def google_search(query):
     """
     Perform a Google search using the Custom Search JSON API.
     """
@@ -11,7 +19,7 @@ def google_search(query):
     if not api_key or not cx:
         return "⚠️ Google Search API Key or CX not configured."
 
-    url = "https://www.googleapis.com/customsearch/v1"
+    url = SEARCH_URL
     params = {
         "key": api_key,
         "cx": cx,
@@ -19,9 +27,13 @@ def google_search(query):
         "num": 3 # Limit to top 3 results
     }
 
-    try:
-        response = requests.get(url, params=params)
+    async def fetch():
+        response = await request("GET", url, params=params)
         response.raise_for_status()
+        return response
+
+    try:
+        response = await resilience.call("search", fetch, transient=(httpx.TransportError,))
         results = response.json().get("items", [])
         
         if not results:
@@ -35,5 +47,23 @@ def google_search(query):
             formatted_results += f"• [{title}]({link})\n_{snippet}_\n\n"
         
         return formatted_results
+    except resilience.CircuitOpenError:
+        return "⚠️ Busca indisponível no momento. Tente novamente em instantes."
     except Exception as e:
         return f"Error performing search: {str(e)}"
+
+async def cached_google_search(query):
+    """
+    google_search behind the response cache (keyed by the normalized query).
+    """
+    key = make_key("search", query)
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    started = time.monotonic()
+    result = await google_search(query)
+    # Don't serve an outage or error message from the cache after the service recovers
+    if not result.startswith(("⚠️", "Error")):
+        await response_cache.set(key, result, time.monotonic() - started, ttl=SEARCH_CACHE_TTL)
+    return result
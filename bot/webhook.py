@@ -0,0 +1,139 @@
+import os
+import asyncio
+import secrets
+import logging
+from contextlib import asynccontextmanager, contextmanager
+
+import uvicorn
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public base URL, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Must be the same on every replica, since the last setWebhook call wins
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+PORT = int(os.getenv("PORT", "8080"))
+# Seconds between SIGTERM and closing the listener, so load balancers see /readyz fail first
+WEBHOOK_DRAIN_SECONDS = float(os.getenv("WEBHOOK_DRAIN_SECONDS", "0"))
+
+
+def build_web_app(app, state=None):
+    """
+    Starlette app that feeds Telegram updates into the bot Application.
+    `state` is shared with the server so a stop signal can start draining.
+    """
+    state = state if state is not None else {"draining": False}
+
+    async def telegram_update(request: Request):
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return Response(status_code=403)
+        if state["draining"]:
+            # Telegram retries non-2xx deliveries, so another replica picks it up
+            return Response(status_code=503)
+        update = Update.de_json(await request.json(), app.bot)
+        await app.update_queue.put(update)
+        return Response()
+
+    async def healthz(request: Request):
+        return PlainTextResponse("ok")
+
+    async def readyz(request: Request):
+        if app.running and not state["draining"]:
+            return PlainTextResponse("ready")
+        return PlainTextResponse("not ready", status_code=503)
+
+    async def metrics(request: Request):
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+    @asynccontextmanager
+    async def lifespan(_):
+        yield
+        state["draining"] = True
+
+    return Starlette(
+        routes=[
+            Route(WEBHOOK_PATH, telegram_update, methods=["POST"]),
+            Route("/healthz", healthz, methods=["GET"]),
+            Route("/readyz", readyz, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn server that starts draining the web app on SIGTERM/SIGINT. The
+    app's shutdown hooks only run once uvicorn has stopped serving, too late
+    to turn deliveries away; the signal handler runs first.
+    """
+
+    def __init__(self, config, state, drain_seconds=WEBHOOK_DRAIN_SECONDS):
+        super().__init__(config)
+        self.state = state
+        self.drain_seconds = drain_seconds
+        self._loop = None
+
+    async def serve(self, sockets=None):
+        self._loop = asyncio.get_running_loop()
+        await super().serve(sockets)
+
+    @contextmanager
+    def capture_signals(self):
+        with super().capture_signals():
+            yield
+            # uvicorn re-raises the stop signal once serving ends, which would kill the
+            # process before run_webhook stops the Application and flushes its state
+            self._captured_signals.clear()
+
+    def handle_exit(self, sig, frame):
+        if not self.state["draining"] and self.drain_seconds > 0 and self._loop is not None:
+            self.state["draining"] = True
+            logger.info(f"Draining for {self.drain_seconds:g}s before stopping")
+            self._loop.call_soon_threadsafe(
+                self._loop.call_later, self.drain_seconds, super().handle_exit, sig, frame
+            )
+            return
+        self.state["draining"] = True
+        super().handle_exit(sig, frame)
+
+
+async def run_webhook(app):
+    """
+    Serve the bot over a webhook until SIGTERM/SIGINT. The signal marks the
+    replica as draining (503 on /readyz and new deliveries, which Telegram
+    retries), then uvicorn stops accepting connections and finishes in-flight
+    requests; the Application processes what is left in its update queue
+    before shutting down.
+    """
+    if not WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+
+    state = {"draining": False}
+    server = DrainingServer(
+        uvicorn.Config(build_web_app(app, state), host="0.0.0.0", port=PORT, log_level="info"), state
+    )
+
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        await app.start()
+        try:
+            await server.serve()
+        finally:
+            await app.stop()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
@@ -1,41 +1,87 @@
 import os
+import asyncio
 import logging
 from dotenv import load_dotenv
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
+
+# Load environment variables before any bot module reads its settings at import time
+load_dotenv()
+
+from bot import startup
+if startup.STARTUP_PROFILE:
+    startup.enable_import_profile()
+from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from bot.handlers import (
     start_command, help_command, handle_message,
-    add_task_command, list_tasks_command, complete_task_command,
+    add_task_command, list_tasks_command, list_tasks_callback, complete_task_command,
     search_command, app_status_command,
     handle_photo, handle_audio,
     gmail_command, drive_command, calendar_command, docs_command,
+    stats_command, model_command,
 )
 from bot.db import init_db
-
-# Load environment variables
-load_dotenv()
+from bot.conversation_cache import conversation_cache
+from bot.http_client import close_http_client
+from bot.scheduler import ai_scheduler
+from bot.reminders import reminder_engine
+from bot.google_services import GOOGLE_SYNC_INTERVAL, google_configured, sync_job
+from bot import sharding
+from bot.maintenance import MAINTENANCE_INTERVAL, maintenance_job
 
 # Logging setup
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
+logger = logging.getLogger(__name__)
 
-def main():
-    # Initialize Database
-    init_db()
+async def post_init(app):
+    with startup.phase("post_init"):
+        conversation_cache.start()
+        ai_scheduler.start()
+        reminder_engine.start(app.job_queue)
+    startup.report()
+    if startup.WARMUP:
+        app.job_queue.run_once(startup.warm_up_job, 0, name="warm-up")
+    if google_configured() and GOOGLE_SYNC_INTERVAL > 0 and sharding.is_primary():
+        app.job_queue.run_repeating(sync_job, interval=GOOGLE_SYNC_INTERVAL, first=5, name="google-sync")
+    if MAINTENANCE_INTERVAL > 0 and sharding.is_primary():
+        app.job_queue.run_repeating(maintenance_job, interval=MAINTENANCE_INTERVAL, first=60, name="db-maintenance")
 
-    token = os.getenv("TELEGRAM_TOKEN")
-    if not token:
-        print("Error: TELEGRAM_TOKEN not found in .env")
-        return
+async def post_shutdown(app):
+    await ai_scheduler.stop()
+    # Write-behind cache: make sure no conversation messages are lost on exit
+    await conversation_cache.stop()
+    logger.info(f"Conversation cache stats: {conversation_cache.stats()}")
+    await close_http_client()
 
-    app = ApplicationBuilder().token(token).build()
+def _builder():
+    builder = ApplicationBuilder().token(os.getenv("TELEGRAM_TOKEN"))
+    # Point the bot at a local Bot API server or stand-in (load tests)
+    telegram_api_url = os.getenv("TELEGRAM_API_URL")
+    if telegram_api_url:
+        telegram_api_url = telegram_api_url.rstrip("/")
+        builder = builder.base_url(f"{telegram_api_url}/bot").base_file_url(f"{telegram_api_url}/file/bot")
+    return builder
+
+def build_application(updater=True):
+    """The full bot. Worker processes build it without an updater and are fed updates by the dispatcher."""
+    builder = (
+        _builder()
+        # Handlers wait on the AI scheduler, so updates must not be processed one at a time
+        .concurrent_updates(int(os.getenv("CONCURRENT_UPDATES", "64")))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if not updater:
+        builder = builder.updater(None)
+    app = builder.build()
 
     # Commands
     app.add_handler(CommandHandler("start", start_command))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("task", add_task_command))
     app.add_handler(CommandHandler("list", list_tasks_command))
+    app.add_handler(CallbackQueryHandler(list_tasks_callback, pattern=r"^tasks:"))
     app.add_handler(CommandHandler("done", complete_task_command))
     app.add_handler(CommandHandler("search", search_command))
     app.add_handler(CommandHandler("gmail", gmail_command))
@@ -43,15 +89,50 @@ def main():
     app.add_handler(CommandHandler("calendar", calendar_command))
     app.add_handler(CommandHandler("docs", docs_command))
     app.add_handler(CommandHandler("app_status", app_status_command))
+    app.add_handler(CommandHandler("stats", stats_command))
+    app.add_handler(CommandHandler("model", model_command))
 
     # Messages (Text) - Make sure this is last so it doesn't block commands if using filters.text
     # Note: CommandHandler handles commands, MessageHandler handles non-command text.
     app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
     app.add_handler(MessageHandler(filters.VOICE | filters.AUDIO, handle_audio))
     app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
+    return app
+
+def main():
+    # Initialize Database
+    with startup.phase("init_db"):
+        init_db()
+
+    if not os.getenv("TELEGRAM_TOKEN"):
+        print("Error: TELEGRAM_TOKEN not found in .env")
+        return
+
+    workers = None
+    with startup.phase("build_application"):
+        if sharding.WORKER_PROCESSES > 1:
+            # This process only receives updates, in order, and hands them to the workers
+            workers = sharding.WorkerPool(build_application)
+            workers.start()
+            app = _builder().build()
+            workers.attach(app)
+            startup.report()
+        else:
+            app = build_application()
 
-    print("Bot is running...")
-    app.run_polling()
+    try:
+        if os.getenv("BOT_MODE", "polling") == "webhook":
+            from bot.webhook import run_webhook
+            print("Bot is running (webhook)...")
+            asyncio.run(run_webhook(app))
+        else:
+            from bot.metrics import start_metrics_server
+            start_metrics_server()
+            print("Bot is running...")
+            app.run_polling()
+    finally:
+        if workers is not None:
+            workers.stop()
 
 if __name__ == '__main__':
     main()
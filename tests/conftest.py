@@ -0,0 +1,29 @@
+import os
+import sys
+import json
+import tempfile
+import threading
+
+import pytest
+
+# Run against a throwaway SQLite file, never a developer's bot_data.db or DATABASE_URL
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="raizito-tests-"), "bot_data.db")
+os.environ.pop("DATABASE_URL", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_google(monkeypatch):
+    """A local Google API stand-in, with the bot's Google clients pointed at it."""
+    from benchmarks.fakes import FakeGoogle, service_account_info
+    from bot import google_services
+
+    with FakeGoogle(messages=0) as stand_in:
+        monkeypatch.setenv("GOOGLE_SERVICE_ACCOUNT_JSON", json.dumps(service_account_info(stand_in.url + "/token")))
+        monkeypatch.setattr(google_services, "GOOGLE_API_ENDPOINT", stand_in.url)
+        monkeypatch.setattr(google_services, "GOOGLE_DELEGATED_USER", None)
+        # Credentials and per-thread clients are cached; don't reuse ones built for another server
+        monkeypatch.setattr(google_services, "_credentials_cache", {})
+        monkeypatch.setattr(google_services, "_local", threading.local())
+        yield stand_in
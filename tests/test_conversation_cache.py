@@ -0,0 +1,36 @@
+import asyncio
+
+from bot import db
+from bot import conversation_cache as conversation_cache_module
+from bot.conversation_cache import ConversationCache
+
+USER_ID = 6161
+
+
+def test_stop_waits_for_running_compactions(monkeypatch):
+    db.init_db()
+    summarized = []
+
+    async def slow_summary(previous, messages):
+        await asyncio.sleep(0.05)
+        summarized.extend(m["content"] for m in messages)
+        return "resumo"
+
+    monkeypatch.setattr(conversation_cache_module, "summarize_conversation", slow_summary)
+
+    async def scenario():
+        cache = ConversationCache(window=2, summary_trigger_tokens=1)
+        await cache.get_history(USER_ID)
+        for n in range(3):
+            cache.append(USER_ID, "user", f"mensagem {n}")
+        # The third message pushed the first out of the window and started a compaction
+        assert cache._compactions
+        await cache.stop()
+        return cache
+
+    cache = asyncio.run(scenario())
+
+    assert summarized == ["mensagem 0"]
+    assert not cache._compactions
+    assert db.get_conversation_summary(USER_ID) == "resumo"
+    assert [m["content"] for m in db.get_conversation_history(USER_ID)] == ["mensagem 0", "mensagem 1", "mensagem 2"]
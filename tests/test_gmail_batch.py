@@ -0,0 +1,61 @@
+import time
+import logging
+
+import pytest
+
+from bot import google_services
+
+MESSAGE_IDS = [f"m{i:03d}" for i in range(120)]
+
+
+@pytest.fixture
+def gmail(fake_google, monkeypatch):
+    fake_google.latency = 0.05
+    monkeypatch.setattr(google_services, "GMAIL_BATCH_RETRY_DELAY", 0)
+    service = google_services._get_service("gmail", "v1", google_services.GMAIL_SCOPES)
+    return fake_google, service
+
+
+def _fetch(service):
+    started = time.perf_counter()
+    details = google_services._fetch_email_metadata(service, MESSAGE_IDS)
+    return [d["id"] for d in details], time.perf_counter() - started
+
+
+def test_batches_of_50_load_every_message_in_three_round_trips(gmail):
+    google, service = gmail
+
+    ids, elapsed = _fetch(service)
+
+    assert ids == MESSAGE_IDS
+    assert google.requests["gmail.batch"] == 3
+    assert google.requests["gmail.batch_part_429"] == 0
+    assert google.requests["gmail.get"] == 0
+    # One get per message would take 120 round trips of 50 ms
+    assert elapsed < 120 * google.latency / 4
+
+
+def test_rate_limited_parts_are_retried_in_a_new_batch(gmail, monkeypatch):
+    google, service = gmail
+    monkeypatch.setattr(google_services, "GMAIL_BATCH_SIZE", 100)
+
+    ids, _ = _fetch(service)
+
+    assert ids == MESSAGE_IDS
+    # 100 + 20 parts; the 50 over the fake's limit come back 429 and go out again together
+    assert google.requests["gmail.batch_part_429"] == 50
+    assert google.requests["gmail.batch"] == 3
+
+
+def test_parts_still_failing_after_the_retry_are_logged_and_skipped(gmail, caplog):
+    google, service = gmail
+    google.batch_part_limit = 10
+
+    with caplog.at_level(logging.WARNING, logger=google_services.__name__):
+        ids, _ = _fetch(service)
+
+    # First pass: 3 batches load 10 each; retry: 90 failures in 2 batches load 10 each
+    assert len(ids) == 50
+    assert ids == sorted(ids)
+    assert google.requests["gmail.batch"] == 5
+    assert "70 of 120 messages failed to load" in caplog.text
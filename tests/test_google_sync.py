@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+import pytest
+
+from bot import db, google_services
+
+
+@pytest.fixture
+def mirror(fake_google, monkeypatch):
+    db.init_db()
+    # Forget mirrors and tokens left by other tests
+    db.apply_drive_changes([], [], None, full=True)
+    db.apply_calendar_changes([], [], None, full=True)
+
+    writes = []
+
+    def on_db_thread(apply):
+        def wrapper(*args, **kwargs):
+            writes.append(threading.current_thread().name)
+            return apply(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(google_services, "apply_drive_changes", on_db_thread(db.apply_drive_changes))
+    monkeypatch.setattr(google_services, "apply_calendar_changes", on_db_thread(db.apply_calendar_changes))
+    return fake_google, writes
+
+
+def _drive_names():
+    return sorted(name for name, _, _ in db.search_drive_files(limit=1000))
+
+
+def _event_titles():
+    now = "2000-01-01T00:00:00"
+    return sorted(summary for summary, _ in db.search_calendar_events(now, limit=1000))
+
+
+def test_drive_sync_applies_full_listing_then_deltas_on_the_db_thread(mirror):
+    google, writes = mirror
+    for i in range(3):
+        google.put_file(f"f{i}", f"Arquivo {i}.pdf")
+
+    assert asyncio.run(google_services.sync_drive()) == 3
+    assert _drive_names() == ["Arquivo 0.pdf", "Arquivo 1.pdf", "Arquivo 2.pdf"]
+
+    google.put_file("f1", "Renomeado.pdf")
+    google.remove_file("f2")
+    listings = google.requests["drive.files"]
+
+    assert asyncio.run(google_services.sync_drive()) == 2
+    assert _drive_names() == ["Arquivo 0.pdf", "Renomeado.pdf"]
+    assert google.requests["drive.files"] == listings
+    assert writes and all(name.startswith("bot-db") for name in writes)
+
+
+def test_calendar_sync_resyncs_when_the_token_expires(mirror):
+    google, writes = mirror
+    google.put_event("e1", "Reunião")
+    google.put_event("e2", "Almoço")
+
+    assert asyncio.run(google_services.sync_calendar()) == 2
+
+    google.cancel_event("e2")
+    assert asyncio.run(google_services.sync_calendar()) == 1
+    assert _event_titles() == ["Reunião"]
+
+    google.put_event("e3", "Dentista")
+    google.expire_sync_tokens()
+    assert asyncio.run(google_services.sync_calendar()) == 2
+    assert _event_titles() == ["Dentista", "Reunião"]
+    assert writes and all(name.startswith("bot-db") for name in writes)
+
+
+def test_sync_all_keeps_going_when_one_api_fails(mirror):
+    google, _ = mirror
+    google.put_file("f1", "Arquivo.pdf")
+    google.put_event("e1", "Reunião")
+    google.inject(status=403, path="/files")
+
+    asyncio.run(google_services.sync_all())
+
+    assert _drive_names() == []
+    assert _event_titles() == ["Reunião"]
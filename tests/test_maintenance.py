@@ -0,0 +1,37 @@
+import sqlite3
+
+from bot.storage import SQLiteBackend
+
+
+def _fill_and_empty(conn):
+    conn.execute("CREATE TABLE blobs (data BLOB)")
+    with conn:
+        conn.executemany("INSERT INTO blobs VALUES (?)", [(b"x" * 4000,) for _ in range(500)])
+    with conn:
+        conn.execute("DELETE FROM blobs")
+
+
+def test_new_files_use_incremental_vacuum(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "new.db"))
+    conn = backend.connect()
+    _fill_and_empty(conn)
+    before = backend.database_size(conn)
+
+    assert backend.vacuum(conn, max_pages=100) is True
+    assert backend.database_size(conn) < before
+
+
+def test_legacy_files_are_not_fully_vacuumed_by_the_job(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute("PRAGMA journal_mode=WAL")
+    _fill_and_empty(legacy)
+    legacy.close()
+
+    backend = SQLiteBackend(path)
+    conn = backend.connect()
+    before = backend.database_size(conn)
+
+    assert backend.vacuum(conn, max_pages=100) is False
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    assert backend.database_size(conn) == before
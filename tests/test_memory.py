@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime
+
+from bot import db
+from bot.memory import SemanticMemory
+
+USER_ID = 5151
+
+
+def _rows(*texts):
+    now = datetime.utcnow().isoformat()
+    return [(USER_ID, "user", text, now) for text in texts]
+
+
+def _recall(memory, query):
+    return [m["content"] for m in asyncio.run(memory.recall(USER_ID, query))]
+
+
+def test_rows_are_indexed_in_the_transaction_that_writes_them():
+    db.init_db()
+    memory = SemanticMemory(k=2, min_score=0.0)
+    # Another process already moved the watermark past ids this flush will get
+    db.log_conversation_rows(_rows("filler one"), memory.terms_for(_rows("filler one")), watermark=True)
+    db.log_conversation_rows(_rows("unrelated"), memory.terms_for(_rows("unrelated")), watermark=True)
+
+    rows = _rows("minha placa de vídeo superaquece jogando", "receita de bolo de cenoura")
+    db.log_conversation_rows(rows, memory.terms_for(rows))
+
+    assert _recall(memory, "placa de vídeo superaquecendo")[0] == "minha placa de vídeo superaquece jogando"
+
+
+def test_backfill_indexes_rows_stored_without_postings():
+    db.init_db()
+    memory = SemanticMemory(k=1, min_score=0.0, batch_size=2)
+    db.log_conversation_rows(_rows("legado um", "legado dois", "orquídea azul no jardim"))
+
+    assert _recall(memory, "orquídea azul") == []
+    asyncio.run(memory.backfill())
+
+    assert memory.backfilled
+    assert _recall(memory, "orquídea azul") == ["orquídea azul no jardim"]
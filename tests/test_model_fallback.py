@@ -0,0 +1,130 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from groq import RateLimitError
+
+from bot import ai_service, resilience
+from bot.model_router import FAST_MODEL, LARGE_MODEL, model_router
+
+
+def _rate_limited():
+    request = httpx.Request("POST", "http://groq.test/openai/v1/chat/completions")
+    return RateLimitError("rate limited", response=httpx.Response(429, request=request), body=None)
+
+
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+@pytest.mark.parametrize("error", [_rate_limited(), resilience.CircuitOpenError(f"groq:{FAST_MODEL}", 30)])
+def test_fast_failure_before_hedge_falls_back_to_large(monkeypatch, error):
+    calls = []
+
+    async def fake_create(model, messages):
+        calls.append(model)
+        if model == FAST_MODEL:
+            raise error
+        return _completion("from large")
+
+    monkeypatch.setattr(ai_service, "_create_completion", fake_create)
+    monkeypatch.setattr(ai_service, "ROUTER_HEDGE_AFTER", 3)
+
+    result = asyncio.run(ai_service._complete_with_fallback([], [FAST_MODEL, LARGE_MODEL], hedge=True))
+
+    assert result.choices[0].message.content == "from large"
+    assert calls == [FAST_MODEL, LARGE_MODEL]
+
+
+def test_slow_fast_model_is_hedged_and_counts_both_models(monkeypatch):
+    calls = []
+
+    async def fake_create(model, messages):
+        calls.append(model)
+        if model == FAST_MODEL:
+            await asyncio.sleep(1)
+            return _completion("from fast")
+        raise _rate_limited()
+
+    monkeypatch.setattr(ai_service, "_create_completion", fake_create)
+    monkeypatch.setattr(ai_service, "ROUTER_HEDGE_AFTER", 0.05)
+
+    result = asyncio.run(ai_service._complete_with_fallback([], [FAST_MODEL, LARGE_MODEL], hedge=True))
+
+    assert result.choices[0].message.content == "from fast"
+    assert calls == [FAST_MODEL, LARGE_MODEL]
+
+
+class FakeStream:
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for text in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+def test_stream_holds_groq_slot_and_records_full_duration(monkeypatch):
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return FakeStream(["Olá", "!", " Tudo", " bem?"], delay=0.05)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(ai_service, "GROQ_API_KEY", "test")
+    monkeypatch.setattr(ai_service, "get_client", lambda: client)
+    monkeypatch.setattr(model_router, "_stats", {})
+
+    async def scenario():
+        slots = asyncio.Semaphore(1)
+        monkeypatch.setattr(ai_service, "_groq_slots", slots)
+        held = []
+        async for _ in ai_service.stream_gemini_response("oi, streaming test", preference="fast"):
+            held.append(slots.locked())
+        return held, slots.locked()
+
+    held, locked_after = asyncio.run(scenario())
+
+    assert held == [True, True, True, True]
+    assert locked_after is False
+    stats = model_router.stats()[FAST_MODEL]
+    assert stats["calls"] == 1
+    assert stats["avg_latency"] >= 0.2
+
+
+def test_preference_cache_is_bounded_and_expires(monkeypatch):
+    from bot import db, model_router as model_router_module
+    from bot.model_router import ModelRouter
+
+    db.init_db()
+    db.set_model_preference(9001, "large")
+    reads = []
+
+    def counting_get(user_id):
+        reads.append(user_id)
+        return db.get_model_preference(user_id)
+
+    monkeypatch.setattr(model_router_module, "get_model_preference", counting_get)
+    router = ModelRouter(max_users=2, ttl=3600)
+
+    async def scenario():
+        assert await router.get_preference(9001) == "large"
+        assert await router.get_preference(9002) == "auto"
+        assert await router.get_preference(9001) == "large"
+        # 9002 is the least recently used and makes room for 9003
+        assert await router.get_preference(9003) == "auto"
+        assert list(router._preferences) == [9001, 9003]
+        assert reads == [9001, 9002, 9003]
+
+        # Entries untouched for longer than the TTL are read again
+        router._preferences[9001] = ("large", time.monotonic() - 7200)
+        assert await router.get_preference(9001) == "large"
+        assert reads[-1] == 9001
+
+    asyncio.run(scenario())
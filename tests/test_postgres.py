@@ -0,0 +1,102 @@
+import os
+import uuid
+import threading
+
+import pytest
+
+from bot import db
+from bot.storage import PostgresBackend, _to_pyformat
+
+
+def test_qmark_placeholders_become_pyformat():
+    assert _to_pyformat("SELECT a FROM t WHERE b = ? AND c > ?") == "SELECT a FROM t WHERE b = %s AND c > %s"
+
+
+def test_percent_signs_are_escaped_inside_and_outside_literals():
+    assert _to_pyformat("SELECT 10 % 3, '100%' FROM t WHERE a = ?") == "SELECT 10 %% 3, '100%%' FROM t WHERE a = %s"
+
+
+def test_question_marks_inside_literals_are_kept():
+    assert _to_pyformat("SELECT '?', ? FROM t") == "SELECT '?', %s FROM t"
+
+
+def test_backslash_escape_literal_does_not_swallow_the_rest():
+    sql = "SELECT name FROM drive_files WHERE LOWER(name) LIKE LOWER(?) ESCAPE '\\' ORDER BY modified_time DESC LIMIT ?"
+    assert _to_pyformat(sql) == (
+        "SELECT name FROM drive_files WHERE LOWER(name) LIKE LOWER(%s) ESCAPE '\\' ORDER BY modified_time DESC LIMIT %s"
+    )
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """db.py pointed at a throwaway schema in the TEST_DATABASE_URL database."""
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("set TEST_DATABASE_URL to a PostgreSQL database to run")
+    psycopg = pytest.importorskip("psycopg")
+    from psycopg.conninfo import make_conninfo
+
+    schema = f"bot_test_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(url, autocommit=True) as admin:
+        admin.execute(f"CREATE SCHEMA {schema}")
+    backend = PostgresBackend(make_conninfo(url, options=f"-c search_path={schema}"), workers=1)
+    monkeypatch.setattr(db, "backend", backend)
+    monkeypatch.setattr(db, "_local", threading.local())
+    try:
+        db.init_db()
+        yield db.get_connection()
+    finally:
+        db.close_connection()
+        with psycopg.connect(url, autocommit=True) as admin:
+            admin.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+def test_migrate_records_the_version_and_is_idempotent(postgres):
+    db.init_db()
+
+    assert postgres.execute("SELECT version FROM schema_version").fetchall() == [(len(db.POSTGRES_MIGRATIONS),)]
+    assert db.add_task(1, "tarefa") == 1
+
+
+def test_log_conversation_rows_indexes_the_returned_ids(postgres):
+    rows = [(7, "user", "bolo de cenoura", "2024-01-01T00:00:00"), (7, "assistant", "receita", "2024-01-01T00:00:01")]
+    db.log_conversation_rows(rows, terms=[["bolo", "cenoura"], ["receita"]], watermark=True)
+
+    ids = [row[0] for row in postgres.execute("SELECT id FROM conversations ORDER BY id").fetchall()]
+    assert len(ids) == 2
+    assert sorted(db.find_memory_postings(7, ["bolo", "cenoura", "receita"])) == [
+        ("bolo", ids[0]), ("cenoura", ids[0]), ("receita", ids[1]),
+    ]
+    assert db.get_sync_token("memory_index") == str(ids[1])
+
+    # Reindexing the same rows is a no-op
+    db.save_memory_postings([(7, "bolo", ids[0])], ids[1])
+    assert len(db.find_memory_postings(7, ["bolo"])) == 1
+
+
+def test_upserts_replace_existing_rows(postgres):
+    db.save_conversation_summary(7, "primeiro")
+    db.save_conversation_summary(7, "segundo")
+    assert db.get_conversation_summary(7) == "segundo"
+
+    db.set_model_preference(7, "fast")
+    db.set_model_preference(7, "smart")
+    assert db.get_model_preference(7) == "smart"
+
+    db.set_cached_response("k", "velho", 1.0, 100.0)
+    db.set_cached_response("k", "novo", 2.0, 200.0)
+    assert db.get_cached_response("k", 150.0) == ("novo", 2.0)
+
+    db.apply_drive_changes([("a", "100% pronto.txt", "text/plain", "2024-01-01"),
+                            ("b", "100 prontos.txt", "text/plain", "2024-01-02")], [], "t1", full=True)
+    db.apply_drive_changes([("a", "100% pronto_v2.txt", "text/plain", "2024-01-03")], ["b"], "t2")
+    assert db.search_drive_files("100%") == [("100% pronto_v2.txt", "text/plain", "2024-01-03")]
+    assert db.search_drive_files("o_v") == [("100% pronto_v2.txt", "text/plain", "2024-01-03")]
+    assert db.get_sync_token("drive") == "t2"
+
+    db.apply_calendar_changes([("e", "Reunião", "2024-01-01T10:00", "2024-01-01T13:00:00", "2024-01-01T14:00:00")],
+                              [], "c1", full=True)
+    db.apply_calendar_changes([("e", "Reunião 50%", "2024-01-01T11:00", "2024-01-01T14:00:00", "2024-01-01T15:00:00")],
+                              [], "c2")
+    assert db.search_calendar_events("2024-01-01T00:00:00", "50%") == [("Reunião 50%", "2024-01-01T11:00")]
+    assert db.get_sync_token("calendar") == "c2"
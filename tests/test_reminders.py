@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from bot.reminders import parse_due_date
+
+# 2025-06-10 12:00 in America/Sao_Paulo
+NOW = datetime(2025, 6, 10, 15, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Comprar pão", ("Comprar pão", None)),
+    ("Enviar relatório para ana@empresa.com", ("Enviar relatório para ana@empresa.com", None)),
+    ("Responder @fulano no grupo", ("Responder @fulano no grupo", None)),
+    ("Comprar pão @ em 30m", ("Comprar pão", "2025-06-10T15:30:00")),
+    ("Ligar @ +1d", ("Ligar", "2025-06-11T15:00:00")),
+    ("Reunião @ amanhã 14:30", ("Reunião", "2025-06-11T17:30:00")),
+    ("Natal @ 25/12 10h", ("Natal", "2025-12-25T13:00:00")),
+    ("Café @ 9h", ("Café", "2025-06-11T12:00:00")),
+    ("Mandar para ana@empresa.com @ 2025-07-01 08:00", ("Mandar para ana@empresa.com", "2025-07-01T11:00:00")),
+])
+def test_parse_due_date(text, expected):
+    assert parse_due_date(text, now=NOW) == expected
+
+
+@pytest.mark.parametrize("text, message", [
+    ("@ amanhã", "Informe o título da tarefa antes do @."),
+    ("Pagar conta @ 31/02", "Data inválida: 31/02"),
+    ("Pagar conta @ 2025-13-01", "Data inválida: 2025-13-01"),
+    ("Pagar conta @ amanhã 25h", "Data inválida: amanhã 25h"),
+    ("Pagar conta @ depois", "Data inválida: depois"),
+    ("Pagar conta @ 01/01/2020", "A data informada já passou."),
+])
+def test_parse_due_date_errors(text, message):
+    with pytest.raises(ValueError) as error:
+        parse_due_date(text, now=NOW)
+    assert str(error.value) == message
@@ -0,0 +1,119 @@
+import time
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeGroq, FakeSearch
+from bot import ai_service, http_client, resilience, web_search
+from bot.model_router import FAST_MODEL, LARGE_MODEL, model_router
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    # Breakers, the HTTP client and its host slots are per process; start each test clean
+    monkeypatch.setattr(resilience, "_policies", {})
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(http_client, "_client", None)
+    monkeypatch.setattr(http_client, "_host_slots", {})
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF", 0.01)
+
+
+@pytest.fixture
+def search(monkeypatch):
+    with FakeSearch() as stand_in:
+        monkeypatch.setattr(web_search, "SEARCH_URL", stand_in.url + "/customsearch/v1")
+        monkeypatch.setenv("GOOGLE_SEARCH_API_KEY", "test")
+        monkeypatch.setenv("GOOGLE_SEARCH_CX", "test")
+        yield stand_in
+
+
+def _run(coro):
+    async def scenario():
+        try:
+            return await coro
+        finally:
+            await http_client.close_http_client()
+    return asyncio.run(scenario())
+
+
+def test_search_deadline_leaves_room_for_http_retries():
+    policy = resilience.get_policy("search")
+    assert policy.timeout >= http_client.HTTP_TIMEOUT * (http_client.HTTP_RETRIES + 1)
+
+
+def test_search_retries_transient_statuses(search):
+    search.inject(status=503, times=2)
+
+    result = _run(web_search.google_search("raizito"))
+
+    assert result.startswith("*Search Results:*")
+    assert search.requests["search"] == 3
+
+
+def test_search_stalls_are_retried_within_the_deadline(search, monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_TIMEOUT", 0.2)
+    resilience.get_policy("search").timeout = 0.2 * (http_client.HTTP_RETRIES + 1) + 0.1
+    search.inject(stall=1, times=2)
+
+    result = _run(web_search.google_search("raizito"))
+
+    assert result.startswith("*Search Results:*")
+    assert search.requests["search"] == 3
+
+
+def test_search_breaker_opens_short_circuits_and_probes(search):
+    policy = resilience.get_policy("search")
+    policy.reset = 0.3
+    search.inject(status=503)
+
+    async def scenario():
+        replies = [await web_search.google_search(f"q{i}") for i in range(policy.failures)]
+        requests_when_open = search.requests["search"]
+        short_circuited = await web_search.google_search("while open")
+        assert search.requests["search"] == requests_when_open
+
+        await asyncio.sleep(policy.reset)
+        search.clear()
+        probe = await web_search.google_search("probe")
+        return replies, short_circuited, probe
+
+    replies, short_circuited, probe = _run(scenario())
+
+    assert all(reply.startswith("Error performing search") for reply in replies)
+    assert short_circuited == "⚠️ Busca indisponível no momento. Tente novamente em instantes."
+    assert probe.startswith("*Search Results:*")
+    assert resilience.get_breaker("search").state == "closed"
+
+
+@pytest.fixture
+def groq(monkeypatch):
+    with FakeGroq(reply_words=3) as stand_in:
+        monkeypatch.setattr(ai_service, "GROQ_API_KEY", "test")
+        monkeypatch.setattr(ai_service, "GROQ_BASE_URL", stand_in.url)
+        monkeypatch.setattr(ai_service, "_client", None)
+        monkeypatch.setattr(ai_service, "_groq_slots", asyncio.Semaphore(4))
+        monkeypatch.setattr(model_router, "_stats", {})
+        yield stand_in
+
+
+def test_groq_server_error_falls_back_to_next_model(groq):
+    groq.inject(status=503, times=1)
+
+    result = asyncio.run(ai_service.get_gemini_response(f"oi {time.time()}", preference="fast"))
+
+    assert result.startswith("oi")
+    # The injected 503 answers the fast model's call before the handler sees it
+    assert groq.requests["chat"] == 2
+    assert groq.requests[f"chat.{LARGE_MODEL}"] == 1
+
+
+def test_groq_open_circuit_skips_the_model(groq):
+    breaker = resilience.get_breaker("groq", FAST_MODEL)
+    for _ in range(breaker.threshold):
+        breaker.failure()
+
+    result = asyncio.run(ai_service.get_gemini_response(f"oi {time.time()}", preference="fast"))
+
+    assert result.startswith("oi")
+    assert groq.requests[f"chat.{FAST_MODEL}"] == 0
+    assert groq.requests[f"chat.{LARGE_MODEL}"] == 1
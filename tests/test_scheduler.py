@@ -0,0 +1,140 @@
+import time
+import asyncio
+import itertools
+
+import pytest
+
+from benchmarks.fakes import FakeTelegram
+from bot import handlers
+from bot.db import init_db
+from bot.scheduler import AIScheduler, SchedulerBusy
+
+
+def test_rejected_users_leave_no_queue_behind():
+    async def scenario():
+        scheduler = AIScheduler(workers=1, rate_per_minute=6000, burst=10, max_queue=1)
+        release = asyncio.Event()
+
+        async def run(_):
+            await release.wait()
+            return "ok"
+
+        scheduler.start()
+        first = await scheduler.submit(1, run)
+        await asyncio.sleep(0.01)
+        second = await scheduler.submit(2, run)
+        await asyncio.sleep(0.01)
+
+        for user_id in range(100, 200):
+            with pytest.raises(SchedulerBusy):
+                await scheduler.submit(user_id, run)
+        assert set(scheduler._queues) <= {1, 2}
+        assert scheduler.rejected == 100
+
+        release.set()
+        assert await first == "ok"
+        assert await second == "ok"
+        await scheduler.stop()
+        assert scheduler._queues == {}
+
+    asyncio.run(scenario())
+
+
+def test_queued_text_is_coalesced():
+    async def scenario():
+        scheduler = AIScheduler(workers=1, rate_per_minute=6000, burst=10)
+        seen = []
+        release = asyncio.Event()
+
+        async def run(text):
+            await release.wait()
+            seen.append(text)
+
+        scheduler.start()
+        busy = await scheduler.submit(1, run, text="a")
+        await asyncio.sleep(0.01)
+        queued = await scheduler.submit(1, run, text="b")
+        await asyncio.sleep(0.01)
+        assert await scheduler.submit(1, run, text="c") is None
+
+        release.set()
+        await asyncio.gather(busy, queued)
+        await scheduler.stop()
+        assert seen == ["a", "b\nc"]
+        assert scheduler.coalesced == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_jobs_are_logged_not_raised(caplog):
+    async def scenario():
+        scheduler = AIScheduler(workers=1, rate_per_minute=6000, burst=10)
+
+        async def run(_):
+            raise RuntimeError("boom")
+
+        scheduler.start()
+        future = await scheduler.submit(1, run)
+        with pytest.raises(RuntimeError):
+            await future
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+    assert "AI job for user 1 failed: boom" in caplog.text
+
+
+def _message_update(update_id, user_id, text):
+    entities = [{"type": "bot_command", "offset": 0, "length": len(text)}] if text.startswith("/") else []
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": text, "entities": entities,
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Teste"},
+    }}
+
+
+def test_queued_ai_jobs_dont_hold_update_slots(monkeypatch):
+    """More AI messages than update slots, then /help, fed through the update queue like in production."""
+    import main
+    from telegram import Update
+
+    release = asyncio.Event()
+
+    async def slow_reply(update, prompt, **kwargs):
+        await release.wait()
+        await update.message.reply_text("resposta")
+        return "resposta"
+
+    init_db()
+    monkeypatch.setattr(handlers, "_reply_with_ai", slow_reply)
+    monkeypatch.setenv("TELEGRAM_TOKEN", "1:test")
+    monkeypatch.setenv("CONCURRENT_UPDATES", "2")
+
+    async def scenario(telegram):
+        scheduler = AIScheduler(workers=2, rate_per_minute=6000, burst=10)
+        monkeypatch.setattr(handlers, "ai_scheduler", scheduler)
+        app = main.build_application(updater=False)
+        ids = itertools.count(1)
+        async with app:
+            await app.start()
+            scheduler.start()
+            for user_id in range(100, 106):
+                await app.update_queue.put(Update.de_json(_message_update(next(ids), user_id, "oi"), app.bot))
+            await app.update_queue.put(Update.de_json(_message_update(next(ids), 200, "/help"), app.bot))
+
+            # Every AI job is blocked, yet /help is answered
+            deadline = time.monotonic() + 5
+            while telegram.requests["sendMessage"] < 1 and time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+            assert telegram.requests["sendMessage"] == 1
+            assert scheduler.stats()["queue_depth"] + scheduler.stats()["in_flight"] == 6
+
+            release.set()
+            while telegram.requests["sendMessage"] < 7 and time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+            await scheduler.stop()
+            await app.stop()
+        assert telegram.requests["sendMessage"] == 7
+
+    with FakeTelegram() as telegram:
+        monkeypatch.setenv("TELEGRAM_API_URL", telegram.url)
+        asyncio.run(scenario(telegram))
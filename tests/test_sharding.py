@@ -0,0 +1,52 @@
+import asyncio
+
+from telegram import Update
+
+from bot import sharding
+
+
+def _message(update_id, user_id, chat_id, chat_type="private"):
+    message = {"message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": chat_type}, "text": "oi"}
+    if user_id is not None:
+        message["from"] = {"id": user_id, "is_bot": False, "first_name": "Teste"}
+    return Update.de_json({"update_id": update_id, "message": message}, None)
+
+
+class _Queue(list):
+    put = list.append
+
+
+def _route(updates, count):
+    pool = sharding.WorkerPool(build_app=None, count=count)
+    pool._queues = [_Queue() for _ in range(count)]
+    for update in updates:
+        asyncio.run(pool._forward(update, None))
+    return [[data["update_id"] for data in queue] for queue in pool._queues]
+
+
+def test_updates_are_routed_by_user():
+    updates = [
+        _message(1, user_id=10, chat_id=10),
+        _message(2, user_id=11, chat_id=11),
+        # The same users writing in a group land with their private chats
+        _message(3, user_id=10, chat_id=-1005, chat_type="supergroup"),
+        _message(4, user_id=11, chat_id=-1005, chat_type="supergroup"),
+    ]
+    assert _route(updates, count=2) == [[1, 3], [2, 4]]
+
+
+def test_updates_without_a_user_fall_back_to_the_chat():
+    post = Update.de_json({"update_id": 5, "channel_post": {
+        "message_id": 5, "date": 0, "chat": {"id": -1003, "type": "channel"}, "text": "aviso",
+    }}, None)
+    assert sharding._update_key(post) == -1003
+    assert _route([post], count=2) == [[], [5]]
+
+
+def test_owns_user_matches_the_routing(monkeypatch):
+    monkeypatch.setattr(sharding, "SHARD_COUNT", 3)
+    for shard in range(3):
+        monkeypatch.setattr(sharding, "SHARD_INDEX", shard)
+        owned = [user_id for user_id in range(10, 16) if sharding.owns_user(user_id)]
+        routed = _route([_message(user_id, user_id, -1005, "group") for user_id in range(10, 16)], count=3)
+        assert owned == routed[shard]
@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+from telegram.constants import MessageLimit
+from telegram.error import NetworkError, RetryAfter
+
+from bot import handlers
+
+
+class FakeMessage:
+    def __init__(self):
+        self.sent = []
+        self.edits = []
+
+    async def reply_text(self, text, **kwargs):
+        self.sent.append(text)
+        return SimpleNamespace(edit_text=self._edit)
+
+    async def _edit(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def _count(name, mode):
+    return REGISTRY.get_sample_value(f"{name}_count", {"mode": mode}) or 0
+
+
+def test_streamed_reply_records_first_token_and_completion(monkeypatch):
+    async def fake_stream(prompt, **kwargs):
+        for chunk in ("Olá", ", tudo", " bem?"):
+            await asyncio.sleep(0.02)
+            yield chunk
+
+    monkeypatch.setattr(handlers, "STREAM_REPLIES", True)
+    monkeypatch.setattr(handlers, "STREAM_EDIT_INTERVAL", 0)
+    monkeypatch.setattr(handlers, "stream_gemini_response", fake_stream)
+    before = (_count("raizito_ai_time_to_first_token_seconds", "stream"),
+              _count("raizito_ai_time_to_complete_seconds", "stream"))
+
+    message = FakeMessage()
+    response = asyncio.run(handlers._reply_with_ai(SimpleNamespace(message=message), "oi"))
+
+    assert response == "Olá, tudo bem?"
+    assert message.sent == ["Olá"]
+    assert message.edits[-1] == "Olá, tudo bem?"
+    assert _count("raizito_ai_time_to_first_token_seconds", "stream") == before[0] + 1
+    assert _count("raizito_ai_time_to_complete_seconds", "stream") == before[1] + 1
+    first = REGISTRY.get_sample_value("raizito_ai_time_to_first_token_seconds_sum", {"mode": "stream"})
+    complete = REGISTRY.get_sample_value("raizito_ai_time_to_complete_seconds_sum", {"mode": "stream"})
+    assert first < complete
+
+
+class FlakyMessage(FakeMessage):
+    """Fails the calls listed in `failures`, keyed by (kind, call number)."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.calls = {"send": 0, "edit": 0}
+
+    def _fail(self, kind):
+        self.calls[kind] += 1
+        error = self.failures.get((kind, self.calls[kind]))
+        if error:
+            raise error
+
+    async def reply_text(self, text, **kwargs):
+        self._fail("send")
+        return await super().reply_text(text, **kwargs)
+
+    async def _edit(self, text, **kwargs):
+        self._fail("edit")
+        await super()._edit(text, **kwargs)
+
+
+def _stream(*chunks):
+    async def fake_stream(prompt, **kwargs):
+        for chunk in chunks:
+            yield chunk
+    return fake_stream
+
+
+def test_final_edit_waits_out_one_retry_after(monkeypatch):
+    monkeypatch.setattr(handlers, "STREAM_REPLIES", True)
+    monkeypatch.setattr(handlers, "STREAM_EDIT_INTERVAL", 3600)
+    monkeypatch.setattr(handlers, "stream_gemini_response", _stream("Olá", ", tudo bem?"))
+
+    message = FlakyMessage({("edit", 1): RetryAfter(0)})
+    response = asyncio.run(handlers._reply_with_ai(SimpleNamespace(message=message), "oi"))
+
+    assert response == "Olá, tudo bem?"
+    assert message.sent == ["Olá"]
+    assert message.edits == ["Olá, tudo bem?"]
+
+
+def test_failed_final_sends_still_return_the_reply(monkeypatch):
+    limit = MessageLimit.MAX_TEXT_LENGTH
+    monkeypatch.setattr(handlers, "STREAM_REPLIES", True)
+    monkeypatch.setattr(handlers, "STREAM_EDIT_INTERVAL", 3600)
+    monkeypatch.setattr(handlers, "stream_gemini_response", _stream("a" * 10, "b" * limit))
+
+    message = FlakyMessage({
+        # The final edit keeps failing, so it is sent as a new message
+        ("edit", 1): RetryAfter(0), ("edit", 2): RetryAfter(0),
+        # The follow-up chunk fails with an error that isn't retried
+        ("send", 3): NetworkError("connection reset"),
+    })
+    response = asyncio.run(handlers._reply_with_ai(SimpleNamespace(message=message), "oi"))
+
+    assert response == "a" * 10 + "b" * limit
+    assert message.edits == []
+    assert message.sent == ["a" * 10, response[:limit]]
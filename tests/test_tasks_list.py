@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+from telegram.constants import MessageLimit
+
+from bot import db
+from bot.handlers import _render_tasks_page, list_tasks_callback, TASKS_PAGE_SIZE
+
+USER_ID = 4242
+
+
+def _page(status="pending", **cursor):
+    return asyncio.run(_render_tasks_page(USER_ID, status, **cursor))
+
+
+def _next_cursor(keyboard):
+    for button in keyboard.inline_keyboard[0]:
+        if button.callback_data.split(":")[3] == "next":
+            return int(button.callback_data.split(":")[4])
+    return None
+
+
+def test_long_titles_stay_within_the_message_limit_and_keep_paginating():
+    db.init_db()
+    # Underscores double in length once escaped for Markdown
+    ids = [db.add_task(USER_ID, f"{n} " + "_" * 4000) for n in range(TASKS_PAGE_SIZE * 2)]
+
+    seen = []
+    after_id = None
+    while True:
+        text, keyboard = _page(after_id=after_id)
+        assert len(text) <= MessageLimit.MAX_TEXT_LENGTH
+        seen += [int(line.split(".")[0]) for line in text.splitlines()[1:]]
+        after_id = _next_cursor(keyboard)
+        if after_id is None:
+            break
+
+    assert seen == ids
+
+
+class FakeQuery:
+    def __init__(self, data, from_id):
+        self.data = data
+        self.from_user = SimpleNamespace(id=from_id)
+        self.answers = []
+        self.edits = []
+
+    async def answer(self, text=None, show_alert=False):
+        self.answers.append((text, show_alert))
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def _press(data, from_id):
+    query = FakeQuery(data, from_id)
+    update = SimpleNamespace(callback_query=query, effective_user=query.from_user)
+    asyncio.run(list_tasks_callback(update, None))
+    return query
+
+
+def test_list_buttons_only_page_the_owners_tasks():
+    db.init_db()
+    owner, other = 5151, 5252
+    db.add_task(owner, "tarefa do dono")
+    db.add_task(other, "tarefa de outra pessoa")
+    _, keyboard = asyncio.run(_render_tasks_page(owner, "pending"))
+    data = keyboard.inline_keyboard[-1][0].callback_data
+    assert data.startswith(f"tasks:{owner}:")
+
+    pressed_by_owner = _press(data, owner)
+    assert pressed_by_owner.answers == [(None, False)]
+    assert len(pressed_by_owner.edits) == 1
+
+    pressed_by_other = _press(data, other)
+    assert pressed_by_other.answers[0][1] is True
+    assert pressed_by_other.edits == []
@@ -0,0 +1,77 @@
+import time
+import signal
+import socket
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import httpx
+import uvicorn
+
+from bot import webhook
+
+UPDATE = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"}, "text": "oi"}}
+
+
+def _serve(drain_seconds):
+    state = {"draining": False}
+    app = SimpleNamespace(bot=None, running=True, update_queue=asyncio.Queue())
+    server = webhook.DrainingServer(
+        uvicorn.Config(webhook.build_web_app(app, state), log_level="warning", lifespan="off"), state,
+        drain_seconds=drain_seconds,
+    )
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{sock.getsockname()[1]}", app
+
+
+def _post(client, url):
+    return client.post(url + webhook.WEBHOOK_PATH, json=UPDATE,
+                       headers={"X-Telegram-Bot-Api-Secret-Token": webhook.WEBHOOK_SECRET})
+
+
+def test_sigterm_drains_before_the_listener_closes():
+    server, thread, url, app = _serve(drain_seconds=0.5)
+    with httpx.Client() as client:
+        assert _post(client, url).status_code == 200
+        assert client.get(url + "/readyz").status_code == 200
+
+        server.handle_exit(signal.SIGTERM, None)
+
+        # Still serving, but turning deliveries away so Telegram retries them elsewhere
+        assert client.get(url + "/readyz").status_code == 503
+        assert _post(client, url).status_code == 503
+        assert not server.should_exit
+    thread.join(5)
+    assert server.should_exit and not thread.is_alive()
+    assert app.update_queue.qsize() == 1
+
+
+def test_without_a_drain_period_the_signal_stops_the_server_at_once():
+    server, thread, url, _ = _serve(drain_seconds=0)
+
+    server.handle_exit(signal.SIGTERM, None)
+
+    assert server.state["draining"] and server.should_exit
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_stop_signal_is_not_re_raised_after_serving():
+    received = []
+    previous = signal.signal(signal.SIGTERM, lambda sig, frame: received.append(sig))
+    try:
+        state = {"draining": False}
+        server = webhook.DrainingServer(uvicorn.Config(None), state, drain_seconds=0)
+        with server.capture_signals():
+            server.handle_exit(signal.SIGTERM, None)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+    # run_webhook still has to stop the Application after uvicorn returns
+    assert received == []
+    assert state["draining"]